@@ -9,17 +9,47 @@
 #   The assets have been modified.
 #   https://opengameart.org/content/rocks-ships-stars-gold-and-more
 
+import argparse
 import time
 
 import pygame
 
+import keys
 from client import GameClient
+from constants import GAME
+from networking import NetworkManager
+from udpnet import UdpNetworkManager
 
 
-def main():
+def parse_args(args=None):
+    """Parse command-line options"""
+
+    parser = argparse.ArgumentParser(description='Play AstroBlast!')
+    parser.add_argument('--udp', action='store_true',
+                        help='host/join multiplayer games over UDP (the other side has to use UDP too)')
+    parser.add_argument('--rotation-steps', type=int, default=GAME.ROTATION_STEPS,
+                        help='number of angles sprites can be drawn at (default: %(default)s)')
+    parser.add_argument('--rotation-cache', type=float, default=GAME.ROTATION_CACHE_BYTES / (1024 * 1024),
+                        help='megabytes of rotated sprite images to keep, making them as they\'re needed; '
+                             '0 makes them all up front (default: %(default)s)')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='only redraw the parts of the screen that change each frame '
+                             '(faster on software-rendered displays, unless the view scrolls)')
+    return parser.parse_args(args)
+
+
+def main(args=None):
     """Application entry point"""
+    options = parse_args(args)
+
+    # Get an RSA key ready in the background, so that hosting/joining doesn't have to wait for one
+    keys.default_pool.start()
+
     # Instantiate client module
-    client = GameClient()
+    client = GameClient(network_class=UdpNetworkManager if options.udp else NetworkManager,
+                        rotation_steps=options.rotation_steps,
+                        rotation_cache_bytes=int(options.rotation_cache * 1024 * 1024),
+                        dirty_rects=options.dirty_rects)
 
     # Timing variables
     ms_per_frame = 1000.0 / 60.0
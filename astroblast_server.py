@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Dedicated server entry point.  Runs the dispatcher, game server and network manager
+#   without a window, so nothing here (directly or indirectly) may import pygame or pgu.
+
+import argparse
+import time
+from queue import Queue
+
+import keys
+from dispatcher import Dispatcher
+from rooms import RoomScheduler
+from workers import RoomWorkerPool
+from networking import NetworkManager
+from asyncnet import AsyncNetworkManager
+from udpnet import UdpNetworkManager
+from constants import GAME, NETWORK
+
+
+def parse_args(args=None):
+    """Parse command-line options"""
+
+    parser = argparse.ArgumentParser(description='Run a headless AstroBlast! server.')
+    parser.add_argument('-p', '--port', type=int, default=50000,
+                        help='TCP port to listen on (default: %(default)s)')
+    parser.add_argument('-b', '--bind', default=None,
+                        help='address to listen on (default: this machine\'s LAN IP)')
+    parser.add_argument('-t', '--tick-rate', type=int, default=GAME.FPS,
+                        help='simulation steps per second (default: %(default)s)')
+    parser.add_argument('-s', '--send-rate', type=int, default=None,
+                        help='entity state updates sent to clients per second (default: every tick)')
+    parser.add_argument('-m', '--max-players', type=int, default=None,
+                        help='maximum number of connected players per room (default: unlimited)')
+    parser.add_argument('-n', '--rooms', type=int, default=1,
+                        help='number of independent game rooms to host (default: %(default)s)')
+    parser.add_argument('-w', '--world-size', type=int, default=None,
+                        help='width & height of the (wrapping) world in pixels (default: one screen)')
+    parser.add_argument('-r', '--view-radius', type=int, default=None,
+                        help='only send clients entities within this many pixels of them (default: send everything)')
+    parser.add_argument('-j', '--workers', type=int, default=0,
+                        help='run rooms in this many worker processes, to use several CPU cores '
+                             '(default: run them all in this process)')
+    parser.add_argument('--entity-store', action='store_true',
+                        help='integrate entities with the vectorized (NumPy) entity store')
+    parser.add_argument('-k', '--keys', type=int, default=1,
+                        help='number of RSA keys to keep generated and cached, so that several servers '
+                             'started on this machine don\'t each have to wait for one (default: %(default)s)')
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument('--async-net', action='store_true',
+                           help='serve every connection from one asyncio event loop, instead of a thread each')
+    transport.add_argument('--udp', action='store_true',
+                           help='talk to clients over UDP (clients have to use UDP too)')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Application entry point"""
+    options = parse_args(args)
+
+    keys.default_pool.size = max(1, options.keys)
+    keys.default_pool.start()
+
+    if options.world_size is not None:
+        GAME.WORLD_WIDTH = options.world_size
+        GAME.WORLD_HEIGHT = options.world_size
+
+    # Wire up the modules the same way the client does when hosting,
+    #   minus the local client
+    dispatch_queue = Queue()
+    server_queue = Queue()
+    client_queue = Queue()
+    remote_queue = Queue()
+    dispatch = Dispatcher(dispatch_queue, server_queue, client_queue, remote_queue)
+    network_class = NetworkManager
+    if options.async_net:
+        network_class = AsyncNetworkManager
+    elif options.udp:
+        network_class = UdpNetworkManager
+    network_mgr = network_class(remote_queue, dispatch, dispatch_queue, NETWORK.MODE_SERVER, options.port,
+                                bind_addr=options.bind)
+    room_settings = dict(use_entity_store=options.entity_store, tick_rate=options.tick_rate,
+                         max_players=options.max_players, send_rate=options.send_rate,
+                         view_radius=options.view_radius)
+    if options.workers > 0:
+        # Rooms are spread over worker processes
+        server = RoomWorkerPool(dispatch, options.workers)
+        for room_id in range(options.rooms):
+            server.create_room(room_id, **room_settings)
+    else:
+        # All of the rooms are simulated on one thread; room 0 (the default room) takes over
+        #   the usual server queue
+        server = RoomScheduler(dispatch)
+        for room_id in range(options.rooms):
+            server.create_room(room_id, server_queue if room_id == GAME.DEFAULT_ROOM_ID else None, **room_settings)
+
+    dispatch.start()
+    network_mgr.start()
+    server.start()
+    print('AstroBlast! server listening on %s port %d with %d room(s)' % ('UDP' if options.udp else 'TCP', options.port, options.rooms))
+
+    try:
+        while dispatch.is_alive() and network_mgr.is_alive() and server.is_alive():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+
+    # Shut everything down
+    print('Exiting...')
+    server.running = False
+    network_mgr.running = False
+    dispatch.stop()
+    server.join()
+    network_mgr.join()
+    dispatch.join()
+
+if __name__ == '__main__':
+    main()
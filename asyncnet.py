@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Network transport built on a single asyncio event loop, as an alternative to NetworkManager's
+#   thread per connection.  Speaks exactly the same protocol, so either end can use either one.
+
+import asyncio
+from threading import Thread
+from collections import deque
+
+from Crypto.PublicKey import RSA
+
+import keys
+from constants import NETWORK, GAME, MESSAGES
+import messages
+from wire import encode_frame, FrameReader, ProtocolError
+from session import (SessionCipher, SessionReader, new_session_key, wrap_session_key, unwrap_session_key, seal_frame,
+                     new_nonce, sign_handshake, verify_handshake, NONCE_SIZE)
+from networking import BUFF_SIZE, HANDSHAKE_TIMEOUT, deliver_frames, pack_msg
+from helperfuncs import get_lan_ip
+
+class ConnectionOutbox():
+    """Stands in for a connection's outbound queue.  Dispatch puts messages in it from its own
+    thread; the event loop is woken up (once, however many arrive before it gets to them)
+    to write them out.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        # Set once the handshake has agreed on a session key
+        self.cipher = None
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.wakeup_scheduled = False
+
+        # Statistics
+        self.msgs = 0
+        self.batches = 0
+        self.bytes_sent = 0
+
+    def put(self, msg, block=True, timeout=None):
+        if msg.msg_type == MESSAGES.FLUSH:
+            # (Everything put in is written out as soon as the event loop gets to it anyway)
+            return
+        self.pending.append(msg)
+        if not self.wakeup_scheduled:
+            self.wakeup_scheduled = True
+            try:
+                self.loop.call_soon_threadsafe(self.wake)
+            except RuntimeError:
+                # The event loop has shut down; nothing will be sent anymore
+                pass
+
+    def wake(self):
+        """Runs on the event loop once messages have been put in"""
+
+        self.ready.set()
+
+    async def write_to(self, writer):
+        """Write out messages as they arrive, everything that's waiting in one go"""
+
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            # Clear this before taking messages, so that anything put in after it gets a new wakeup
+            self.wakeup_scheduled = False
+            self.write_pending(writer)
+            await writer.drain()
+
+    def write_pending(self, writer):
+        pending = self.pending
+        if not pending:
+            return
+        buffer = bytearray()
+        count = 0
+        while pending:
+            buffer += pack_msg(pending.popleft())
+            count += 1
+        # The whole batch is encrypted together
+        if self.cipher is not None:
+            buffer = seal_frame(self.cipher, buffer)
+        writer.write(buffer)
+        self.msgs += count
+        self.batches += 1
+        self.bytes_sent += len(buffer)
+
+    def stats(self):
+        """Counts, for diagnostics (each batch is one write)"""
+
+        return {'msgs': self.msgs, 'batches': self.batches, 'bytes': self.bytes_sent, 'syscalls': self.batches}
+
+class AsyncNetworkManager(Thread):
+    """Handles and routes all internet traffic to and from remote clients/servers, with every
+    connection served by one asyncio event loop on this thread.
+    Takes the same arguments as NetworkManager, and can be used in its place.
+    """
+
+    def __init__(self, in_queue, dispatch, dispatch_queue, mode, port=50000, remote_server_addr='127.0.0.1', num_unaccepted=100, bind_addr=None,
+                 key_pool=None):
+        Thread.__init__(self)
+        # Queue of messages coming from dispatch (when connected to a remote server)
+        self.in_queue = in_queue
+        # Reference to message dispatcher
+        self.dispatch = dispatch
+        # Queue of translated messages going to dispatch
+        self.dispatch_queue = dispatch_queue
+
+        self.mode = mode
+        self.port = port
+        self.num_unaccepted = num_unaccepted
+
+        # Private RSA key and its public half, from the key pool once the thread starts (see NetworkManager)
+        self.key_pool = key_pool if key_pool is not None else keys.default_pool
+        self.key_pool.start()
+        self.RSA_key = None
+        self.local_pub_key = None
+
+        self.name = 'Network'
+        self.loop = None
+        self.stopping = None
+        self._running = True
+
+        self.remote_server_addr = remote_server_addr
+        self.addr = '127.0.0.1'
+        # Address to listen on as a server (defaults to this machine's LAN IP)
+        self.bind_addr = bind_addr
+
+        # Outbox for each open connection
+        self.outboxes = {}
+
+    @property
+    def running(self):
+        return self._running
+
+    @running.setter
+    def running(self, value):
+        # Setting this to False (from any thread) shuts the network down
+        self._running = value
+        if not value:
+            self.stop()
+
+    def stop(self):
+        """Close every connection and stop the event loop.  Safe to call from any thread."""
+
+        self._running = False
+        if self.loop is not None and self.stopping is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.stopping.set)
+            except RuntimeError:
+                # Already stopped
+                pass
+
+    def send_stats(self):
+        """Outgoing message/batch/byte/syscall counts, summed over open connections"""
+
+        totals = {'msgs': 0, 'batches': 0, 'bytes': 0, 'syscalls': 0}
+        for outbox in list(self.outboxes.values()):
+            for k, v in outbox.stats().items():
+                totals[k] = totals.get(k, 0) + v
+        return totals
+
+    def run(self):
+        """Gets called at thread start"""
+
+        self.RSA_key = self.key_pool.get()
+        self.local_pub_key = self.RSA_key.publickey().exportKey()
+
+        # Get the LAN IP address for this machine
+        if self.mode == NETWORK.MODE_SERVER:
+            self.addr = self.bind_addr if self.bind_addr is not None else get_lan_ip()
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        if not self._running:
+            return
+
+        if self.mode == NETWORK.MODE_SERVER:
+            await self.serve()
+        else:
+            await self.connect()
+
+    async def serve(self):
+        """Accept connections until told to stop"""
+
+        connections = set()
+
+        def on_connect(reader, writer):
+            task = asyncio.ensure_future(self.handle_client(reader, writer))
+            connections.add(task)
+            task.add_done_callback(connections.discard)
+
+        server = await asyncio.start_server(on_connect, self.addr, self.port, backlog=self.num_unaccepted)
+        await self.stopping.wait()
+
+        # Stop accepting, then close every connection (each one sends what it still has first)
+        server.close()
+        for task in list(connections):
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        await server.wait_closed()
+
+    async def handshake(self, reader, writer, frames, is_server):
+        """Swap public keys with the other side, then agree on a session key (which the server
+        makes up, and sends encrypted with the client's public key, signed along with a nonce
+        from the client).  Returns the session cipher.
+        """
+
+        if is_server:
+            # Server always sends its key first
+            writer.write(encode_frame(self.local_pub_key))
+            await writer.drain()
+            remote_pub_key = await asyncio.wait_for(read_frame(reader, frames), HANDSHAKE_TIMEOUT)
+            nonce = await asyncio.wait_for(read_frame(reader, frames), HANDSHAKE_TIMEOUT)
+            if len(nonce) != NONCE_SIZE:
+                raise ValueError('Bad nonce')
+            session_key = new_session_key()
+            wrapped_key = wrap_session_key(session_key, RSA.importKey(remote_pub_key))
+            signature = sign_handshake(self.RSA_key, remote_pub_key, nonce, wrapped_key)
+            writer.write(encode_frame(wrapped_key) + encode_frame(signature))
+            await writer.drain()
+        else:
+            remote_pub_key = await asyncio.wait_for(read_frame(reader, frames), HANDSHAKE_TIMEOUT)
+            nonce = new_nonce()
+            writer.write(encode_frame(self.local_pub_key) + encode_frame(nonce))
+            await writer.drain()
+            wrapped_key = await asyncio.wait_for(read_frame(reader, frames), HANDSHAKE_TIMEOUT)
+            signature = await asyncio.wait_for(read_frame(reader, frames), HANDSHAKE_TIMEOUT)
+            # (Proof that the session key came from the holder of the server's key, for this handshake)
+            verify_handshake(signature, remote_pub_key, self.local_pub_key, nonce, wrapped_key)
+            session_key = unwrap_session_key(wrapped_key, self.RSA_key)
+        return SessionCipher(session_key, is_server)
+
+    async def handle_client(self, reader, writer):
+        """Serves one client connection, for as long as it lasts"""
+
+        # Give this connection its own ID and outbox, so that the dispatcher can address it
+        outbox = ConnectionOutbox(self.loop)
+        connection_id = self.dispatch.register_connection(outbox)
+        self.outboxes[connection_id] = outbox
+        sender = None
+        try:
+            frames = FrameReader()
+            outbox.cipher = await self.handshake(reader, writer, frames, True)
+            frames = SessionReader(outbox.cipher, frames)
+            sender = asyncio.ensure_future(outbox.write_to(writer))
+            await read_messages(reader, frames, self.dispatch_queue, connection_id)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            # Connection reset, garbled handshake, etc.
+            pass
+        finally:
+            self.dispatch.unregister_connection(connection_id)
+            self.outboxes.pop(connection_id, None)
+            await close_connection(writer, outbox, sender)
+            # Let the server know this client is gone, in case it couldn't say so itself
+            msg = messages.SignalDisconnect()
+            msg.sender_id = connection_id
+            msg.recipient_id = GAME.LOCAL_SERVER_ID
+            self.dispatch_queue.put(msg)
+
+    async def connect(self):
+        """Talk to a remote server until either side hangs up"""
+
+        outbox = ConnectionOutbox(self.loop)
+        self.outboxes[GAME.LOCAL_SERVER_ID] = outbox
+        writer = None
+        sender = None
+        # Dispatch sends messages for the server through an ordinary queue; carry them over to the outbox
+        bridge = Thread(target=forward_queue, args=(self.in_queue, outbox), name='Network bridge', daemon=True)
+        try:
+            reader, writer = await asyncio.open_connection(self.remote_server_addr, self.port)
+            frames = FrameReader()
+            outbox.cipher = await self.handshake(reader, writer, frames, False)
+            frames = SessionReader(outbox.cipher, frames)
+            bridge.start()
+            sender = asyncio.ensure_future(outbox.write_to(writer))
+            receiver = asyncio.ensure_future(read_messages(reader, frames, self.dispatch_queue))
+            stopping = asyncio.ensure_future(self.stopping.wait())
+            await asyncio.wait((receiver, stopping), return_when=asyncio.FIRST_COMPLETED)
+            for task in (receiver, stopping):
+                task.cancel()
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.outboxes.pop(GAME.LOCAL_SERVER_ID, None)
+            if writer is not None:
+                await close_connection(writer, outbox, sender)
+            if bridge.is_alive():
+                self.in_queue.put(None)
+
+async def read_frame(reader, frames):
+    """Wait for a single frame (during the handshake, before messages start flowing).
+    Anything read past the end of it stays in frames.
+    """
+
+    while not frames.frames:
+        data = await reader.read(BUFF_SIZE)
+        if not data:
+            raise EOFError('Connection closed during handshake')
+        frames.feed(data)
+    return frames.frames.popleft()
+
+async def read_messages(reader, frames, remote_to_local_queue, sender_id=None):
+    """Pass on incoming messages until the connection closes, or the other side breaks protocol"""
+
+    try:
+        # (including any that arrived along with the handshake)
+        deliver_frames(frames, remote_to_local_queue, sender_id)
+        while True:
+            data = await reader.read(BUFF_SIZE)
+            if not data:
+                return
+            frames.feed(data)
+            deliver_frames(frames, remote_to_local_queue, sender_id)
+    except ProtocolError:
+        return
+
+async def close_connection(writer, outbox, sender):
+    """Send whatever's still waiting, then close"""
+
+    if sender is not None:
+        sender.cancel()
+        try:
+            outbox.write_pending(writer)
+            await asyncio.wait_for(writer.drain(), 1)
+        except (OSError, asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+    writer.close()
+
+def forward_queue(in_queue, outbox):
+    """Hand messages from a regular queue to an outbox, until a None comes through"""
+
+    while True:
+        msg = in_queue.get()
+        if msg is None:
+            break
+        outbox.put(msg)
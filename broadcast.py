@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+class Broadcast():
+    """A message going to several clients at once.
+    Every recipient shares the one copy of the message (so nothing may modify it once it's
+    been broadcast), and it only gets serialized once per wire format, however many
+    connections it goes out on.
+    """
+
+    __slots__ = ('msg', 'recipients', 'encodings')
+
+    def __init__(self, msg, recipients):
+        # The message itself can go straight into a local module's queue
+        self.msg = msg
+        self.recipients = frozenset(recipients)
+        # Serialized forms, by encoder
+        self.encodings = {}
+
+    @property
+    def msg_type(self):
+        return self.msg.msg_type
+
+    def encode(self, encoder):
+        """Get the message as encoded by encoder(msg), encoding it only the first time.
+        Connection threads may race to fill in the cache; they'd produce the same result anyway.
+        """
+
+        encoded = self.encodings.get(encoder)
+        if encoded is None:
+            encoded = encoder(self.msg)
+            self.encodings[encoder] = encoded
+        return encoded
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+from constants import GAME
+
+class Camera():
+    """Maps positions in the (wrapping) game world onto the screen.
+    When the world is bigger than the screen, the camera can follow a point (the player's ship);
+    otherwise it stays put and world coordinates are screen coordinates.
+    """
+
+    def __init__(self, view_width=GAME.WIDTH, view_height=GAME.HEIGHT):
+        self.view_width = view_width
+        self.view_height = view_height
+        self.center = (view_width / 2, view_height / 2)
+
+    def scrolls(self):
+        """Whether the world is bigger than the view, i.e. whether the camera needs to move"""
+
+        return GAME.WORLD_WIDTH > self.view_width or GAME.WORLD_HEIGHT > self.view_height
+
+    def follow(self, position):
+        """Center the view on a world position, if the world is big enough to scroll"""
+
+        if self.scrolls():
+            self.center = (position[0], position[1])
+        else:
+            self.center = (self.view_width / 2, self.view_height / 2)
+
+    def to_screen(self, position):
+        """Convert a world position to a screen position, taking the shortest way around the world"""
+
+        world_w = GAME.WORLD_WIDTH
+        world_h = GAME.WORLD_HEIGHT
+        dx = (position[0] - self.center[0] + world_w / 2) % world_w - world_w / 2
+        dy = (position[1] - self.center[1] + world_h / 2) % world_h - world_h / 2
+        return (dx + self.view_width / 2, dy + self.view_height / 2)
+
+    def offset(self):
+        """World position of the top-left corner of the view"""
+
+        return (self.center[0] - self.view_width / 2, self.center[1] - self.view_height / 2)
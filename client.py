@@ -21,11 +21,23 @@ from networking import NetworkManager
 from gamemodule import GameModule
 from constants import GAME, MESSAGES, MSGCONTENT, NETWORK
 from entitysprite import EntitySprite, SpriteInfo
+import spriteatlas
+from rotations import PreloadedRotations, LazyRotations, RotationCache
+from textcache import TextCache
+from camera import Camera
 from helperfuncs import get_lan_ip
 
 # Path to assets directory
 ASSETSDIR = path.join(path.dirname(__file__), 'assets')
 
+# Fonts for labels: (names, size, bold)
+NORMAL_FONT = ('Helvetica, Arial', 20, True)
+LARGER_FONT = ('Helvetica, Arial', 30, True)
+HUGE_FONT = ('Helvetica, Arial', 150, True)
+
+LABEL_COLOR = (255, 255, 0)
+TITLE_COLOR = (0, 255, 0)
+
 def load_image(name, colorkey=None):
     """Load an image with the specified filename."""
 
@@ -41,21 +53,23 @@ def load_image(name, colorkey=None):
         image.set_colorkey(colorkey, pygame.RLEACCEL)
     return image, image.get_rect()
 
-def load_image_all_rotations(name, colorkey=None):
-    """Load an image and pre-generate it rotated for 0 - 359 degrees"""
+def load_image_rotations(name, steps=GAME.ROTATION_STEPS, cache=None):
+    """Load an image to be drawn rotated: the result's [angle] is the image rotated to the nearest
+    of steps evenly spaced angles, and its unrotated rect.
+    If cache is given, rotated images are made as they're needed and kept there; otherwise they're
+    all made up front (which is cached on disk, so it's only slow the first time; see spriteatlas.py).
+    """
 
-    image, rect = load_image(name, colorkey)
-    images = {}
-    for angle in range(360):
-        rotated_image = pygame.transform.rotozoom(image, angle, 1)
-        rotated_rect = rect
-        images[angle] = (rotated_image, rotated_rect)
-    return images
+    if cache is not None:
+        return LazyRotations(name, load_image(name)[0], steps, cache)
+    frames, rect = spriteatlas.load_rotations(path.join(ASSETSDIR, name), lambda: load_image(name)[0], steps)
+    return PreloadedRotations(name, frames, rect)
 
 class GameClient(GameModule):
     """Contains game client and pyGame functionality."""
 
-    def __init__(self):
+    def __init__(self, interp_delay=GAME.INTERP_DELAY, room_id=GAME.DEFAULT_ROOM_ID, network_class=NetworkManager,
+                 rotation_steps=GAME.ROTATION_STEPS, rotation_cache_bytes=GAME.ROTATION_CACHE_BYTES, dirty_rects=False):
         self.in_queue = Queue()
         self.dispatch_queue = Queue()
         GameModule.__init__(self, self.in_queue, self.dispatch_queue)
@@ -64,6 +78,10 @@ class GameClient(GameModule):
         self.module_id = GAME.INVALID_ID
         self.server_id = GAME.LOCAL_SERVER_ID
         self.server_addr = '127.0.0.1'
+        # Which game room to join on a multi-room server
+        self.room_id = room_id
+        # Network transport to host/join with (e.g. NetworkManager for TCP, UdpNetworkManager for UDP)
+        self.network_class = network_class
 
         self.local_server_instance = None
         self.dispatch = None
@@ -71,6 +89,12 @@ class GameClient(GameModule):
 
         self.connected = False
 
+        # Entities are drawn this far (ms) behind the newest server state, blending between
+        #   buffered snapshots, so that rendering doesn't depend on when packets arrive
+        self.interp_delay = interp_delay
+        # Estimated (local time - server time), in ms; None until the first snapshot
+        self.server_time_offset = None
+
         # Initialize pyGame
         pygame.mixer.pre_init()
         pygame.init()
@@ -108,24 +132,32 @@ class GameClient(GameModule):
         self.multi_container.add(self.multi_ip_input, 2*GAME.WIDTH/3, GAME.HEIGHT/3)
         self.multi_port_input = gui.Input("Port")
         self.multi_container.add(self.multi_port_input, 2*GAME.WIDTH/3, GAME.HEIGHT/3+50)
+        self.multi_room_input = gui.Input("Room")
+        self.multi_container.add(self.multi_room_input, 2*GAME.WIDTH/3, GAME.HEIGHT/3+100)
         self.multi_app.init(self.multi_container, self.screen, pygame.rect.Rect(0, 0, GAME.WIDTH, GAME.HEIGHT))
 
         # Mouse cursor
         cursor, rect = load_image('cursor.png')
         self.cursor = cursor
 
-        # Images for sprites
-        self.frames = {'ship':[load_image_all_rotations('ship.png'),
-                               load_image_all_rotations('ship_thrust.png')],
-                       'asteroid_big':[load_image_all_rotations('asteroid_big.png')],
-                       'asteroid_med':[load_image_all_rotations('asteroid_med.png')],
-                       'asteroid_small':[load_image_all_rotations('asteroid_small.png')],
-                       'bullet_g':[load_image_all_rotations('bullet_g.png')],
-                       'explosion':[load_image_all_rotations('explosion_1.png'),
-                                    load_image_all_rotations('explosion_2.png')]}
+        # Images for sprites, rotated as they're needed (see load_image_rotations)
+        self.rotation_cache = RotationCache(rotation_cache_bytes) if rotation_cache_bytes else None
+        def rotations(name):
+            return load_image_rotations(name, rotation_steps, self.rotation_cache)
+        self.frames = {'ship':[rotations('ship.png'),
+                               rotations('ship_thrust.png')],
+                       'asteroid_big':[rotations('asteroid_big.png')],
+                       'asteroid_med':[rotations('asteroid_med.png')],
+                       'asteroid_small':[rotations('asteroid_small.png')],
+                       'bullet_g':[rotations('bullet_g.png')],
+                       'explosion':[rotations('explosion_1.png'),
+                                    rotations('explosion_2.png')]}
 
         self.background = load_image('bg5.jpg')[0]
 
+        # Fonts & rendered labels (most labels are the same from one frame to the next)
+        self.text = TextCache()
+
         # Sounds
         self.thrust_sound = pygame.mixer.Sound(path.join(ASSETSDIR, 'thrust.ogg'))
         self.thrust_sound.set_volume(1)
@@ -139,7 +171,21 @@ class GameClient(GameModule):
         # Generate some unused entities
         for x in range(100):
             self.unused_entities.append(EntitySprite(None))
-        self.sprites = pygame.sprite.Group()
+        # (RenderUpdates keeps track of where each sprite was drawn, for dirty-rect rendering)
+        self.sprites = pygame.sprite.RenderUpdates()
+
+        # Everything that stays put from frame to frame (the background, and any menu), and the
+        #   (game state, camera offset) it was drawn for
+        self.backdrop = pygame.Surface(self.screen.get_size()).convert()
+        self.backdrop_state = None
+        # Dirty-rect rendering: only redraw, and send to the display, the parts of the screen that
+        #   changed since the last frame (see draw_dirty)
+        self.dirty_rects = dirty_rects
+        # What was drawn over the sprites last frame, as (image, rect)
+        self.last_overlays = []
+
+        # Follows the player's ship around worlds that are bigger than the screen
+        self.camera = Camera(GAME.WIDTH, GAME.HEIGHT)
 
         self.player_entity_id = -1
         self.player_alive = False
@@ -155,18 +201,24 @@ class GameClient(GameModule):
         if self.local_server_instance is not None:
             self.local_server_instance.running = False
         if self.dispatch is not None:
-            self.dispatch.running = False
+            self.dispatch.stop()
         if self.network_mgr is not None:
             self.network_mgr.running = False
         # self.send_msg(MESSAGES.TERMINATE, self.local_server_id)
         self.running = False
     
-    def process_msg(self, msg_type, sender_id, msg_content):
+    def process_msg(self, msg_type, sender_id, msg):
         """Process an incoming message"""
 
         # Server accepted connection request
         if msg_type == MESSAGES.CONNECT_ACCEPT:
             self.connected = True
+            self.server_time_offset = None
+            # The server decides our ID (remote clients each get their own)
+            self.module_id = msg.set_id
+            # ...and how big the world is
+            GAME.WORLD_WIDTH = msg.world_width
+            GAME.WORLD_HEIGHT = msg.world_height
             self.send_msg(MESSAGES.CONNECT_SUCCESS, sender_id)
         
         # Server rejected connection request
@@ -177,129 +229,146 @@ class GameClient(GameModule):
         elif msg_type == MESSAGES.SIGNAL_DISCONNECT:
             self.disconnect(False)
         
-        # Server created an entity
-        elif msg_type == MESSAGES.CREATE_ENTITY:
-            expected_content = (MSGCONTENT.ENTITY_ID, MSGCONTENT.ENTITY_TYPE, MSGCONTENT.X_POS, MSGCONTENT.Y_POS, MSGCONTENT.ROTATION)
-            if self.assert_msg_content(msg_type, msg_content, *expected_content):
-                entity_id = msg_content[MSGCONTENT.ENTITY_ID]
-                entity_type = msg_content[MSGCONTENT.ENTITY_TYPE]
-                pos = (msg_content[MSGCONTENT.X_POS], msg_content[MSGCONTENT.Y_POS])
-                rot = msg_content[MSGCONTENT.ROTATION]
-
-                # Try to get an unused entity, or create one if there are none
-                try:
-                    e = self.unused_entities.pop()
-                except IndexError:
-                    e = EntitySprite(None)
-
-                if entity_type == GAME.ENTITY_TEST:
-                    info = SpriteInfo(entity_type, self.frames['ship'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
-
-                elif entity_type == GAME.ENTITY_PLAYERSHIP:
-                    info = SpriteInfo(entity_type, self.frames['ship'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
-                    pid = msg_content.get(MSGCONTENT.PLAYER_ID, None)
-                    if pid is not None and pid == self.module_id:
-                        self.player_entity_id = e.entity_id
-                        self.player_alive = True
-
-                elif entity_type == GAME.ENTITY_ASTEROID_BIG:
-                    info = SpriteInfo(entity_type, self.frames['asteroid_big'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
-
-                elif entity_type == GAME.ENTITY_ASTEROID_MED:
-                    info = SpriteInfo(entity_type, self.frames['asteroid_med'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
-
-                elif entity_type == GAME.ENTITY_ASTEROID_SMALL:
-                    info = SpriteInfo(entity_type, self.frames['asteroid_small'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
-
-                elif entity_type == GAME.ENTITY_BULLET:
-                    info = SpriteInfo(entity_type, self.frames['bullet_g'], 0, 0)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
+        # Server created an entity, or an existing one came into view
+        elif msg_type == MESSAGES.CREATE_ENTITY or msg_type == MESSAGES.ENTITY_ENTER:
+            entity_id = msg.entity_id
+            entity_type = msg.entity_type
+            pos = (msg.x_pos, msg.y_pos)
+            rot = msg.rotation
+
+            # Try to get an unused entity, or create one if there are none
+            try:
+                e = self.unused_entities.pop()
+            except IndexError:
+                e = EntitySprite(None)
+
+            if entity_type == GAME.ENTITY_TEST:
+                info = SpriteInfo(entity_type, self.frames['ship'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+
+            elif entity_type == GAME.ENTITY_PLAYERSHIP:
+                info = SpriteInfo(entity_type, self.frames['ship'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+                pid = msg.player_id
+                if pid is not None and pid == self.module_id:
+                    self.player_entity_id = e.entity_id
+                    self.player_alive = True
+
+            elif entity_type == GAME.ENTITY_ASTEROID_BIG:
+                info = SpriteInfo(entity_type, self.frames['asteroid_big'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+
+            elif entity_type == GAME.ENTITY_ASTEROID_MED:
+                info = SpriteInfo(entity_type, self.frames['asteroid_med'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+
+            elif entity_type == GAME.ENTITY_ASTEROID_SMALL:
+                info = SpriteInfo(entity_type, self.frames['asteroid_small'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+
+            elif entity_type == GAME.ENTITY_BULLET:
+                info = SpriteInfo(entity_type, self.frames['bullet_g'], 0, 0)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+                if msg_type == MESSAGES.CREATE_ENTITY:
                     self.shot_sound.play()
 
-                elif entity_type == GAME.ENTITY_EXPLOSION:
-                    info = SpriteInfo(entity_type, self.frames['explosion'], 1, 500)
-                    e.initialize(info, pos, rot, entity_id, entity_type)
-                    self.entities[e.entity_id] = e
-                    self.sprites.add(e)
+            elif entity_type == GAME.ENTITY_EXPLOSION:
+                info = SpriteInfo(entity_type, self.frames['explosion'], 1, 500)
+                e.initialize(info, pos, rot, entity_id, entity_type)
+                self.entities[e.entity_id] = e
+                self.sprites.add(e)
+                if msg_type == MESSAGES.CREATE_ENTITY:
                     self.explode_sound.play()
 
-        # Server destroyed an entity
-        elif msg_type == MESSAGES.DESTROY_ENTITY:
-            if self.assert_msg_content(msg_type, msg_content, MSGCONTENT.ENTITY_ID):
-                entity_id = msg_content[MSGCONTENT.ENTITY_ID]
-                e = self.entities.pop(entity_id)
-                if e is not None:
-                    self.sprites.remove(e)
-                    self.unused_entities.append(e)
-                    if e.entity_id == self.player_entity_id:
-                        self.player_alive = False
-                else:
-                    self.log('Received message to destroy sprite for entity %d, but sprite did not exist' % entity_id)
+        # Server destroyed an entity, or it went out of view
+        elif msg_type == MESSAGES.DESTROY_ENTITY or msg_type == MESSAGES.ENTITY_LEAVE:
+            entity_id = msg.entity_id
+            e = self.entities.pop(entity_id, None)
+            if e is not None:
+                self.sprites.remove(e)
+                self.unused_entities.append(e)
+                if e.entity_id == self.player_entity_id:
+                    self.player_alive = False
+            else:
+                self.log('Received message to destroy sprite for entity %d, but sprite did not exist' % entity_id)
 
         # An entity rotated by some amount
         elif msg_type == MESSAGES.UPDATEROT:
-            expected_content = (MSGCONTENT.ENTITY_ID, MSGCONTENT.ROTATION)
-            if self.assert_msg_content(msg_type, msg_content, *expected_content):
-                entity_id = msg_content[MSGCONTENT.ENTITY_ID]
-                rot = msg_content[MSGCONTENT.ROTATION]
-                e = self.entities.get(entity_id)
-                if e is not None:
-                    e.rotation = rot
-                else:
-                    self.log('Received message to update rotation for entity %d, but sprite does not exist' % entity_id)
+            entity_id = msg.entity_id
+            rot = msg.rotation
+            e = self.entities.get(entity_id)
+            if e is not None:
+                e.rotation = rot
+            else:
+                self.log('Received message to update rotation for entity %d, but sprite does not exist' % entity_id)
         
         # An entity moved
         elif msg_type == MESSAGES.UPDATEPOS:
-            expected_content = (MSGCONTENT.X_POS, MSGCONTENT.Y_POS)
-            if self.assert_msg_content(msg_type, msg_content, *expected_content):
-                entity_id = msg_content[MSGCONTENT.ENTITY_ID]
-                pos = (msg_content[MSGCONTENT.X_POS], msg_content[MSGCONTENT.Y_POS])
-                e = self.entities.get(entity_id)
-                if e is not None:
-                    e.position = pos
-                else:
-                    self.log('Received message to update position for entity %d, but sprite does not exist' % entity_id)
+            entity_id = msg.entity_id
+            pos = (msg.x_pos, msg.y_pos)
+            e = self.entities.get(entity_id)
+            if e is not None:
+                e.position = pos
+            else:
+                self.log('Received message to update position for entity %d, but sprite does not exist' % entity_id)
         
+        # Many entities moved/rotated
+        elif msg_type == MESSAGES.SNAPSHOT:
+            server_time = msg.server_time
+            self.sync_server_time(server_time)
+            entities = self.entities
+            for entity_id, x, y, rot in zip(msg.entity_ids, msg.x_positions, msg.y_positions, msg.rotations):
+                e = entities.get(entity_id)
+                if e is not None:
+                    e.push_state(server_time, (x, y), rot)
+
         # Player life count changed
         elif msg_type == MESSAGES.UPDATELIVES:
-            expected_content = MSGCONTENT.PLAYER_LIVES
-            if self.assert_msg_content(msg_type, msg_content, expected_content):
-                self.player_lives = msg_content[MSGCONTENT.PLAYER_LIVES]
+            self.player_lives = msg.player_lives
         
         # Player score changed
         elif msg_type == MESSAGES.UPDATESCORE:
-            expected_content = MSGCONTENT.PLAYER_SCORE
-            if self.assert_msg_content(msg_type, msg_content, expected_content):
-                self.player_score = msg_content[MSGCONTENT.PLAYER_SCORE]
+            self.player_score = msg.player_score
         
         # Server wants to change the client state to some other setting
         elif msg_type == MESSAGES.CHANGE_STATE:
-            expected_content = MSGCONTENT.GAME_STATE
-            if self.assert_msg_content(msg_type, msg_content, expected_content):
-                self.game_state = msg_content[MSGCONTENT.GAME_STATE]
+            self.game_state = msg.game_state
+
+    def sync_server_time(self, server_time):
+        """Update the estimated offset between local time and server time"""
+
+        offset = pygame.time.get_ticks() - server_time
+        if self.server_time_offset is None or offset < self.server_time_offset:
+            # The smallest offset seen belongs to the snapshot that arrived fastest
+            self.server_time_offset = offset
+        else:
+            # Creep towards larger offsets slowly, in case the server fell behind
+            self.server_time_offset += (offset - self.server_time_offset) * 0.01
+
+    def render_time(self):
+        """Server time (ms) to draw entities at, or None if not known yet"""
+
+        if self.server_time_offset is None:
+            return None
+        return pygame.time.get_ticks() - self.server_time_offset - self.interp_delay
 
     def disconnect(self, should_send_signal=True):
         """Disconnect this client from a server"""
 
         if should_send_signal:
-            self.send_msg(MESSAGES.SIGNAL_DISCONNECT, self.server_id, self.server_addr)
+            self.send_msg(MESSAGES.SIGNAL_DISCONNECT, self.server_id)
         
         self.connected = False
 
@@ -340,7 +409,7 @@ class GameClient(GameModule):
             remote_queue = Queue()
             # Create server and dispatcher
             self.dispatch = Dispatcher(self.dispatch_queue, server_queue, self.in_queue, remote_queue)
-            self.network_mgr = NetworkManager(remote_queue, self.dispatch, self.dispatch_queue, NETWORK.MODE_SERVER, port)
+            self.network_mgr = self.network_class(remote_queue, self.dispatch, self.dispatch_queue, NETWORK.MODE_SERVER, port)
             self.dispatch.start()
             self.network_mgr.start()
             self.addr = self.network_mgr.addr
@@ -360,17 +429,149 @@ class GameClient(GameModule):
             port = int(self.multi_port_input.value)
             self.dispatch = Dispatcher(self.dispatch_queue, server_queue, self.in_queue, remote_queue)
             self.dispatch.mode = NETWORK.MODE_CLIENT
-            self.network_mgr = NetworkManager(remote_queue, self.dispatch, self.dispatch_queue, NETWORK.MODE_CLIENT, port, self.server_addr)
+            self.network_mgr = self.network_class(remote_queue, self.dispatch, self.dispatch_queue, NETWORK.MODE_CLIENT, port, self.server_addr)
             self.dispatch.start()
             self.network_mgr.start()
             self.out_queue = self.dispatch_queue
             self.addr = get_lan_ip()
             self.module_id = GAME.REMOTE_CLIENT_ID
-            self.send_msg(MESSAGES.REQCONNECT, self.server_id)
+            try:
+                self.room_id = int(self.multi_room_input.value)
+            except ValueError:
+                self.room_id = GAME.DEFAULT_ROOM_ID
+            self.send_msg(MESSAGES.REQCONNECT, self.server_id, (MSGCONTENT.ROOM_ID, self.room_id))
 
         elif button_type == GAME.GUI_BUTTON_BACK:
             self.game_state = GAME.STATE_TITLE
 
+    def draw_background(self, surface):
+        """Draw the background, tiled and scrolled along with the camera"""
+
+        if not self.camera.scrolls():
+            surface.blit(self.background, (0, 0))
+            return
+
+        bg_width, bg_height = self.background.get_size()
+        left, top = self.camera.offset()
+        start_x = -(left % bg_width)
+        start_y = -(top % bg_height)
+        y = start_y
+        while y < GAME.HEIGHT:
+            x = start_x
+            while x < GAME.WIDTH:
+                surface.blit(self.background, (x, y))
+                x += bg_width
+            y += bg_height
+
+    def menu_app(self):
+        """The GUI for the current game state, if it has one"""
+
+        if self.game_state == GAME.STATE_TITLE:
+            return self.title_app
+        if self.game_state == GAME.STATE_MULTIPLAYER_MENU:
+            return self.multi_app
+        return None
+
+    def update_backdrop(self):
+        """Bring self.backdrop up to date.  Returns the areas of it that changed, or None if it had
+        to be redrawn from scratch.
+        """
+
+        app = self.menu_app()
+        state = (self.game_state, self.camera.offset() if self.camera.scrolls() else None)
+        if state == self.backdrop_state:
+            # Menus are painted once; after that only widgets that change (say, a button the mouse
+            #   is over) are painted again
+            changed = app.update(self.backdrop) if app is not None else []
+            if changed is not None:
+                return [pygame.Rect(rect) for rect in changed]
+
+        self.backdrop_state = state
+        self.backdrop.fill(GAME.BLACK)
+        self.draw_background(self.backdrop)
+        if app is not None:
+            app.paint(self.backdrop)
+        return None
+
+    def overlays(self):
+        """What's drawn over the sprites, as (image, position): the mouse cursor in menus, and labels"""
+
+        overlays = []
+        if self.menu_app() is not None and pygame.mouse.get_focused():
+            overlays.append((self.cursor, pygame.mouse.get_pos()))
+
+        # Labels are only rendered again when their text changes (see TextCache)
+        text = self.text
+        if (self.game_state == GAME.STATE_TITLE):
+            width, height = text.size('AstroBlast!', HUGE_FONT)
+            title_label = text.render('AstroBlast!', HUGE_FONT, TITLE_COLOR)
+            overlays.append((title_label, (GAME.WIDTH/2 - width/2, height)))
+        if (self.game_state == GAME.STATE_IN_GAME or self.game_state == GAME.STATE_GAME_START or
+            self.game_state == GAME.STATE_PLAYER_DIED):
+            width, height = text.size('Lives:', NORMAL_FONT)
+            lives_label = text.render('Lives: %d' % self.player_lives, NORMAL_FONT, LABEL_COLOR)
+            overlays.append((lives_label, (20, 20)))
+            score_label = text.render('Score: %d' % self.player_score, NORMAL_FONT, LABEL_COLOR)
+            overlays.append((score_label, (20, height + 20)))
+
+        if self.game_state == GAME.STATE_GAME_START or self.game_state == GAME.STATE_GAME_OVER:
+            width, height = text.size('Press Fire (Spacebar)', NORMAL_FONT)
+            start_label = text.render('Press Fire (Spacebar)', NORMAL_FONT, LABEL_COLOR)
+            overlays.append((start_label, (GAME.WIDTH/2 - width/2, GAME.HEIGHT/2)))
+
+        if self.game_state == GAME.STATE_GAME_OVER:
+            width, height = text.size('Game Over!', LARGER_FONT)
+            game_over_label = text.render('Game Over!', LARGER_FONT, LABEL_COLOR)
+            overlays.append((game_over_label, (GAME.WIDTH/2 - width/2, GAME.HEIGHT/2 - 40)))
+        return overlays
+
+    def draw(self):
+        """Draw the whole frame, and display it"""
+
+        if self.menu_app() is not None:
+            self.update_backdrop()
+            self.screen.blit(self.backdrop, (0, 0))
+        else:
+            self.screen.fill(GAME.BLACK)
+            self.draw_background(self.screen)
+        self.sprites.draw(self.screen)
+        for image, position in self.overlays():
+            self.screen.blit(image, position)
+        pygame.display.flip()
+
+    def draw_dirty(self):
+        """Draw just what changed since the last frame, and display only those parts of the screen.
+        Wherever sprites and overlays were last frame is restored from the backdrop before they're
+        drawn again.  (If the camera moves, everything changes, so the whole frame is drawn.)
+        """
+
+        changed = self.update_backdrop()
+        if changed is None:
+            self.screen.blit(self.backdrop, (0, 0))
+            self.sprites.draw(self.screen)
+            self.last_overlays = [(image, self.screen.blit(image, position)) for image, position in self.overlays()]
+            pygame.display.flip()
+            return
+
+        dirty = changed
+        for rect in changed:
+            self.screen.blit(self.backdrop, rect, rect)
+        for image, rect in self.last_overlays:
+            self.screen.blit(self.backdrop, rect, rect)
+        self.sprites.clear(self.screen, self.backdrop)
+        # (Every sprite is redrawn, so nothing else needs to be for where they were or are now)
+        dirty += self.sprites.draw(self.screen)
+        overlays = [(image, self.screen.blit(image, position)) for image, position in self.overlays()]
+
+        # An overlay that's the same as last frame looks just the same, apart from where sprites
+        #   were redrawn under it (which is already in dirty)
+        previous = set((id(image), tuple(rect)) for image, rect in self.last_overlays)
+        current = set((id(image), tuple(rect)) for image, rect in overlays)
+        dirty += [rect for image, rect in self.last_overlays if (id(image), tuple(rect)) not in current]
+        dirty += [rect for image, rect in overlays if (id(image), tuple(rect)) not in previous]
+        self.last_overlays = overlays
+        pygame.display.update(dirty)
+
     def update(self):
         """Update game state/input state"""
 
@@ -437,59 +638,20 @@ class GameClient(GameModule):
         if events_found and GAME.PRINTEVENTS:
             print(event_str)
         
-        # Clear surface
-        self.screen.fill(GAME.BLACK)
-
-        # Draw background
-        self.screen.blit(self.background, (0, 0))
-
-        # Draw sprites on the surface
+        # Position sprites, then point the camera at the player's ship
         # self.ship_sprite.rotation += 10
-        self.sprites.update()
-        self.sprites.draw(self.screen)
-
-        # Text/GUI
-        if (self.game_state == GAME.STATE_TITLE):
-            # Draw GUI
-            self.title_app.paint(self.screen)
-            # Draw cursor when appropriate
-            if pygame.mouse.get_focused():
-                self.screen.blit(self.cursor, pygame.mouse.get_pos())
-        elif (self.game_state == GAME.STATE_MULTIPLAYER_MENU):
-            # Draw GUI
-            self.multi_app.paint(self.screen)
-            # Draw cursor when appropriate
-            if pygame.mouse.get_focused():
-                self.screen.blit(self.cursor, pygame.mouse.get_pos())
-
-        # Draw labels
-        normal_font = pygame.font.SysFont('Helvetica, Arial', 20, 1)
-        larger_font = pygame.font.SysFont('Helvetica, Arial', 30, 1)
-        huge_font = pygame.font.SysFont('Helvetica, Arial,', 150, 1)
-        if (self.game_state == GAME.STATE_TITLE):
-            width, height = huge_font.size('AstroBlast!')
-            title_label = huge_font.render('AstroBlast!', 1, (0, 255, 0))
-            self.screen.blit(title_label, (GAME.WIDTH/2 - width/2, height))
-        if (self.game_state == GAME.STATE_IN_GAME or self.game_state == GAME.STATE_GAME_START or
-            self.game_state == GAME.STATE_PLAYER_DIED):
-            width, height = normal_font.size('Lives:')
-            lives_label = normal_font.render('Lives: %d' % self.player_lives, 1, (255, 255, 0))
-            self.screen.blit(lives_label, (20, 20))
-            score_label = normal_font.render('Score: %d' % self.player_score, 1, (255, 255, 0))
-            self.screen.blit(score_label, (20, height + 20))
-
-        if self.game_state == GAME.STATE_GAME_START or self.game_state == GAME.STATE_GAME_OVER:
-            width, height = normal_font.size('Press Fire (Spacebar)')
-            start_label = normal_font.render('Press Fire (Spacebar)', 1, (255, 255, 0))
-            self.screen.blit(start_label, (GAME.WIDTH/2 - width/2, GAME.HEIGHT/2))
-
-        if self.game_state == GAME.STATE_GAME_OVER:
-            width, height = larger_font.size('Game Over!')
-            game_over_label = larger_font.render('Game Over!', 1, (255, 255, 0))
-            self.screen.blit(game_over_label, (GAME.WIDTH/2 - width/2, GAME.HEIGHT/2 - 40))
-
-        # Display surface to the screen
-        pygame.display.flip()
+        render_time = self.render_time()
+        pship = self.entities.get(self.player_entity_id)
+        if pship is not None:
+            if render_time is not None and pship.states:
+                pship.position, pship.rotation = pship.interpolate(render_time)
+            self.camera.follow(pship.position)
+        self.sprites.update(render_time, self.camera)
+
+        if self.dirty_rects:
+            self.draw_dirty()
+        else:
+            self.draw()
 
         # Handles quitting/etc.
         super().update()
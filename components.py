@@ -14,12 +14,17 @@ import math
 from constants import GAME
 import helperfuncs
 
+# Components keep per-entity state on the entity itself wherever they can, so that one instance
+#   can be shared by every entity that uses it (see the shared instances at the bottom)
+
 class TestComponent():
     """Just a component for testing out the entity-component model"""
+    __slots__ = ()
+
     def update(self, parent, delta_time):
         # Update position
-        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WIDTH
-        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WIDTH
+        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WORLD_WIDTH
+        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WORLD_HEIGHT
 
         # Update rotation
         parent.rotation += 1*delta_time
@@ -31,12 +36,18 @@ class TestComponent():
 
 class PlayerComponent():
     """Contains (most of) the behavior specific to a the player ship"""
+    __slots__ = ()
+
+    # Handling constants; entitystore.EntityStore uses these too
+    avel = 240
+    acceleration = 10.0
+    # friction = acceleration / 20.0
+    friction = acceleration / 1600.0
 
     def update(self, parent, delta_time):
-        avel = 240
-        acceleration = 10.0
-        # friction = acceleration / 20.0
-        friction = acceleration / 1600.0
+        avel = self.avel
+        acceleration = self.acceleration
+        friction = self.friction
 
         # Update rotation
         parent.angular_velocity = parent.turn_direction * avel
@@ -58,16 +69,17 @@ class PlayerComponent():
         parent.velocity[1] *= (1 - friction)
 
         # Update position
-        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WIDTH
-        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WIDTH
+        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WORLD_WIDTH
+        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WORLD_HEIGHT
 
 class AsteroidComponent():
     """Contains the behavior for an asteroid."""
+    __slots__ = ()
 
     def update(self, parent, delta_time):
         # Update position
-        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WIDTH
-        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WIDTH
+        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WORLD_WIDTH
+        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WORLD_HEIGHT
 
         # Update rotation
         parent.rotation += parent.angular_velocity*delta_time
@@ -79,13 +91,19 @@ class AsteroidComponent():
 
 class BulletComponent():
     """Contains the behavior for a bullet"""
+    __slots__ = ()
+
     def update(self, parent, delta_time):
         # Update position
-        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WIDTH
-        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WIDTH
+        parent.position[0] = (parent.position[0] + parent.velocity[0]*delta_time) % GAME.WORLD_WIDTH
+        parent.position[1] = (parent.position[1] + parent.velocity[1]*delta_time) % GAME.WORLD_HEIGHT
 
 class ExplosionComponent():
-    """Contains the behavior (animation, that is) of an explosion"""
+    """Contains the behavior (animation, that is) of an explosion
+    Keeps its own timer, so each explosion needs its own instance.
+    """
+    __slots__ = ('lifetime', 'elapsed')
+
     def __init__(self, lifetime):
         self.lifetime = lifetime
         self.elapsed = 0
@@ -95,3 +113,9 @@ class ExplosionComponent():
         self.elapsed += delta_time
         if self.elapsed >= self.lifetime:
             parent.should_destroy = True
+
+# Shared instances of the stateless components
+TEST = TestComponent()
+PLAYER = PlayerComponent()
+ASTEROID = AsteroidComponent()
+BULLET = BulletComponent()
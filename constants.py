@@ -20,6 +20,22 @@ class GAME():
     HEIGHT = 1024
     FPS = 60
 
+    # Size of the (wrapping) game world.  By default it's one screen, but it can be larger,
+    #   in which case the client's view scrolls to follow the player
+    WORLD_WIDTH = WIDTH
+    WORLD_HEIGHT = HEIGHT
+
+    # Client-side interpolation: how far behind the latest server state to render (ms),
+    #   and how many server states to keep per entity
+    INTERP_DELAY = 100
+    INTERP_BUFFER = 8
+
+    # Sprites are drawn rotated to the nearest of this many evenly spaced angles.  Rotated images
+    #   are made when first needed, and kept in a cache of at most this many bytes (if it's 0,
+    #   they're all made, or loaded from disk, up front instead)
+    ROTATION_STEPS = 128
+    ROTATION_CACHE_BYTES = 24 * 1024 * 1024
+
     BLACK = (0, 0, 0)
 
     # Print pygame events to stdout?
@@ -31,6 +47,11 @@ class GAME():
     LOCAL_SERVER_ID = 1
     LOCAL_CLIENT_ID = 2
     REMOTE_CLIENT_ID = 3
+    # Each network connection to a server gets its own ID, starting here
+    FIRST_CONNECTION_ID = 1000
+
+    # Room that clients join when they don't ask for a particular one
+    DEFAULT_ROOM_ID = 0
 
     # Entity types
     ENTITY_NONE = 100
@@ -65,6 +86,7 @@ class MESSAGES():
     NONE = 0
     TEST = 1
     TERMINATE = -1
+    FLUSH = -2          # Server finished a tick; send what it queued for each connection (never sent over the network)
 
     PING = 100
     PONG = 101
@@ -77,6 +99,9 @@ class MESSAGES():
 
     UPDATEPOS = 252    # Update client-side entity position
     UPDATEROT = 253    # Update client-side entity rotation
+    SNAPSHOT = 254     # Update position & rotation of many entities at once
+    ENTITY_ENTER = 255 # An existing entity came into view
+    ENTITY_LEAVE = 256 # An entity went out of view
 
     UPDATELIVES = 260
     UPDATESCORE = 261
@@ -120,6 +145,9 @@ class MSGCONTENT():
     PLAYER_ID = 15
     PLAYER_LIVES = 16
     PLAYER_SCORE = 17
+    WORLD_WIDTH = 18
+    WORLD_HEIGHT = 19
+    ROOM_ID = 20
 
     GAME_STATE = 50
 
@@ -128,6 +156,15 @@ class MSGCONTENT():
     Y_POS = 101
     ROTATION = 102
 
+    # Server simulation time (ms) that a snapshot was taken at
+    SERVER_TIME = 103
+
+    # Snapshot columns; each of these is a list, with one value per entity
+    ENTITY_IDS = 110
+    X_POSITIONS = 111
+    Y_POSITIONS = 112
+    ROTATIONS = 113
+
 class NETWORK(Names):
     """Modes for network behavior"""
 
@@ -11,28 +11,41 @@
 
 from threading import Thread, Lock
 import queue
-from queue import Queue
 import time
 
-import pygame
-
 from gamemodule import GameModule
-from constants import MSGCONTENT, GAME, NETWORK
+from idallocator import IdAllocator
+from broadcast import Broadcast
+import messages
+from constants import MESSAGES, GAME, NETWORK
 
 class Dispatcher(Thread, GameModule):
-    """Message dispatch module.  Facilitates communication between threads."""
+    """Message dispatch module.  Facilitates communication between threads.
+    Everything comes in through one queue, which the dispatcher sleeps on until there's work;
+    messages without a recipient are broadcast to every client in the sender's room.
+    """
 
-    def __init__(self, in_queue, server_queue, client_queue, remote_queue):
+    def __init__(self, in_queue, server_queue, client_queue, remote_queue, batch_size=256, wake_interval=0.5):
         Thread.__init__(self)
-        out_queue = Queue()
-        self.global_msg_queue = Queue()
-        GameModule.__init__(self, in_queue, out_queue)
+        # Broadcasts, and messages the dispatcher sends itself, share the one inbox
+        self.global_msg_queue = in_queue
+        GameModule.__init__(self, in_queue, in_queue)
 
         self.name = "Dispatch"
         self.server_queue = server_queue
         self.client_queue = client_queue
         self.remote_queue = remote_queue
         self.clients = set()
+        # Game rooms hosted here: each has its own server module (and inbox), and its own clients
+        self.rooms = {GAME.DEFAULT_ROOM_ID: server_queue}
+        self.room_clients = {}
+        # Which room each client's messages to the server should go to
+        self.client_rooms = {}
+        # Outbound queues for each remote client connected to us over the network
+        self.connections = {}
+        self.next_connection_id = GAME.FIRST_CONNECTION_ID
+        # Connections that have been given messages since they were last told to flush
+        self.unflushed = set()
 
         # Determines how message routing should behave in certain situations
         self.mode = NETWORK.MODE_SERVER
@@ -40,107 +53,241 @@ class Dispatcher(Thread, GameModule):
         self.running = True
 
         self.module_id = GAME.DISPATCHER_ID
-        self.next_id = GAME.LOCAL_SERVER_ID + 1
-        self.ids = [self.module_id, GAME.LOCAL_SERVER_ID]
+        self.ids = IdAllocator(GAME.LOCAL_SERVER_ID + 1)
+
+        # Most messages to route in one go, once woken up
+        self.batch_size = batch_size
+        # Longest to sleep without checking whether we've been stopped
+        self.wake_interval = wake_interval
 
-        # Timing
-        self.ms_per_frame = 1.0 / (GAME.FPS / 1.0) * 1000.0
-        self.last_ticks = 0
-        self.ticks_since_last_update = 0
+        # Statistics: time spent waiting for / routing messages (seconds), and how much was routed
+        self.idle_time = 0.0
+        self.busy_time = 0.0
+        self.msgs_routed = 0
+        self.batches = 0
 
         self.lock = Lock()
 
     def run(self):
         """Gets called at thread start"""
         while self.running:
-            self.route_global_msgs()
-            self.check_msgs()
-            self.route_msgs()
-            self.update()
+            self.route_batch()
+        self.update()
+
+    def stop(self):
+        """Ask the dispatcher thread to finish, waking it up if it's waiting"""
+
+        self.running = False
+        self.in_queue.put(None)
 
-    def route_global_msgs(self):
-        """Route messages intended for all clients"""
+    def route_batch(self):
+        """Wait for messages, then route everything that's arrived (up to batch_size)"""
 
-        while True:
+        started = time.perf_counter()
+        try:
+            msg = self.in_queue.get(True, self.wake_interval)
+        except queue.Empty:
+            self.idle_time += time.perf_counter() - started
+            return
+        woke = time.perf_counter()
+        self.idle_time += woke - started
+
+        count = 0
+        while msg is not None:
+            self.route_msg(msg)
+            count += 1
+            if count >= self.batch_size:
+                break
             try:
-                msg_type, msg_content = self.global_msg_queue.get_nowait()
-                self.global_msg_queue.task_done()
-                for an_id in self.clients:
-                    new_content = msg_content.copy()
-                    new_content[MSGCONTENT.RECIPIENT_ID] = an_id
-                    msg = (msg_type, new_content)
-                    self.in_queue.put(msg, True)
+                msg = self.in_queue.get_nowait()
             except queue.Empty:
                 break
 
-    def process_msg(self, msg_type, sender_id, msg_content):
-        """Checks whether incoming messages have recipient IDs"""
-        recipient_id = msg_content.pop(MSGCONTENT.RECIPIENT_ID)
-        # Pass message on for routing
-        if recipient_id is not None:
-            self.send_msg(msg_type, recipient_id, *[(k, v) for k, v in msg_content.items()])
-        else:
-            self.log('Received %s message but recipient ID is missing' % msg_type.name)
-
-    def route_msgs(self):
-        """Redirect incoming messages to specific queues"""
-        while not self.out_queue.empty():
-            msg_type, msg_content = self.out_queue.get_nowait()
-            # print(msg_type)
-            self.out_queue.task_done()
-
-            recipient_id = int(msg_content.get(MSGCONTENT.RECIPIENT_ID))
-            if recipient_id is not None:
-                msg = (msg_type, msg_content)
-                if recipient_id == GAME.LOCAL_SERVER_ID:
-                    # In server mode, messages for the server should go to the server component
-                    if self.mode == NETWORK.MODE_SERVER:
-                        self.server_queue.put(msg, True)
-                    # In client mode, the server is remote, so direct its messages to the network outbox
-                    else:
-                        self.remote_queue.put(msg, True)
-                elif recipient_id == GAME.LOCAL_CLIENT_ID:
-                    # "Local" is relative to the server, so if we're on a remote client, then local client messages
-                    #   should go to the remote client
-                    if self.mode == NETWORK.MODE_SERVER:
-                        self.client_queue.put(msg, True)
-                    else:
-                        self.remote_queue.put(msg, True)
-                elif recipient_id == GAME.REMOTE_CLIENT_ID:
-                    # Similarly, "Remote" is also relative
-                    if self.mode == NETWORK.MODE_SERVER:
-                        self.remote_queue.put(msg, True)
-                    else:
-                        self.client_queue.put(msg, True)
-                else:
-                    self.log('Recipient ID %d is not registered.' % (recipient_id))
+        self.msgs_routed += count
+        self.batches += 1
+        self.busy_time += time.perf_counter() - woke
+
+    def route_global_msg(self, msg):
+        """Route a message intended for all clients (in the sender's room).
+        Rather than a copy per client, one shared Broadcast goes to each queue involved.
+        """
+
+        room_id = msg.room_id
+        msg.room_id = None
+        with self.lock:
+            if room_id is None:
+                recipients = frozenset(self.clients)
+            else:
+                recipients = frozenset(self.room_clients.get(room_id, ()))
+        if not recipients:
+            return
+
+        broadcast = Broadcast(msg, recipients)
+        for an_id in recipients:
+            # (Looked up just once, since network threads can unregister connections at any time)
+            connection = self.connections.get(an_id)
+            if connection is not None:
+                # Network connections serialize the broadcast themselves (see networking.py)
+                connection.put(broadcast, True)
+                self.unflushed.add(an_id)
+            elif an_id == GAME.LOCAL_CLIENT_ID:
+                self.client_queue.put(broadcast.msg, True)
+            elif an_id == GAME.REMOTE_CLIENT_ID:
+                self.remote_queue.put(broadcast.msg, True)
+            else:
+                self.log('Recipient ID %d is not registered.' % (an_id))
+
+    def route_msg(self, msg):
+        """Redirect an incoming message to the queue for its recipient"""
+
+        recipient_id = msg.recipient_id
+        if recipient_id is None:
+            if self.mode == NETWORK.MODE_CLIENT:
+                # Broadcasts from a remote server arrive without a recipient; they're for us
+                self.client_queue.put(msg, True)
+            else:
+                # No particular recipient, so it's for everyone
+                self.route_global_msg(msg)
+            return
+
+        msg_type = msg.msg_type
+        # (Looked up just once, since network threads can unregister connections at any time)
+        connection = self.connections.get(recipient_id)
+        if recipient_id == GAME.DISPATCHER_ID:
+            # For us
+            if msg_type == MESSAGES.TERMINATE:
+                self.running = False
+            elif msg_type == MESSAGES.PING:
+                self.send(messages.Pong(), msg.sender_id)
+            elif msg_type == MESSAGES.FLUSH:
+                self.flush_connections(msg)
+        elif recipient_id == GAME.LOCAL_SERVER_ID:
+            # In server mode, messages for the server should go to the server for the sender's room
+            if self.mode == NETWORK.MODE_SERVER:
+                self.route_to_room(msg)
+            # In client mode, the server is remote, so direct its messages to the network outbox
             else:
-                self.log('No recipient ID specified.  Message type: %s' % msg_type)
-    
+                self.remote_queue.put(msg, True)
+        elif recipient_id == GAME.LOCAL_CLIENT_ID:
+            # "Local" is relative to the server, so if we're on a remote client, then local client messages
+            #   should go to the remote client
+            if self.mode == NETWORK.MODE_SERVER:
+                self.client_queue.put(msg, True)
+            else:
+                self.remote_queue.put(msg, True)
+        elif self.mode == NETWORK.MODE_CLIENT:
+            # On a remote client, everything else is for us; the server decides our ID
+            self.client_queue.put(msg, True)
+        elif connection is not None:
+            # A remote client; send it out over its own connection
+            connection.put(msg, True)
+            self.unflushed.add(recipient_id)
+        elif recipient_id == GAME.REMOTE_CLIENT_ID:
+            self.remote_queue.put(msg, True)
+        else:
+            self.log('Recipient ID %d is not registered.' % (recipient_id))
+
+    def flush_connections(self, msg):
+        """Pass a FLUSH from a server on to every connection that's been given messages since the
+        last one, so that they send everything from the tick that just finished
+        """
+
+        for connection_id in self.unflushed:
+            connection = self.connections.get(connection_id)
+            if connection is not None:
+                connection.put(msg, True)
+        self.unflushed.clear()
+
+    def route_to_room(self, msg):
+        """Pass a message for the server on to the room that the sending client is in"""
+
+        msg_type = msg.msg_type
+        sender_id = msg.sender_id
+        # Clients pick a room when they ask to connect (unless they're already playing in one)
+        if msg_type == MESSAGES.REQCONNECT and sender_id not in self.clients:
+            room_id = msg.room_id if msg.room_id is not None else GAME.DEFAULT_ROOM_ID
+            if room_id not in self.rooms:
+                self.log('Client %s asked for nonexistent room %s' % (sender_id, room_id))
+                reject = messages.ConnectReject()
+                reject.sender_id = GAME.LOCAL_SERVER_ID
+                reject.recipient_id = sender_id
+                self.out_queue.put(reject, True)
+                return
+            self.client_rooms[sender_id] = room_id
+
+        room_queue = self.rooms.get(self.client_rooms.get(sender_id, GAME.DEFAULT_ROOM_ID))
+        if msg_type == MESSAGES.SIGNAL_DISCONNECT:
+            self.client_rooms.pop(sender_id, None)
+        if room_queue is not None:
+            room_queue.put(msg, True)
+        else:
+            self.log('Room for client %s has closed' % sender_id)
+
+    def register_room(self, room_id, room_queue):
+        """Host a game room; messages for it go to room_queue"""
+        with self.lock:
+            self.rooms[room_id] = room_queue
+
+    def unregister_room(self, room_id):
+        """Stop routing messages to a game room (and drop its clients)"""
+        with self.lock:
+            self.rooms.pop(room_id, None)
+        self.drop_room_clients(room_id)
+
+    def drop_room_clients(self, room_id):
+        """Forget about everyone playing in (or joining) a room whose game has been lost, and tell
+        them they've been disconnected, so that they can join again from scratch
+        """
+        with self.lock:
+            client_ids = set(self.room_clients.pop(room_id, ()))
+            client_ids.update(client_id for client_id, client_room in list(self.client_rooms.items()) if client_room == room_id)
+            for client_id in client_ids:
+                self.clients.discard(client_id)
+                self.client_rooms.pop(client_id, None)
+        for client_id in client_ids:
+            msg = messages.SignalDisconnect()
+            msg.sender_id = GAME.LOCAL_SERVER_ID
+            msg.recipient_id = client_id
+            self.out_queue.put(msg, True)
+
+    def join_room(self, client_id, room_id):
+        """Record that a client is now playing in a room, so it gets that room's broadcasts"""
+        with self.lock:
+            self.clients.add(client_id)
+            self.room_clients.setdefault(room_id, set()).add(client_id)
+
+    def leave_room(self, client_id, room_id):
+        """Record that a client has left a room"""
+        with self.lock:
+            self.clients.discard(client_id)
+            members = self.room_clients.get(room_id)
+            if members is not None:
+                members.discard(client_id)
+
+    def register_connection(self, outbound_queue):
+        """Assign an ID to a new network connection; messages for that ID go to outbound_queue"""
+        with self.lock:
+            connection_id = self.next_connection_id
+            self.next_connection_id += 1
+            self.connections[connection_id] = outbound_queue
+        self.log('Registered connection %d' % connection_id)
+        return connection_id
+
+    def unregister_connection(self, connection_id):
+        """Forget about a network connection that has closed"""
+        with self.lock:
+            self.connections.pop(connection_id, None)
+        self.log('Unregistered connection %d' % connection_id)
+
     def get_id(self):
         "Get either a discarded ID or hand out a new one"
-        self.lock.acquire()
-        for an_id in range(GAME.LOCAL_SERVER_ID+1, self.next_id):
-            if an_id not in self.ids:
-                # Found an unused id less than next_id
-                self.log('Reusing id %d' % an_id)
-                self.ids.append(an_id)
-                self.lock.release()
-                return an_id
-        # didn't find any unused ids below next_id
-        an_id = self.next_id
-        self.ids.append(an_id)
-        self.next_id += 1
+        an_id = self.ids.get_id()
         self.log('Generated id %d' % an_id)
-        self.lock.release()
         return an_id
 
     def release_id(self, an_id):
         """ Mark an id as unused"""
-        self.lock.acquire()
-        if an_id in self.ids:
-            self.ids.remove(an_id)
+        if self.ids.release_id(an_id):
             self.log('Released id %d' % an_id)
         else:
             self.log('Tried to release id %d, but it was not taken' % an_id)
-        self.lock.release()
@@ -17,7 +17,15 @@ from helperfuncs import distance, angle_vector
 class Entity():
     """Represents an entity (player ship, asteroid, bullet") in the game world."""
 
+    # The server keeps a lot of these around (and recycles them), so skip the per-instance __dict__
+    __slots__ = ('position', 'rotation', 'radius', 'velocity', 'angular_velocity', 'entity_id', 'entity_type',
+                 'components', 'should_destroy', 'turn_direction', 'thrust', 'forward', 'lifetime', 'elapsed',
+                 'player_id', 'visible', 'active')
+
     def __init__(self, pos=[0, 0], rot=0, vel=(0, 0), angular_vel=0, radius=0, entity_id=0, entity_type=GAME.ENTITY_NONE):
+        # These containers are reused each time the entity is initialized
+        self.components = []
+        self.forward = [0.0, 0.0]
         self.initialize(pos, rot, vel, angular_vel, radius, entity_id, entity_type)
 
     def initialize(self, pos=[0, 0], rot=0, vel=(0, 0), angular_vel=0, radius=0, entity_id=0, entity_type=GAME.ENTITY_NONE):
@@ -30,18 +38,23 @@ class Entity():
         self.angular_velocity = angular_vel
         self.entity_id = entity_id
         self.entity_type = entity_type
-        self.components = []
+        self.components.clear()
         self.should_destroy = False
 
         self.turn_direction = 0
         self.thrust = False
-        self.forward = angle_vector(math.radians(self.rotation))
+        forward = self.forward
+        forward[0], forward[1] = angle_vector(math.radians(self.rotation))
         self.lifetime = 0
         self.elapsed = 0
         self.player_id = -1
+        self.visible = False
+        self.active = False
     
     def add_component(self, component):
-        """Adds a component to this entity to add behavior to it."""
+        """Adds a component to this entity to add behavior to it.
+        Components without per-entity state can be shared (see components.py).
+        """
 
         self.components.append(component)
     
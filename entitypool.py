@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+class EntityPool():
+    """Recycles entity objects so that creating and destroying entities (e.g. bullets)
+    doesn't allocate.  Starts with prewarm entities, and whenever it runs dry it grows
+    to cover the most entities that have been in use at once, plus some headroom.
+    """
+
+    def __init__(self, factory, prewarm=100, headroom=0.25):
+        # Called with no arguments to make a new (uninitialized) entity
+        self.factory = factory
+        self.headroom = headroom
+        self.free = []
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.in_use = 0
+        self.peak = 0
+
+        self.reserve(prewarm)
+
+    def reserve(self, count):
+        """Make sure at least count entities are ready to be handed out"""
+
+        while len(self.free) < count:
+            self.free.append(self.factory())
+
+    def acquire(self):
+        """Get an entity to initialize and use"""
+
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+
+        if self.free:
+            self.hits += 1
+            return self.free.pop()
+
+        self.misses += 1
+        # Out of entities; grow ahead of demand, so the rest of this burst doesn't miss too
+        self.reserve(int(self.peak * self.headroom))
+        return self.factory()
+
+    def release(self, entity):
+        """Return an entity that's no longer in the game world"""
+
+        self.in_use -= 1
+        self.free.append(entity)
+
+    def stats(self):
+        """Hit/miss counts and sizes, for diagnostics"""
+
+        return {'hits': self.hits, 'misses': self.misses, 'free': len(self.free),
+                'in_use': self.in_use, 'peak': self.peak}
@@ -9,10 +9,24 @@
 #   The assets have been modified.
 #   https://opengameart.org/content/rocks-ships-stars-gold-and-more
 
+from collections import deque
+
 import pygame
 
 from constants import GAME
 
+def lerp_wrapped(a, b, t, size):
+    """Interpolate between a and b, taking the short way around a range that wraps at size"""
+
+    diff = b - a
+    if diff > size / 2:
+        diff -= size
+    elif diff < -size / 2:
+        diff += size
+    result = (a + diff * t) % size
+    # Float modulo can round tiny negative numbers up to size itself
+    return result if result < size else 0.0
+
 class SpriteInfo():
     """Packages together a few bits of data about a sprite/entity"""
     def __init__(self, entity_type, frames, max_frame, frame_ticks):
@@ -28,6 +42,8 @@ class EntitySprite(pygame.sprite.Sprite):
         self.ticks = 0
         self.image = None
         self.rect = None
+        # Recent server states, as (server time in ms, x, y, rotation), oldest first
+        self.states = deque(maxlen=GAME.INTERP_BUFFER)
         self.initialize(info, initial_pos, initial_rot, entity_id, entity_type)
 
     def initialize(self, info, initial_pos=(0, 0), initial_rot=0, entity_id=0, entity_type=GAME.ENTITY_NONE):
@@ -40,19 +56,60 @@ class EntitySprite(pygame.sprite.Sprite):
             self.max_frame = info.max_frame
             self.frame_ticks = info.frame_ticks
             if self.frames is not None:
-                self.image, self.rect = self.frames[self.current_frame][int(initial_rot)]
+                self.image, self.rect = self.frames[self.current_frame][initial_rot]
         self.position = initial_pos
         self.rotation = initial_rot
         self.entity_id = entity_id
         self.entity_type = entity_type
+        self.states.clear()
+
+    def push_state(self, server_time, pos, rot):
+        """Buffer a state received from the server, for interpolation"""
+
+        # Out-of-order or duplicate states can't be interpolated towards, so drop them
+        if self.states and server_time <= self.states[-1][0]:
+            return
+        self.states.append((server_time, pos[0], pos[1], rot))
+
+    def interpolate(self, render_time):
+        """Find position & rotation at render_time (server time, in ms) by blending the
+        buffered states on either side of it.
+        """
+
+        states = self.states
+        # Hold the oldest/newest state if render_time falls outside the buffer
+        if render_time <= states[0][0]:
+            return (states[0][1], states[0][2]), states[0][3]
+        if render_time >= states[-1][0]:
+            return (states[-1][1], states[-1][2]), states[-1][3]
+
+        # Find the pair of states that bracket render_time (newest pairs are the likeliest)
+        for i in range(len(states) - 1, 0, -1):
+            before = states[i-1]
+            if before[0] <= render_time:
+                after = states[i]
+                break
+        t = (render_time - before[0]) / (after[0] - before[0])
+        pos = (lerp_wrapped(before[1], after[1], t, GAME.WORLD_WIDTH),
+               lerp_wrapped(before[2], after[2], t, GAME.WORLD_HEIGHT))
+        rot = lerp_wrapped(before[3], after[3], t, 360)
+        return pos, rot
 
-    def update(self):
-        """Update sprite position, rotation, etc."""
+    def update(self, render_time=None, camera=None):
+        """Update sprite position, rotation, etc.
+        If render_time is given, the sprite is placed by interpolating buffered server states.
+        If camera is given, it decides where on the screen the sprite's world position is.
+        """
+        if render_time is not None and self.states:
+            self.position, self.rotation = self.interpolate(render_time)
         try:
-            self.image, self.rect = self.frames[self.current_frame][int(self.rotation)]
+            self.image, self.rect = self.frames[self.current_frame][self.rotation]
         except IndexError:
             print(str(self.current_frame)+' '+str(self.rotation))
-        self.rect = self.image.get_rect(center=self.position)
+        if camera is not None:
+            self.rect = self.image.get_rect(center=camera.to_screen(self.position))
+        else:
+            self.rect = self.image.get_rect(center=self.position)
 
         if self.entity_type == GAME.ENTITY_EXPLOSION:
             if self.current_frame < self.max_frame:
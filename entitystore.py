@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# NumPy is optional; the server only needs it when the vectorized entity store is enabled
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from constants import GAME
+from entity import Entity
+from components import PlayerComponent
+
+class EntityStore():
+    """Keeps the physical state of every server-side entity in parallel NumPy arrays
+    (struct-of-arrays) so that all of them can be integrated in a handful of batched
+    operations per tick, instead of one Python method call per entity and component.
+    """
+
+    def __init__(self, capacity=128):
+        if np is None:
+            raise RuntimeError('The vectorized entity store requires NumPy')
+
+        self.capacity = 0
+        self.count = 0
+        self.free_slots = []
+        # Maps slot number -> StoredEntity view
+        self.views = []
+
+        self.position = np.zeros((0, 2))
+        self.velocity = np.zeros((0, 2))
+        self.forward = np.zeros((0, 2))
+        self.rotation = np.zeros(0)
+        self.angular_velocity = np.zeros(0)
+        self.radius = np.zeros(0)
+        self.lifetime = np.zeros(0)
+        self.elapsed = np.zeros(0)
+        self.turn_direction = np.zeros(0)
+        self.entity_type = np.zeros(0, dtype=np.int32)
+        self.thrust = np.zeros(0, dtype=bool)
+        self.should_destroy = np.zeros(0, dtype=bool)
+        # Slots that currently belong to an entity in the game world
+        self.live = np.zeros(0, dtype=bool)
+
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        """Resize every column so that it can hold at least capacity entities"""
+
+        if capacity <= self.capacity:
+            return
+        extra = capacity - self.capacity
+
+        def extend(column, fill=0):
+            shape = (extra,) + column.shape[1:]
+            return np.concatenate((column, np.full(shape, fill, dtype=column.dtype)))
+
+        self.position = extend(self.position)
+        self.velocity = extend(self.velocity)
+        self.forward = extend(self.forward)
+        self.rotation = extend(self.rotation)
+        self.angular_velocity = extend(self.angular_velocity)
+        self.radius = extend(self.radius)
+        self.lifetime = extend(self.lifetime)
+        self.elapsed = extend(self.elapsed)
+        self.turn_direction = extend(self.turn_direction)
+        self.entity_type = extend(self.entity_type, GAME.ENTITY_NONE)
+        self.thrust = extend(self.thrust, False)
+        self.should_destroy = extend(self.should_destroy, False)
+        self.live = extend(self.live, False)
+
+        # Hand out low slots first so the live region stays compact
+        self.free_slots.extend(reversed(range(self.capacity, capacity)))
+        self.views.extend([None] * extra)
+        self.capacity = capacity
+
+    def allocate(self, view):
+        """Reserve a slot for a view; the slot stays with it for the view's lifetime"""
+
+        if not self.free_slots:
+            self.grow(max(self.capacity * 2, 16))
+        slot = self.free_slots.pop()
+        self.views[slot] = view
+        self.count += 1
+        return slot
+
+    def activate(self, slot):
+        """Mark a slot as part of the game world so it gets integrated"""
+
+        self.live[slot] = True
+
+    def deactivate(self, slot):
+        """Remove a slot from the game world without giving it up"""
+
+        self.live[slot] = False
+        self.should_destroy[slot] = False
+
+    def integrate(self, delta_time):
+        """Advance every live entity by delta_time seconds.
+        This mirrors the per-entity math in components.py, but for all entities at once.
+        """
+
+        live = self.live
+        players = live & (self.entity_type == GAME.ENTITY_PLAYERSHIP)
+
+        # Rotation (players steer, everyone else spins at a constant rate)
+        self.angular_velocity[players] = self.turn_direction[players] * PlayerComponent.avel
+        self.rotation[live] += self.angular_velocity[live] * delta_time
+        np.mod(self.rotation, 360, out=self.rotation, where=live)
+
+        # Thrust & friction only apply to player ships
+        if players.any():
+            angle = np.radians(self.rotation[players] + 90)
+            self.forward[players, 0] = np.cos(angle)
+            self.forward[players, 1] = -np.sin(angle)
+            thrusting = players & self.thrust
+            self.velocity[thrusting] += self.forward[thrusting] * PlayerComponent.acceleration
+            self.velocity[players] *= (1 - PlayerComponent.friction)
+
+        # Position, wrapping around the edges of the world
+        self.position[live] += self.velocity[live] * delta_time
+        np.mod(self.position, (GAME.WORLD_WIDTH, GAME.WORLD_HEIGHT), out=self.position, where=live[:, np.newaxis])
+
+        # Limited-lifetime entities (bullets, explosions)
+        self.elapsed[live] += delta_time
+        expired = live & (self.lifetime > 0) & (self.elapsed >= self.lifetime)
+        self.should_destroy |= expired
+
+    def flagged(self):
+        """Get the views of every live entity that is marked for destruction"""
+
+        return [self.views[slot] for slot in np.flatnonzero(self.live & self.should_destroy)]
+
+def _column_property(name):
+    """Build a property that reads/writes this entity's row in one of the store's columns"""
+
+    def getter(self):
+        return getattr(self.store, name)[self.slot]
+
+    def setter(self, value):
+        getattr(self.store, name)[self.slot] = value
+
+    return property(getter, setter)
+
+class StoredEntity(Entity):
+    """An Entity whose physical state lives in an EntityStore.
+    Exposes the same attributes as Entity, so the rest of the server can treat it as one.
+    The server decides when its slot takes part in the simulation (see EntityStore.activate).
+    """
+
+    position = _column_property('position')
+    velocity = _column_property('velocity')
+    forward = _column_property('forward')
+    rotation = _column_property('rotation')
+    angular_velocity = _column_property('angular_velocity')
+    radius = _column_property('radius')
+    lifetime = _column_property('lifetime')
+    elapsed = _column_property('elapsed')
+    turn_direction = _column_property('turn_direction')
+    entity_type = _column_property('entity_type')
+    thrust = _column_property('thrust')
+    should_destroy = _column_property('should_destroy')
+
+    __slots__ = ('store', 'slot')
+
+    def __init__(self, store, pos=[0, 0], rot=0, vel=(0, 0), angular_vel=0, radius=0, entity_id=0, entity_type=GAME.ENTITY_NONE):
+        self.store = store
+        self.slot = store.allocate(self)
+        Entity.__init__(self, pos, rot, vel, angular_vel, radius, entity_id, entity_type)
+
+    def update(self, delta_time):
+        """Stored entities are integrated in bulk by EntityStore.integrate"""
+        pass
@@ -11,8 +11,9 @@
 
 import queue
 
-from constants import GAME, MESSAGES, MSGCONTENT
+from constants import GAME, MESSAGES
 from helperfuncs import split_ip, rejoin_ip
+import messages
 
 # Base class for server & client modules
 class GameModule():
@@ -34,7 +35,7 @@ class GameModule():
         """Stub method for cleanup before termination"""
         pass
 
-    def process_msg(self, msg_type, sender_id, msg_content):
+    def process_msg(self, msg_type, sender_id, msg):
         """Stub method for processing messages"""
         pass
 
@@ -47,26 +48,27 @@ class GameModule():
             self.cleanup()
             self.log("quitting")
     
-    def prepare_msg(self, *content):
-        """Prepare an outgoing message by adding the sender ID to it"""
-        content_list = list(content)
-        if self.module_id != GAME.DISPATCHER_ID:
-            content_list.insert(0, (MSGCONTENT.ID, self.module_id))
+    def prepare_msg(self, msg_type, *content):
+        """Prepare an outgoing message from (MSGCONTENT key, value) pairs, adding the sender ID to it"""
 
-        # Convert *args to a dictionary
-        msg_content = {}
-        for pair in content_list:
-            msg_content[pair[0]] = pair[1]
-        
-        return msg_content
+        msg = messages.from_pairs(msg_type, *content)
+        if msg.sender_id is None and self.module_id != GAME.DISPATCHER_ID:
+            msg.sender_id = self.module_id
+        return msg
 
     def send_msg(self, msg_type, recipient_id, *content):
         """Send a message to another module (e.g. server, client, dispatch)"""
 
-        msg_content = self.prepare_msg(*content)
-        msg_content[MSGCONTENT.RECIPIENT_ID] = recipient_id
+        msg = self.prepare_msg(msg_type, *content)
+        msg.recipient_id = recipient_id
+        self.out_queue.put(msg, True)
+
+    def send(self, msg, recipient_id):
+        """Send an already-built message (see messages.py) to another module"""
 
-        msg = (msg_type, msg_content)
+        if self.module_id != GAME.DISPATCHER_ID:
+            msg.sender_id = self.module_id
+        msg.recipient_id = recipient_id
         self.out_queue.put(msg, True)
     
     def check_msgs(self):
@@ -75,20 +77,24 @@ class GameModule():
         # Check queue for new messages & respond to each
         while True:
             try:
-                msg_type, msg_content = self.in_queue.get_nowait()
-                self.in_queue.task_done()
+                msg = self.in_queue.get_nowait()
+            except queue.Empty:
+                break
 
-                sender_id = msg_content.get(MSGCONTENT.ID, None)
-                if sender_id is not None:
-                    self.process_msg(msg_type, sender_id, msg_content)
+            msg_type = msg.msg_type
+            sender_id = msg.sender_id
+            if sender_id is not None:
+                self.process_msg(msg_type, sender_id, msg)
 
-                if msg_type == MESSAGES.TERMINATE:
-                    self.running = False
+            if msg_type == MESSAGES.TERMINATE:
+                self.running = False
 
-                elif msg_type == MESSAGES.PING:
-                    self.send_msg(MESSAGES.PONG, sender_id)
-            except queue.Empty:
-                break
+            elif msg_type == MESSAGES.PING:
+                self.send(messages.Pong(), sender_id)
+
+            # Once handled, high-frequency messages go back to their pool
+            if msg.pool is not None:
+                msg.release()
 
     # Sometimes useful, but slows the game down very badly
     def log(self, msg):
@@ -96,13 +102,3 @@ class GameModule():
 
         # print("%s(%d): %s" % (self.name, self.module_id, msg))
         pass
-    
-    def assert_msg_content(self, msg_type, msg_content, *expected_content):
-        """Make sure that a given msg_content has all of the sections you're looking for"""
-
-        found_all_expected_content = True
-        for content_type in expected_content:
-            if msg_content.get(content_type, None) is None:
-                self.log('Received %s, did not find expected %s' % (msg_type.name, content_type.name))
-                found_all_expected_content = False
-        return found_all_expected_content
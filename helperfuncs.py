@@ -51,4 +51,10 @@ def angle_vector(angle):
     return [math.cos(angle), -math.sin(angle)]
 
 def distance(a, b):
-    return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2)
\ No newline at end of file
+    return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2)
+
+def wrapped_distance(a, b, width, height):
+    """Distance between two points in a world that wraps around at width and height"""
+    dx = abs(a[0] - b[0]) % width
+    dy = abs(a[1] - b[1]) % height
+    return math.sqrt(min(dx, width - dx)**2 + min(dy, height - dy)**2)
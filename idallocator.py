@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+from threading import Lock
+from collections import deque
+
+# An ID is a slot index in the low bits, plus a generation count in the bits above it.
+#   The generation goes up every time the slot is reused, so a stale message about a
+#   destroyed entity can't be mistaken for one about whatever replaced it.
+#   (IDs stay below 2**31, so they fit in a signed 32-bit integer.)
+INDEX_BITS = 20
+INDEX_MASK = (1 << INDEX_BITS) - 1
+GENERATION_MASK = (1 << (31 - INDEX_BITS)) - 1
+
+def id_index(an_id):
+    """Slot index part of an ID"""
+    return an_id & INDEX_MASK
+
+def id_generation(an_id):
+    """Generation part of an ID"""
+    return an_id >> INDEX_BITS
+
+class IdAllocator():
+    """Hands out unique integer IDs in O(1), reusing the slots of released ones.
+    Released slots go to the back of a queue, so they're reused as late as possible,
+    and come back with a new generation.
+    Each game room has its own, so entity IDs in one room don't use up those of another.
+    """
+
+    def __init__(self, first_id=1):
+        # Slots below first_id are never handed out (they're reserved for module IDs)
+        self.first_id = first_id
+        self.next_index = first_id
+        # Per slot: current generation, and whether it's in use
+        self.generations = [0] * first_id
+        self.live = bytearray(first_id)
+        self.free = deque()
+        self.lock = Lock()
+
+    def _allocate(self):
+        if self.free:
+            index = self.free.popleft()
+        else:
+            index = self.next_index
+            if index > INDEX_MASK:
+                raise RuntimeError('Out of IDs')
+            self.next_index += 1
+            self.generations.append(0)
+            self.live.append(0)
+        self.live[index] = 1
+        return (self.generations[index] << INDEX_BITS) | index
+
+    def _release(self, an_id):
+        index = an_id & INDEX_MASK
+        if (index < self.first_id or index >= self.next_index or not self.live[index] or
+                self.generations[index] != an_id >> INDEX_BITS):
+            return False
+        self.live[index] = 0
+        self.generations[index] = (self.generations[index] + 1) & GENERATION_MASK
+        self.free.append(index)
+        return True
+
+    def get_id(self):
+        """Hand out an unused ID"""
+
+        with self.lock:
+            return self._allocate()
+
+    def get_ids(self, count):
+        """Hand out count unused IDs at once"""
+
+        with self.lock:
+            return [self._allocate() for x in range(count)]
+
+    def release_id(self, an_id):
+        """Mark an id as unused.  Returns False if it wasn't taken."""
+
+        with self.lock:
+            return self._release(an_id)
+
+    def release_ids(self, ids):
+        """Mark several ids as unused at once.  Returns how many of them were taken."""
+
+        with self.lock:
+            return sum(1 for an_id in ids if self._release(an_id))
+
+    def is_live(self, an_id):
+        """Whether an ID is currently handed out (and not stale)"""
+
+        index = an_id & INDEX_MASK
+        return (self.first_id <= index < self.next_index and bool(self.live[index]) and
+                self.generations[index] == an_id >> INDEX_BITS)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# RSA keys for the network handshake.  Generating one takes long enough to notice, so they're
+#   made on a background thread (started as early as possible) and cached on disk, where they're
+#   reused until they get too old and are replaced.
+
+import os
+from os import path
+import random
+import time
+from threading import Thread, Condition
+
+from Crypto.PublicKey import RSA
+
+KEY_BITS = 1024
+
+# Where keys are kept between runs (None to keep them in memory only)
+KEY_CACHE_DIR = path.join(path.expanduser('~'), '.astroblast', 'keys')
+
+# Keys are replaced once they're this old (seconds)
+KEY_LIFETIME = 24 * 60 * 60
+
+class KeyPool():
+    """Keeps RSA keys ready to hand out, loading them from the cache or generating them on a
+    background thread.  Keys are handed out in turn, so with enough of them each network
+    manager gets its own.
+    """
+
+    def __init__(self, size=1, cache_dir=KEY_CACHE_DIR, lifetime=KEY_LIFETIME, bits=KEY_BITS):
+        # How many unexpired keys to keep
+        self.size = size
+        self.cache_dir = cache_dir
+        self.lifetime = lifetime
+        self.bits = bits
+
+        # (key, when it was created, its cache file or None)
+        self.keys = []
+        self.next_key = 0
+        self.loaded = False
+        self.lock = Condition()
+        self.thread = None
+
+    def start(self):
+        """Start topping up the pool in the background, if it needs it.  Safe to call any number of times."""
+
+        with self.lock:
+            if self.thread is None and (not self.loaded or self.fresh_count() < self.size):
+                self.thread = Thread(target=self.fill, name='Key pool', daemon=True)
+                self.thread.start()
+
+    def get(self):
+        """Hand out a key, waiting for the first one to be ready if need be"""
+
+        self.start()
+        with self.lock:
+            while not self.keys:
+                self.lock.wait()
+            key = self.keys[self.next_key % len(self.keys)][0]
+            self.next_key += 1
+            return key
+
+    def fill(self):
+        """Load the cache, then generate keys until there are enough unexpired ones.
+        Expired keys are still handed out until their replacements are ready.
+        """
+
+        try:
+            if not self.loaded:
+                loaded = self.load_cache()
+                with self.lock:
+                    self.keys.extend(loaded)
+                    self.loaded = True
+                    self.lock.notify_all()
+            while True:
+                with self.lock:
+                    if self.fresh_count() >= self.size:
+                        break
+                key = RSA.generate(self.bits)
+                entry = (key, time.time(), self.save(key))
+                with self.lock:
+                    self.keys.append(entry)
+                    self.lock.notify_all()
+            self.discard_expired()
+        finally:
+            with self.lock:
+                self.thread = None
+
+    def fresh_count(self):
+        now = time.time()
+        return sum(1 for key, created, filename in self.keys if now - created < self.lifetime)
+
+    def discard_expired(self):
+        """Forget (and delete) expired keys"""
+
+        now = time.time()
+        with self.lock:
+            expired = [entry for entry in self.keys if now - entry[1] >= self.lifetime]
+            self.keys = [entry for entry in self.keys if now - entry[1] < self.lifetime]
+        for key, created, filename in expired:
+            if filename is not None:
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+
+    def load_cache(self):
+        """Read in the cached keys (in random order, so that servers sharing a cache don't all
+        start with the same one)
+        """
+
+        loaded = []
+        if self.cache_dir is None:
+            return loaded
+        try:
+            names = [name for name in os.listdir(self.cache_dir) if name.endswith('.pem')]
+        except OSError:
+            return loaded
+        for name in names:
+            filename = path.join(self.cache_dir, name)
+            try:
+                with open(filename, 'rb') as f:
+                    key = RSA.importKey(f.read())
+                created = path.getmtime(filename)
+            except (OSError, ValueError, IndexError, TypeError):
+                # Unreadable or garbled; skip it
+                continue
+            if key.has_private() and key.size_in_bits() == self.bits:
+                loaded.append((key, created, filename))
+        random.shuffle(loaded)
+        return loaded
+
+    def save(self, key):
+        """Write a key to the cache (readable only by this user).  Returns its file name, or None
+        if it couldn't be written.
+        """
+
+        if self.cache_dir is None:
+            return None
+        filename = path.join(self.cache_dir, '%d-%s.pem' % (time.time(), os.urandom(4).hex()))
+        temp_filename = filename + '.tmp'
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            fd = os.open(temp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key.exportKey())
+            # (So that nobody reads a half-written key)
+            os.replace(temp_filename, filename)
+        except OSError:
+            return None
+        return filename
+
+# Shared by every network manager that isn't given a pool of its own
+default_pool = KeyPool()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Typed messages.  Each message type gets its own class with a fixed set of fields, generated
+#   from SCHEMA below, so building one is a plain constructor call (no dicts), and a message
+#   that's missing a required field can't be constructed in the first place.
+
+from constants import MESSAGES, MSGCONTENT
+
+# For each message type: class name, required fields, optional fields (MSGCONTENT keys, in order)
+_ENTITY_FIELDS = (MSGCONTENT.ENTITY_ID, MSGCONTENT.ENTITY_TYPE, MSGCONTENT.X_POS, MSGCONTENT.Y_POS, MSGCONTENT.ROTATION)
+SCHEMA = {
+    MESSAGES.TEST: ('Test', (), ()),
+    MESSAGES.TERMINATE: ('Terminate', (), ()),
+    MESSAGES.FLUSH: ('Flush', (), ()),
+    MESSAGES.PING: ('Ping', (), ()),
+    MESSAGES.PONG: ('Pong', (), ()),
+    MESSAGES.SIGNAL_DISCONNECT: ('SignalDisconnect', (), ()),
+    MESSAGES.CREATE_ENTITY: ('CreateEntity', _ENTITY_FIELDS, (MSGCONTENT.PLAYER_ID,)),
+    MESSAGES.DESTROY_ENTITY: ('DestroyEntity', (MSGCONTENT.ENTITY_ID,), ()),
+    MESSAGES.UPDATEPOS: ('UpdatePos', (MSGCONTENT.ENTITY_ID, MSGCONTENT.X_POS, MSGCONTENT.Y_POS), ()),
+    MESSAGES.UPDATEROT: ('UpdateRot', (MSGCONTENT.ENTITY_ID, MSGCONTENT.ROTATION), ()),
+    MESSAGES.SNAPSHOT: ('Snapshot', (MSGCONTENT.SERVER_TIME, MSGCONTENT.ENTITY_IDS, MSGCONTENT.X_POSITIONS,
+                                     MSGCONTENT.Y_POSITIONS, MSGCONTENT.ROTATIONS), ()),
+    MESSAGES.ENTITY_ENTER: ('EntityEnter', _ENTITY_FIELDS, (MSGCONTENT.PLAYER_ID,)),
+    MESSAGES.ENTITY_LEAVE: ('EntityLeave', (MSGCONTENT.ENTITY_ID,), ()),
+    MESSAGES.UPDATELIVES: ('UpdateLives', (MSGCONTENT.PLAYER_LIVES,), ()),
+    MESSAGES.UPDATESCORE: ('UpdateScore', (MSGCONTENT.PLAYER_SCORE,), ()),
+    MESSAGES.REQCONNECT: ('ReqConnect', (), ()),
+    MESSAGES.REQUPDATE: ('ReqUpdate', (), ()),
+    MESSAGES.SIGNAL_PLAYER_READY: ('SignalPlayerReady', (), ()),
+    MESSAGES.INPUT_RIGHT_DOWN: ('InputRightDown', (), ()),
+    MESSAGES.INPUT_RIGHT_UP: ('InputRightUp', (), ()),
+    MESSAGES.INPUT_LEFT_DOWN: ('InputLeftDown', (), ()),
+    MESSAGES.INPUT_LEFT_UP: ('InputLeftUp', (), ()),
+    MESSAGES.INPUT_THRUST_DOWN: ('InputThrustDown', (), ()),
+    MESSAGES.INPUT_THRUST_UP: ('InputThrustUp', (), ()),
+    MESSAGES.INPUT_DOWN_DOWN: ('InputDownDown', (), ()),
+    MESSAGES.INPUT_DOWN_UP: ('InputDownUp', (), ()),
+    MESSAGES.INPUT_SHOOT_DOWN: ('InputShootDown', (), ()),
+    MESSAGES.INPUT_SHOOT_UP: ('InputShootUp', (), ()),
+    MESSAGES.CONNECT_ACCEPT: ('ConnectAccept', (MSGCONTENT.SET_ID, MSGCONTENT.WORLD_WIDTH, MSGCONTENT.WORLD_HEIGHT), ()),
+    MESSAGES.CONNECT_REJECT: ('ConnectReject', (), ()),
+    MESSAGES.CONNECT_SUCCESS: ('ConnectSuccess', (), ()),
+    MESSAGES.CHANGE_STATE: ('ChangeState', (MSGCONTENT.GAME_STATE,), ()),
+}
+
+# High-frequency message types that keep a pool of spare instances (see Message.acquire)
+POOLED = frozenset((MESSAGES.SNAPSHOT, MESSAGES.UPDATEPOS, MESSAGES.UPDATEROT))
+POOL_LIMIT = 256
+
+# Attribute names for each content key, e.g. MSGCONTENT.X_POS -> 'x_pos'
+FIELD_NAMES = {value: name.lower() for name, value in vars(MSGCONTENT).items()
+               if name.isupper() and isinstance(value, int)}
+# Every message can carry these; they're about where it's going rather than what it says
+FIELD_NAMES[MSGCONTENT.ID] = 'sender_id'
+FIELD_NAMES[MSGCONTENT.RECIPIENT_ID] = 'recipient_id'
+FIELD_NAMES[MSGCONTENT.ROOM_ID] = 'room_id'
+HEADER = (MSGCONTENT.ID, MSGCONTENT.RECIPIENT_ID, MSGCONTENT.ROOM_ID)
+
+class Message():
+    """Base class for all messages.
+    Fields are attributes (e.g. msg.entity_id), but messages can also be read like the
+    content dicts they replace (msg[MSGCONTENT.ENTITY_ID], msg.get(...), msg.items()),
+    and unpack into (msg_type, msg) like the old (msg_type, msg_content) tuples.
+    """
+
+    __slots__ = ('sender_id', 'recipient_id', 'room_id')
+
+    msg_type = MESSAGES.NONE
+    # Content keys, in constructor order, and how many of them are required
+    fields = ()
+    required = 0
+    # Attribute names for fields, in the same order
+    names = ()
+    # Content key -> attribute name, for every key this type has (including the header)
+    attrs = {}
+    pool = None
+
+    def __init__(self, *args, **kwargs):
+        """Fields are given in order (see fields), or by name; optional ones default to None.
+        The header starts out empty.
+        """
+
+        names = self.names
+        if len(args) > len(names):
+            raise TypeError('%s takes at most %d fields (%d given)' % (self.__class__.__name__, len(names), len(args)))
+        self.sender_id = None
+        self.recipient_id = None
+        self.room_id = None
+        for name, value in zip(names, args):
+            setattr(self, name, value)
+        for index in range(len(args), len(names)):
+            name = names[index]
+            if name in kwargs:
+                setattr(self, name, kwargs.pop(name))
+            elif index < self.required:
+                raise TypeError('%s is missing required field %r' % (self.__class__.__name__, name))
+            else:
+                setattr(self, name, None)
+        if kwargs:
+            raise TypeError('%s has no field %r' % (self.__class__.__name__, next(iter(kwargs))))
+
+    def __iter__(self):
+        # msg_type, msg_content = msg
+        yield self.msg_type
+        yield self
+
+    @classmethod
+    def acquire(cls, *args):
+        """Construct a message, reusing a released instance if one's available"""
+
+        pool = cls.pool
+        if pool:
+            msg = pool.pop()
+            cls.__init__(msg, *args)
+            return msg
+        return cls(*args)
+
+    def release(self):
+        """Give a message that's been fully handled back to its type's pool (if it has one).
+        Only call this when nothing else can still be holding on to the message.
+        """
+
+        # No need to clear the fields; acquire() sets all of them again
+        pool = self.pool
+        if pool is not None and len(pool) < POOL_LIMIT:
+            pool.append(self)
+
+    def copy(self):
+        msg = self.__class__.__new__(self.__class__)
+        for name in self.attrs.values():
+            setattr(msg, name, getattr(self, name))
+        return msg
+
+    def get(self, key, default=None):
+        name = self.attrs.get(key)
+        if name is None:
+            return default
+        value = getattr(self, name)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, self.attrs[key], value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        name = self.attrs.get(key)
+        if name is not None:
+            setattr(self, name, None)
+        return value
+
+    def items(self):
+        """(key, value) pairs for every field that's set, header first"""
+
+        for key, name in self.attrs.items():
+            value = getattr(self, name)
+            if value is not None:
+                yield key, value
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % (FIELD_NAMES[k], v) for k, v in self.items()))
+
+def _make_class(msg_type, class_name, required, optional):
+    """Build the class for one message type"""
+
+    fields = tuple(required) + tuple(optional)
+    names = tuple(FIELD_NAMES[key] for key in fields)
+    attrs = {key: FIELD_NAMES[key] for key in HEADER + fields}
+    cls = type(class_name, (Message,), {
+        '__slots__': names,
+        '__module__': __name__,
+        'msg_type': msg_type,
+        'fields': fields,
+        'required': len(required),
+        'names': names,
+        'attrs': attrs,
+        'pool': [] if msg_type in POOLED else None,
+    })
+    return cls
+
+# Message classes, by message type
+CLASSES = {}
+for _msg_type, (_class_name, _required, _optional) in SCHEMA.items():
+    CLASSES[_msg_type] = globals()[_class_name] = _make_class(_msg_type, _class_name, _required, _optional)
+
+def from_content(msg_type, msg_content):
+    """Build a message from a {MSGCONTENT key: value} dict (e.g. freshly decoded from the network).
+    Returns None for unknown message types, or if a required field is missing.
+    Keys the message type doesn't have are ignored.
+    """
+
+    cls = CLASSES.get(msg_type)
+    if cls is None:
+        return None
+    try:
+        args = [msg_content[key] for key in cls.fields[:cls.required]]
+    except KeyError:
+        return None
+    args.extend(msg_content.get(key) for key in cls.fields[cls.required:])
+    msg = cls(*args)
+    msg.sender_id = msg_content.get(MSGCONTENT.ID)
+    msg.recipient_id = msg_content.get(MSGCONTENT.RECIPIENT_ID)
+    msg.room_id = msg_content.get(MSGCONTENT.ROOM_ID)
+    return msg
+
+def from_pairs(msg_type, *content):
+    """Build a message from (MSGCONTENT key, value) pairs, as passed to GameModule.send_msg"""
+
+    return from_content(msg_type, dict(content))
@@ -13,22 +13,109 @@ import socket
 from threading import Thread, Event
 import queue
 from queue import Queue
-from itertools import chain
-import ast
+import time
 
 from Crypto.PublicKey import RSA
-from Crypto.Cipher import PKCS1_OAEP
 
-from constants import MESSAGES, MSGCONTENT, NETWORK, GAME
+import keys
+from constants import NETWORK, GAME, MESSAGES
+from broadcast import Broadcast
+import messages
+from wire import encode_msg, decode_msg, encode_frame, FrameReader, ProtocolError
+from session import (SessionCipher, SessionReader, new_session_key, wrap_session_key, unwrap_session_key, seal_frame,
+                     new_nonce, sign_handshake, verify_handshake, NONCE_SIZE)
 from helperfuncs import get_lan_ip
 
-# Buffer size: This should be a small power of 2.
-BUFF_SIZE = 1024
+# Most bytes to read from a connection at once: This should be a power of 2.
+#   (Messages are framed, so a read can hold any number of them, including partial ones.)
+BUFF_SIZE = 65536
+
+# How long to wait for the other side's half of the handshake (seconds)
+HANDSHAKE_TIMEOUT = 10
+
+# Outgoing messages are held back and sent together once the server has finished the tick
+#   they're from (it sends a FLUSH), or once there are this many bytes of them.  Anything
+#   that isn't followed by a FLUSH goes out when the oldest has waited this long (seconds).
+MAX_BATCH = 65536
+MAX_BATCH_DELAY = 0.005
+
+# How often connection threads check whether it's time to stop (seconds)
+POLL_INTERVAL = 0.5
+
+# Give up on a connection that won't take any more data for this long (seconds)
+SEND_TIMEOUT = 5
+
+class OutboundBatcher():
+    """Collects packed messages going out on one connection, and writes them out together,
+    so that a tick's worth of messages costs one send() instead of one each.
+    Once the connection has a session cipher, each batch is encrypted as a whole.
+    """
+
+    def __init__(self, conn, max_batch=MAX_BATCH, max_delay=MAX_BATCH_DELAY, cipher=None):
+        self.conn = conn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.cipher = cipher
+        self.buffer = bytearray()
+        # When the oldest message in the buffer was added
+        self.started = 0
+
+        # Statistics
+        self.msgs = 0
+        self.batches = 0
+        self.bytes_sent = 0
+        self.syscalls = 0
+
+    def add(self, data):
+        """Queue up a packed message, sending the batch if it's full"""
+
+        if not self.buffer:
+            self.started = time.monotonic()
+        self.buffer += data
+        self.msgs += 1
+        if len(self.buffer) >= self.max_batch:
+            self.flush()
+
+    def wait_time(self):
+        """How long until the current batch is due (None if there isn't one, so no hurry)"""
+
+        if not self.buffer:
+            return None
+        return max(0, self.started + self.max_delay - time.monotonic())
+
+    def flush(self):
+        """Send everything queued up, whether or not it's due"""
+
+        if not self.buffer:
+            return
+        data = self.buffer if self.cipher is None else seal_frame(self.cipher, self.buffer)
+        view = memoryview(data)
+        sent = 0
+        deadline = time.monotonic() + SEND_TIMEOUT
+        try:
+            while sent < len(view):
+                try:
+                    sent += self.conn.send(view[sent:])
+                    self.syscalls += 1
+                except socket.timeout:
+                    if time.monotonic() > deadline:
+                        raise
+        finally:
+            view.release()
+        self.batches += 1
+        self.bytes_sent += sent
+        self.buffer.clear()
+
+    def stats(self):
+        """Counts, for diagnostics"""
+
+        return {'msgs': self.msgs, 'batches': self.batches, 'bytes': self.bytes_sent, 'syscalls': self.syscalls}
 
 class NetworkManager(Thread):
     """Handles and routes all internat traffic to and from remote clients/servers"""
 
-    def __init__(self, in_queue, dispatch, dispatch_queue, mode, port=50000, remote_server_addr='127.0.0.1', num_unaccepted=5):
+    def __init__(self, in_queue, dispatch, dispatch_queue, mode, port=50000, remote_server_addr='127.0.0.1', num_unaccepted=5, bind_addr=None,
+                 max_batch=MAX_BATCH, max_batch_delay=MAX_BATCH_DELAY, key_pool=None):
         Thread.__init__(self)
         # Queue of messages coming from dispatch
         self.in_queue = in_queue
@@ -36,7 +123,7 @@ class NetworkManager(Thread):
         self.dispatch = dispatch
         # Queue of translated messages going to dispatch
         self.dispatch_queue = dispatch_queue
-        # Queue of csvized messages going out to remote
+        # Queue of packed messages going out to remote
         self.remote_queue = Queue()
 
         self.mode = mode
@@ -47,24 +134,52 @@ class NetworkManager(Thread):
 
         self.kill_all_threads = Event()
 
-        # Generate a private RSA key
-        self.RSA_key = RSA.generate(1024)
+        # Private RSA key, and its public half as sent during the handshake; taken from the key pool
+        #   once the thread starts, so that creating a network manager never waits on one
+        self.key_pool = key_pool if key_pool is not None else keys.default_pool
+        self.key_pool.start()
+        self.RSA_key = None
+        self.local_pub_key = None
 
         self.name = 'Network'
         self.running = True
 
         self.remote_server_addr = remote_server_addr
         self.addr = '127.0.0.1'
+        # Address to listen on as a server (defaults to this machine's LAN IP)
+        self.bind_addr = bind_addr
+
+        # Outgoing batching settings, and the batcher for each open connection
+        self.max_batch = max_batch
+        self.max_batch_delay = max_batch_delay
+        self.batchers = {}
+
+    def new_batcher(self, conn, connection_id):
+        batcher = OutboundBatcher(conn, self.max_batch, self.max_batch_delay)
+        self.batchers[connection_id] = batcher
+        return batcher
+
+    def send_stats(self):
+        """Outgoing message/batch/byte/syscall counts, summed over open connections"""
+
+        totals = {'msgs': 0, 'batches': 0, 'bytes': 0, 'syscalls': 0}
+        for batcher in list(self.batchers.values()):
+            for k, v in batcher.stats().items():
+                totals[k] += v
+        return totals
 
     def run(self):
         """Gets called at thread start"""
 
+        self.RSA_key = self.key_pool.get()
+        self.local_pub_key = self.RSA_key.publickey().exportKey()
+
         # Open a socket and give it a half-second timeout
         s = socket.socket()
-        s.settimeout(0.5)
+        s.settimeout(POLL_INTERVAL)
 
         # Get the LAN IP address for this machine
-        self.addr = get_lan_ip()
+        self.addr = self.bind_addr if self.bind_addr is not None else get_lan_ip()
 
         # Logic for listening for messages as a server
         if self.mode == NETWORK.MODE_SERVER:
@@ -77,10 +192,10 @@ class NetworkManager(Thread):
                 try:
                     # Accept incoming connections
                     c, addr = s.accept()
-                    c.settimeout(0.5)
+                    c.settimeout(POLL_INTERVAL)
 
                     # We found a connection, so launch a new thread to listen/send to it
-                    t = Thread(target=on_new_client, args=(c, self.dispatch, self.dispatch_queue, self.in_queue, self.kill_all_threads, self.RSA_key))
+                    t = Thread(target=on_new_client, args=(c, self, self.dispatch_queue, self.kill_all_threads, self.local_pub_key))
                     running_threads.append(t)
                     t.start()
                 except socket.timeout:
@@ -95,113 +210,210 @@ class NetworkManager(Thread):
             # Running as a remote client
             conn = s
 
-            # Connect to the remote server
-            conn.connect((self.remote_server_addr, self.port))
-
             # Assign more idiomatic names to the queues, in this context
             local_to_remote_queue = self.in_queue
             remote_to_local_queue = self.dispatch_queue
 
-            # Listen for the server's public key
-            remote_pub_key = RSA.importKey(conn.recv(BUFF_SIZE))
-            # Generate our public key and send it to the server
-            local_pub_key = self.RSA_key.publickey().exportKey()
-            conn.send(local_pub_key)
-            while self.running:
-                # Handle any incoming or outgoing messages until it's time to go
-                handle_messages(conn, self.RSA_key, remote_pub_key, remote_to_local_queue, local_to_remote_queue)
-            
-            conn.close()
-
-def on_new_client(conn, dispatch, remote_to_local_queue, local_to_remote_queue, kill_flag, RSA_key):
+            reader = FrameReader()
+            batcher = self.new_batcher(conn, GAME.LOCAL_SERVER_ID)
+            sender = None
+            try:
+                # Connect to the remote server
+                conn.connect((self.remote_server_addr, self.port))
+
+                # Listen for the server's public key
+                remote_pub_key = recv_frame(conn, reader)
+                # Send our public key to the server, and a nonce for it to sign
+                nonce = new_nonce()
+                conn.sendall(encode_frame(self.local_pub_key) + encode_frame(nonce))
+                # The server answers with the key to encrypt everything else with, and its signature
+                #   to show that it's the holder of its public key (and that the answer isn't a replay)
+                wrapped_key = recv_frame(conn, reader)
+                signature = recv_frame(conn, reader)
+                verify_handshake(signature, remote_pub_key, self.local_pub_key, nonce, wrapped_key)
+                cipher = SessionCipher(unwrap_session_key(wrapped_key, self.RSA_key), False)
+                reader = SessionReader(cipher, reader)
+                batcher.cipher = cipher
+                sender = start_sender(conn, batcher, local_to_remote_queue)
+
+                while self.running:
+                    # Handle incoming messages until it's time to go
+                    if not receive_messages(conn, reader, remote_to_local_queue):
+                        break
+            except (OSError, EOFError, ValueError):
+                # Couldn't connect, garbled handshake, or the server went away
+                pass
+            finally:
+                if sender is not None:
+                    stop_sender(sender, local_to_remote_queue)
+                self.batchers.pop(GAME.LOCAL_SERVER_ID, None)
+                conn.close()
+
+def on_new_client(conn, network_mgr, remote_to_local_queue, kill_flag, local_pub_key):
     """Launches whenever a new client connects to the server"""
 
-    # Generate the public key and send it (server always sends first)
-    local_pub_key = RSA_key.publickey().exportKey()
-    conn.send(local_pub_key)
+    # Give this connection its own ID and outbound queue, so that the dispatcher can address it
+    dispatch = network_mgr.dispatch
+    local_to_remote_queue = Queue()
+    connection_id = dispatch.register_connection(local_to_remote_queue)
+    batcher = network_mgr.new_batcher(conn, connection_id)
+    sender = None
 
-    # Wait for the client's public key in response
-    remote_pub_key = RSA.importKey(conn.recv(BUFF_SIZE))
+    try:
+        # Send our public key (server always sends first)
+        conn.sendall(encode_frame(local_pub_key))
+
+        # Wait for the client's public key in response, and its nonce
+        reader = FrameReader()
+        remote_pub_key = recv_frame(conn, reader)
+        nonce = recv_frame(conn, reader)
+        if len(nonce) != NONCE_SIZE:
+            raise ValueError('Bad nonce')
+
+        # Make up a key for this session, and send it back encrypted with the client's public key,
+        #   signed to prove who it's from
+        session_key = new_session_key()
+        wrapped_key = wrap_session_key(session_key, RSA.importKey(remote_pub_key))
+        signature = sign_handshake(network_mgr.RSA_key, remote_pub_key, nonce, wrapped_key)
+        conn.sendall(encode_frame(wrapped_key) + encode_frame(signature))
+        cipher = SessionCipher(session_key, True)
+        reader = SessionReader(cipher, reader)
+        batcher.cipher = cipher
+        sender = start_sender(conn, batcher, local_to_remote_queue)
+
+        while not kill_flag.is_set():
+            # Handle incoming messages
+            if not receive_messages(conn, reader, remote_to_local_queue, connection_id):
+                break
+    except (OSError, EOFError, ValueError):
+        # Connection reset, garbled handshake, etc.
+        pass
+    finally:
+        if sender is not None:
+            stop_sender(sender, local_to_remote_queue)
+        network_mgr.batchers.pop(connection_id, None)
+        conn.close()
+        dispatch.unregister_connection(connection_id)
+        # Let the server know this client is gone, in case it couldn't say so itself
+        msg = messages.SignalDisconnect()
+        msg.sender_id = connection_id
+        msg.recipient_id = GAME.LOCAL_SERVER_ID
+        remote_to_local_queue.put(msg)
+
+def recv_frame(conn, reader, timeout=HANDSHAKE_TIMEOUT):
+    """Wait for a single frame (during the handshake, before messages start flowing).
+    Anything read past the end of it stays in the reader.
+    """
+
+    deadline = time.monotonic() + timeout
+    while not reader.frames:
+        try:
+            data = conn.recv(BUFF_SIZE)
+        except socket.timeout:
+            if time.monotonic() > deadline:
+                raise
+            continue
+        if not data:
+            raise EOFError('Connection closed during handshake')
+        reader.feed(data)
+    return reader.frames.popleft()
+
+def receive_messages(conn, reader, remote_to_local_queue, sender_id=None):
+    """Shared code between the server & client implementations: wait for incoming messages (for
+    up to the socket's timeout), and pass them on.
+    If sender_id is given, incoming messages are stamped with it, so the rest of the
+    server knows which connection they came from no matter what the remote side claims,
+    and addressed to the server.
+    Returns False once the connection has been closed (or the other side broke protocol).
+    """
 
-    while not kill_flag.is_set():
-        # Handle any incoming and outgoing messages
-        handle_messages(conn, RSA_key, remote_pub_key, remote_to_local_queue, local_to_remote_queue)
-    
-    conn.close()
+    try:
+        data = conn.recv(BUFF_SIZE)
+        if not data:
+            # The other side closed the connection
+            return False
 
-def handle_messages(conn, RSA_key, remote_pub_key, remote_to_local_queue, local_to_remote_queue):
-    """Shared code between the server & client implementations"""
+        # One read can finish any number of frames; each holds one message
+        reader.feed(data)
+    except socket.timeout:
+        pass
+    except ProtocolError:
+        return False
 
-    # Check for incoming messages
+    # Handle every complete frame so far (including any that arrived along with the handshake)
     try:
-        msg = conn.recv(BUFF_SIZE)
+        deliver_frames(reader, remote_to_local_queue, sender_id)
+    except ProtocolError:
+        return False
+    return True
+
+def send_messages(conn, batcher, local_to_remote_queue):
+    """Write out the messages dispatch queues up for a connection, until it's given None.
+    Runs on a thread of its own, which sleeps until there's something to send.
+    """
 
-        # Decrypt an incoming message
-        # plaintext_msg = RSA_key.decrypt(msg)
-        decryptor = PKCS1_OAEP.new(RSA_key)
-        plaintext_msg = decryptor.decrypt(ast.literal_eval(str(msg)))
+    try:
+        while True:
+            # Only a batch that's waiting to go out needs a timeout
+            try:
+                msg = local_to_remote_queue.get(True, batcher.wait_time())
+            except queue.Empty:
+                batcher.flush()
+                continue
+            local_to_remote_queue.task_done()
 
-        # Now deserialize it from CSV format
-        converted_msg = deserialize_msg(msg.decode())
+            if msg is None:
+                break
+            elif msg.msg_type == MESSAGES.FLUSH:
+                # The server's done with this tick
+                batcher.flush()
+            else:
+                # Queue it up to be sent to the remote client
+                batcher.add(pack_msg(msg))
+        batcher.flush()
+    except OSError:
+        # The connection's broken; make sure the receiving side notices too
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def start_sender(conn, batcher, local_to_remote_queue):
+    sender = Thread(target=send_messages, args=(conn, batcher, local_to_remote_queue), name='Network send', daemon=True)
+    sender.start()
+    return sender
+
+def stop_sender(sender, local_to_remote_queue):
+    """Have a connection's sending thread write out what it has left, and finish"""
+
+    local_to_remote_queue.put(None)
+    sender.join(SEND_TIMEOUT)
+
+def deliver_frames(reader, remote_to_local_queue, sender_id=None):
+    """Unpack the messages in all of the complete frames a reader has, and pass them on to dispatch.
+    Messages of unknown types, or with missing fields, are dropped.  (See receive_messages for sender_id.)
+    """
+
+    while reader.frames:
+        converted_msg = decode_msg(reader.frames.popleft())
+        if converted_msg is None:
+            continue
+        if sender_id is not None:
+            converted_msg.sender_id = sender_id
+            # Remote clients only ever talk to the server (in particular, they can't broadcast)
+            converted_msg.recipient_id = GAME.LOCAL_SERVER_ID
 
         # And send it to the dispatcher
         remote_to_local_queue.put(converted_msg)
-    except socket.timeout:
-        pass
 
-    # Process outgoing messages
-    while True:
-        try:
-            msg = local_to_remote_queue.get_nowait()
-            local_to_remote_queue.task_done()
-            # Convert message to CSV
-            converted_msg = serialize_msg(msg)
-            # Encrypt message
-            # encrypted_msg = remote_pub_key.encrypt(converted_msg, 32)
-            encryptor = PKCS1_OAEP.new(remote_pub_key)
-            encrypted_msg = encryptor.encrypt(converted_msg.encode('UTF-8'))
-            # Send to remote client
-            conn.send(converted_msg.encode('UTF-8'))
-
-        except queue.Empty:
-            break
-
-def serialize_msg(msg):
-    """Converts a message from our internal format into a comma-delimited string."""
-
-    # The message comes in as a tuple of (integer, Dictionary)
-    # The dictionary has integer keys and integer values
-    # print(msg)
-    msg_type, msg_content = msg
-    # Convert the keys into a list of strings
-    msgc_keys = [int(k) for k in list(msg_content.keys())]
-    # Get a list of the values as strings, too
-    msgc_values = [int(v) for v in list(msg_content.values())]
-    # Convert the entire message into a list of interleaved values
-    msg_list = list(chain([msg_type,], list(chain.from_iterable(zip(msgc_keys, msgc_values)))))
-    # Finally, convert the list into a CSV string
-    converted_msg = ','.join(str(x) for x in msg_list)
-    return converted_msg
+def pack_msg(msg):
+    """Pack an outgoing message (or broadcast) for the wire, and release it if it's pooled"""
 
-def deserialize_msg(msg):
-    """Converts a message from a comma-delimited string into our internal format."""
-
-    # The message comes in as a comma-delimited string of numbers
-    # First, split the message into a list
-    msg = msg.split(',')
-    # Next, pop off the first element, which is the msg_type
-    msg_type = int(msg.pop(0))
-    # msg now consists of interleaved string representations of the keys and values of the msg_content dicitonary,
-    #   so next we'll slice it into two separate lists consisting of the even elements (the keys)
-    #   and the odd elements (the values)
-    msg_keys = msg[::2]
-    msg_values = msg[1::2]
-    # Both the keys and values are still strings, so we need to convert the keys back into integers
-    #   and the values back into integers
-    msg_keys = [int(k) for k in msg_keys]
-    msg_values = [int(v) for v in msg_values]
-    # Now just zip them together and convert the result to a dictionary
-    msg_content = dict(zip(msg_keys, msg_values))
-    # Finally, combine msg_type and msg_content into a tuple to complete the internal message format.
-    converted_msg = (msg_type, msg_content)
+    # Broadcasts only get packed once, for every connection
+    if isinstance(msg, Broadcast):
+        return msg.encode(encode_msg)
+    converted_msg = encode_msg(msg)
+    # Done with it; high-frequency messages go back to their pool
+    if msg.pool is not None:
+        msg.release()
     return converted_msg
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+from constants import GAME
+
+def entity_state(entity):
+    """The replicated part of an entity's state, as an (x, y, rotation) tuple"""
+
+    return (float(entity.position[0]), float(entity.position[1]), float(entity.rotation))
+
+def rotation_difference(a, b):
+    """Smallest difference between two angles in degrees, accounting for wrap-around"""
+
+    diff = abs(a - b) % 360
+    return min(diff, 360 - diff)
+
+class ReplicationState():
+    """Tracks what each client was last told about each entity, so that the server only
+    needs to send updates for entities whose state changed noticeably since then.
+
+    Clients are connected over TCP, which is reliable and ordered, so a client's baseline
+    is simply the last state that was sent to it.
+
+    With interest management, a client's baseline only holds the entities it currently
+    knows about (those near it); update_interest() moves entities in and out of it.
+    """
+
+    def __init__(self, pos_threshold=1.0, rot_threshold=1.0, refresh_interval=GAME.FPS, interest_managed=False):
+        # Smallest change in position (pixels) or rotation (degrees) that gets replicated
+        self.pos_threshold = pos_threshold
+        self.rot_threshold = rot_threshold
+        # Every client gets the full state of every entity this often (in ticks),
+        #   to heal any drift below the thresholds
+        self.refresh_interval = refresh_interval
+
+        # client_id -> {entity_id: state last sent to that client}
+        self.baselines = {}
+        # client_id -> tick of the last full refresh
+        self.last_refresh = {}
+        # entity_id -> state seen during the previous pass
+        self.previous = {}
+        # Entities whose state changed at all since the previous pass
+        self.dirty = []
+
+        self.interest_managed = interest_managed
+        # Entities created since the previous pass (interest management only)
+        self.spawned = set()
+
+    def add_client(self, client_id, entities, tick=0):
+        """Start tracking a client that has just been sent the current state of entities"""
+
+        if self.interest_managed:
+            # Entities will be introduced as they come into view
+            entities = ()
+        self.baselines[client_id] = {e.entity_id: entity_state(e) for e in entities}
+        self.last_refresh[client_id] = tick
+
+    def remove_client(self, client_id):
+        """Stop tracking a client"""
+
+        self.baselines.pop(client_id, None)
+        self.last_refresh.pop(client_id, None)
+
+    def track(self, entity):
+        """Record a newly-created entity, whose initial state went out to every client
+        (or, with interest management, will go out to clients once they can see it)
+        """
+
+        state = entity_state(entity)
+        self.previous[entity.entity_id] = state
+        if self.interest_managed:
+            self.spawned.add(entity.entity_id)
+        else:
+            for baseline in self.baselines.values():
+                baseline[entity.entity_id] = state
+
+    def forget(self, entity_id):
+        """Drop all records of a destroyed entity.
+        Returns the IDs of the clients that knew about it.
+        """
+
+        self.previous.pop(entity_id, None)
+        self.spawned.discard(entity_id)
+        knew = []
+        for client_id, baseline in self.baselines.items():
+            if baseline.pop(entity_id, None) is not None:
+                knew.append(client_id)
+        return knew
+
+    def update_interest(self, client_id, visible):
+        """Update which entities a client knows about, given the entities it can see now.
+        Returns (entered, left): the entities that came into view, and the IDs of those
+        that went out of view.
+        """
+
+        baseline = self.baselines.get(client_id)
+        if baseline is None:
+            return [], []
+
+        visible_ids = set()
+        entered = []
+        for e in visible:
+            visible_ids.add(e.entity_id)
+            if e.entity_id not in baseline:
+                baseline[e.entity_id] = entity_state(e)
+                entered.append(e)
+        left = [entity_id for entity_id in baseline if entity_id not in visible_ids]
+        for entity_id in left:
+            del baseline[entity_id]
+        return entered, left
+
+    def end_pass(self):
+        """Finish a replication pass"""
+
+        self.spawned.clear()
+
+    def begin_pass(self, entities):
+        """Find the entities that changed since the previous pass (the "dirty" ones).
+        Must be called once per replication pass, before changes().
+        """
+
+        previous = self.previous
+        dirty = []
+        for e in entities:
+            state = entity_state(e)
+            if previous.get(e.entity_id) != state:
+                previous[e.entity_id] = state
+                dirty.append((e, state))
+        self.dirty = dirty
+
+    def changes(self, client_id, entities, tick):
+        """Get the entities whose state should be sent to a client, as a list of
+        (entity, (x, y, rotation)) pairs, and update the client's baseline to match.
+        """
+
+        baseline = self.baselines.get(client_id)
+        if baseline is None:
+            return []
+
+        if tick - self.last_refresh[client_id] >= self.refresh_interval:
+            # Periodic full refresh; send everything
+            self.last_refresh[client_id] = tick
+            changed = [(e, entity_state(e)) for e in entities
+                       if not self.interest_managed or e.entity_id in baseline]
+        else:
+            changed = []
+            for e, state in self.dirty:
+                sent = baseline.get(e.entity_id)
+                if sent is None and self.interest_managed:
+                    # Not in view
+                    continue
+                if (sent is None or
+                        abs(state[0] - sent[0]) >= self.pos_threshold or
+                        abs(state[1] - sent[1]) >= self.pos_threshold or
+                        rotation_difference(state[2], sent[2]) >= self.rot_threshold):
+                    changed.append((e, state))
+
+        for e, state in changed:
+            baseline[e.entity_id] = state
+        return changed
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+from threading import Thread, Lock
+from queue import Queue
+import time
+import traceback
+
+from server import GameServer
+
+class RoomScheduler(Thread):
+    """Runs many game rooms on a single thread.
+    Each room is an independent GameServer with its own entities, clients and entity IDs;
+    they all share one dispatcher (and network front end), which routes messages by room.
+    """
+
+    def __init__(self, dispatch, idle_sleep=0.005):
+        Thread.__init__(self)
+        self.name = 'Rooms'
+        self.dispatch = dispatch
+        self.rooms = {}
+        self.lock = Lock()
+        # Longest to sleep when no room has a step coming up (e.g. no rooms at all)
+        self.idle_sleep = idle_sleep
+        self.running = True
+
+    def create_room(self, room_id, in_queue=None, **kwargs):
+        """Create a new room and start running it.  kwargs are passed on to GameServer."""
+
+        if in_queue is None:
+            in_queue = Queue()
+        room = GameServer(self.dispatch, in_queue, room_id=room_id, **kwargs)
+        self.add_room(room)
+        return room
+
+    def add_room(self, room):
+        """Start running an existing (not started) GameServer as a room"""
+
+        with self.lock:
+            self.rooms[room.room_id] = room
+        self.dispatch.register_room(room.room_id, room.in_queue)
+
+    def remove_room(self, room_id):
+        """Stop running a room"""
+
+        self.dispatch.unregister_room(room_id)
+        with self.lock:
+            room = self.rooms.pop(room_id, None)
+        if room is not None:
+            room.running = False
+            room.cleanup()
+        return room
+
+    def tick(self):
+        """Give every room a turn to handle its messages and simulate.
+        Returns how long (in seconds) until the next room is due.
+        """
+
+        with self.lock:
+            rooms = list(self.rooms.values())
+
+        wait = self.idle_sleep
+        for room in rooms:
+            try:
+                room.check_msgs()
+                if not room.running:
+                    # The room was told to shut down
+                    self.remove_room(room.room_id)
+                    continue
+                room.tick()
+            except Exception:
+                # One room's bug mustn't take the others down with it; close just this one
+                #   (which disconnects its clients)
+                print('Room %s crashed, closing it:' % room.room_id)
+                traceback.print_exc()
+                self.remove_room(room.room_id)
+                continue
+            wait = min(wait, room.clock.time_until_next())
+        return wait
+
+    def run(self):
+        """Gets called at thread start"""
+
+        while self.running:
+            wait = self.tick()
+            if wait > 0:
+                time.sleep(wait)
+
+        for room_id in list(self.rooms):
+            self.remove_room(room_id)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Rotated sprite images.  An image can be drawn at any angle, but only a fixed number of evenly
+#   spaced angles (steps) are ever made; frames[angle] gives the nearest one, along with the
+#   unrotated image's rect.
+
+from collections import OrderedDict
+
+import pygame
+
+from constants import GAME
+
+class Rotations():
+    """One image's rotated frames (see PreloadedRotations and LazyRotations)"""
+
+    def __init__(self, name, rect, steps):
+        self.name = name
+        self.rect = rect
+        self.steps = steps
+
+    def index(self, angle):
+        """Which step an angle (in degrees) is closest to"""
+
+        return int(angle * self.steps / 360 + 0.5) % self.steps
+
+class PreloadedRotations(Rotations):
+    """Every frame, made (or loaded from disk) up front"""
+
+    def __init__(self, name, frames, rect):
+        Rotations.__init__(self, name, rect, len(frames))
+        self.frames = frames
+
+    def __getitem__(self, angle):
+        return self.frames[self.index(angle)], self.rect
+
+class LazyRotations(Rotations):
+    """Frames are made the first time they're needed, and kept in a RotationCache"""
+
+    def __init__(self, name, image, steps=GAME.ROTATION_STEPS, cache=None):
+        Rotations.__init__(self, name, image.get_rect(), steps)
+        self.image = image
+        self.cache = cache if cache is not None else default_cache
+
+        # Memory accounting (kept up to date by the cache)
+        self.cached = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getitem__(self, angle):
+        return self.cache.get(self, self.index(angle)), self.rect
+
+    def rotate(self, index):
+        return pygame.transform.rotozoom(self.image, index * 360 / self.steps, 1)
+
+class RotationCache():
+    """Rotated frames of any number of images, least recently used first out once they take up
+    more than max_bytes
+    """
+
+    def __init__(self, max_bytes=GAME.ROTATION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # (LazyRotations, step) -> frame, least recently used first
+        self.frames = OrderedDict()
+        # Every image that's had frames cached, by name
+        self.assets = {}
+
+    def get(self, rotations, index):
+        key = (rotations, index)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            rotations.hits += 1
+            return frame
+
+        frame = rotations.rotate(index)
+        size = frame.get_height() * frame.get_pitch()
+        rotations.misses += 1
+        rotations.cached += 1
+        rotations.bytes += size
+        self.assets[rotations.name] = rotations
+        self.frames[key] = frame
+        self.bytes += size
+        # (The frame that was just made stays, even if it's over the limit on its own)
+        while self.bytes > self.max_bytes and len(self.frames) > 1:
+            (old_rotations, old_index), old_frame = self.frames.popitem(last=False)
+            old_size = old_frame.get_height() * old_frame.get_pitch()
+            old_rotations.cached -= 1
+            old_rotations.bytes -= old_size
+            self.bytes -= old_size
+        return frame
+
+    def clear(self):
+        for rotations in self.assets.values():
+            rotations.cached = 0
+            rotations.bytes = 0
+        self.frames.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """Frames/bytes cached, and hits/misses, for each image, for diagnostics"""
+
+        return {name: {'frames': rotations.cached, 'bytes': rotations.bytes, 'hits': rotations.hits, 'misses': rotations.misses}
+                for name, rotations in self.assets.items()}
+
+# Shared by every LazyRotations that isn't given a cache of its own
+default_cache = RotationCache()
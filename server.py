@@ -10,25 +10,44 @@
 #   https://opengameart.org/content/rocks-ships-stars-gold-and-more
 
 from threading import Thread
-import time
 from queue import Queue
 import random
 import math
 
-import pygame
-
 from gamemodule import GameModule
-from constants import MESSAGES, MSGCONTENT, GAME
+from constants import MESSAGES, GAME
 from entity import Entity
+from entitystore import EntityStore, StoredEntity
+from entitypool import EntityPool
+from spatialhash import SpatialHash
+from simclock import FixedTimestep
+from replication import ReplicationState
+from idallocator import IdAllocator
 from inputstate import InputState, ClientInputState
 import components
-from helperfuncs import split_ip, rejoin_ip
+import messages
+from helperfuncs import split_ip, rejoin_ip, wrapped_distance
+
+# Input messages, and the InputState flag each one sets (or clears)
+INPUT_MESSAGES = {
+    MESSAGES.INPUT_LEFT_DOWN: ('left', True),
+    MESSAGES.INPUT_LEFT_UP: ('left', False),
+    MESSAGES.INPUT_RIGHT_DOWN: ('right', True),
+    MESSAGES.INPUT_RIGHT_UP: ('right', False),
+    MESSAGES.INPUT_THRUST_DOWN: ('thrust', True),
+    MESSAGES.INPUT_THRUST_UP: ('thrust', False),
+    MESSAGES.INPUT_DOWN_DOWN: ('down', True),
+    MESSAGES.INPUT_DOWN_UP: ('down', False),
+    MESSAGES.INPUT_SHOOT_DOWN: ('shoot', True),
+    MESSAGES.INPUT_SHOOT_UP: ('shoot', False),
+}
 
 
 class GameServer(GameModule, Thread):
     """Implements the server module which manages the internal game state."""
 
-    def __init__(self, dispatch, in_queue, network=None):
+    def __init__(self, dispatch, in_queue, network=None, use_entity_store=False, tick_rate=GAME.FPS, max_players=None, send_rate=None,
+                 view_radius=None, view_margin=128, room_id=GAME.DEFAULT_ROOM_ID):
         Thread.__init__(self)
         self.dispatch = dispatch
         self.global_msg_queue = dispatch.global_msg_queue
@@ -37,20 +56,44 @@ class GameServer(GameModule, Thread):
         self.name = "Server"
 
         self.module_id = GAME.LOCAL_SERVER_ID
-        self.ms_per_frame = 1.0 / GAME.FPS * 1000.0
-        self.last_ticks = 0
-        self.ticks_since_last_update = 0
-        self.test_auto_spawn_ticks = 0
+        # Several independent games ("rooms") can share one dispatcher; this is which one we are
+        self.room_id = room_id
+        # Clients playing in this room, and those that have been accepted but haven't confirmed yet
+        self.clients = set()
+        self.accepted_clients = set()
+        # Entity IDs only need to be unique within the room.  They're taken from the allocator
+        #   in batches, and given back once per step, rather than locking it for every bullet.
+        self.ids = IdAllocator(GAME.LOCAL_SERVER_ID + 1)
+        self.id_batch_size = 32
+        self.id_reserve = []
+        self.released_ids = []
+        self.clock = FixedTimestep(tick_rate)
+        # Maximum number of connected clients (None for no limit)
+        self.max_players = max_players
+        # Area of interest: if view_radius is set, clients only hear about entities within
+        #   view_radius of them, and keep hearing about them until they're view_margin beyond that
+        self.view_radius = view_radius
+        self.view_margin = view_margin
+        # Where each client is looking (their ship, or where it last was)
+        self.client_focus = {}
+
+        # What each client knows about each entity, so only changes get sent
+        self.replication = ReplicationState(interest_managed=view_radius is not None)
+        # Entity state goes out every send_interval ticks (clients interpolate in between)
+        self.send_interval = max(1, round(tick_rate / send_rate)) if send_rate else 1
+        self.last_send_tick = 0
 
         self.player_death_delay = 1000
         self.player_death_ticks = {}
         self.player_shoot_delay = 333
         self.player_shoot_ticks = {}
 
+        # Optionally keep entity physics in NumPy arrays and integrate them in bulk
+        self.entity_store = EntityStore() if use_entity_store else None
+
         self.entities = {}
-        self.unused_entities = []
-        for x in range(100):
-            self.unused_entities.append(Entity())
+        # Destroyed entities are kept for reuse
+        self.entity_pool = EntityPool(self.new_entity)
         self.asteroids = []
         self.bullets = {}
 
@@ -62,6 +105,9 @@ class GameServer(GameModule, Thread):
         self.client_scores = {}
         self.client_lives = {}
 
+        # Whether anything's been sent since dispatch was last told to flush connections
+        self.unflushed = False
+
     def run(self):
         """Gets called at thread start"""
 
@@ -74,19 +120,19 @@ class GameServer(GameModule, Thread):
         """Synchronize changes in server-side state and client-side state"""
 
         self.client_states[client_id] = new_state
-        self.send_msg(MESSAGES.CHANGE_STATE, client_id, (MSGCONTENT.GAME_STATE, new_state))
+        self.send(messages.ChangeState(new_state), client_id)
     
     def set_client_lives(self, client_id, new_lives):
         """Make sure the client can correctly display the number of lives"""
 
         self.client_lives[client_id] = new_lives
-        self.send_msg(MESSAGES.UPDATELIVES, client_id, (MSGCONTENT.PLAYER_LIVES, new_lives))
+        self.send(messages.UpdateLives(new_lives), client_id)
 
     def set_client_score(self, client_id, new_score):
         """Make sure the client can display the score"""
 
         self.client_scores[client_id] = new_score
-        self.send_msg(MESSAGES.UPDATESCORE, client_id, (MSGCONTENT.PLAYER_SCORE, new_score))
+        self.send(messages.UpdateScore(new_score), client_id)
     
     def all_bullets(self):
         """Gather all on-screen bullets, regardless of who fired them"""
@@ -97,27 +143,39 @@ class GameServer(GameModule, Thread):
                 bullets.append(b)
         return bullets
     
-    def send_global_msg(self, msg_type, *content):
-        """Queue a message to be sent to all clients"""
+    def send_global(self, msg):
+        """Queue an already-built message to be sent to all clients in this room"""
+
+        msg.sender_id = self.module_id
+        msg.room_id = self.room_id
+        self.global_msg_queue.put(msg)
+        self.unflushed = True
 
-        msg_content = self.prepare_msg(*content)
-        self.global_msg_queue.put((msg_type, msg_content))
+    def send(self, msg, recipient_id):
+        GameModule.send(self, msg, recipient_id)
+        self.unflushed = True
     
-    def process_msg(self, msg_type, sender_id, msg_content):
+    def process_msg(self, msg_type, sender_id, msg):
         """Process an incoming message"""
 
         # Client requests connection
         if msg_type == MESSAGES.REQCONNECT:
-            if sender_id not in self.dispatch.clients:
-                self.log('Connection accepted for client %s' % sender_id)
-                self.send_msg(MESSAGES.CONNECT_ACCEPT, sender_id, (MSGCONTENT.SET_ID, sender_id))
-            else:
+            if sender_id in self.dispatch.clients:
                 self.log('Client %s has already connected, additional connection refused' % sender_id)
-                self.send_msg(MESSAGES.CONNECT_REJECT, sender_id)
+                self.send(messages.ConnectReject(), sender_id)
+            elif self.max_players is not None and len(self.clients | self.accepted_clients) >= self.max_players:
+                self.log('Server is full, connection refused for client %s' % sender_id)
+                self.send(messages.ConnectReject(), sender_id)
+            else:
+                self.log('Connection accepted for client %s' % sender_id)
+                self.accepted_clients.add(sender_id)
+                self.send(messages.ConnectAccept(sender_id, GAME.WORLD_WIDTH, GAME.WORLD_HEIGHT), sender_id)
         
         # Client received CONNECT_ACCEPT from us and is ready to receive state
         elif msg_type == MESSAGES.CONNECT_SUCCESS:
-            self.dispatch.clients.add(sender_id)
+            self.accepted_clients.discard(sender_id)
+            self.clients.add(sender_id)
+            self.dispatch.join_room(sender_id, self.room_id)
 
             # Store server-side state for client
             self.input_states[sender_id] = ClientInputState(sender_id)
@@ -129,44 +187,40 @@ class GameServer(GameModule, Thread):
             self.bullets[sender_id] = []
 
             # Tell new client about all existing entities
-            for e in self.entities.values():
-                self.send_msg(MESSAGES.CREATE_ENTITY, sender_id, (MSGCONTENT.ENTITY_ID, e.entity_id), (MSGCONTENT.ENTITY_TYPE, e.entity_type), (MSGCONTENT.X_POS, e.position[0]), (MSGCONTENT.Y_POS, e.position[1]), (MSGCONTENT.ROTATION, e.rotation))
+            #   (with interest management, they get introduced as they come into view instead)
+            if self.view_radius is None:
+                for e in self.entities.values():
+                    self.send(self.entity_msg(messages.CreateEntity, e), sender_id)
+            self.replication.add_client(sender_id, self.entities.values(), self.clock.tick)
 
         # Client wants to disconnect
         elif msg_type == MESSAGES.SIGNAL_DISCONNECT:
             self.log("Received disconnect signal from client %s" % sender_id)
-            self.dispatch.clients.discard(sender_id)
+            self.accepted_clients.discard(sender_id)
+            self.clients.discard(sender_id)
+            self.dispatch.leave_room(sender_id, self.room_id)
+            self.replication.remove_client(sender_id)
+            self.client_focus.pop(sender_id, None)
+            # Remove the client's ship, bullets & state
+            self.input_states.pop(sender_id, None)
+            self.client_states.pop(sender_id, None)
+            pship = self.player_entities.pop(sender_id, None)
+            if pship is not None:
+                self.destroy_entity(pship.entity_id)
+            for bullet in list(self.bullets.get(sender_id, ())):
+                self.destroy_entity(bullet.entity_id)
+            self.bullets.pop(sender_id, None)
+            self.client_scores.pop(sender_id, None)
+            self.client_lives.pop(sender_id, None)
+            self.player_shoot_ticks.pop(sender_id, None)
+            self.player_death_ticks.pop(sender_id, None)
         
-        # Input messages
-        elif msg_type == MESSAGES.INPUT_LEFT_DOWN:
-            self.input_states[sender_id].left = True
-        
-        elif msg_type == MESSAGES.INPUT_LEFT_UP:
-            self.input_states[sender_id].left = False
-
-        elif msg_type == MESSAGES.INPUT_RIGHT_DOWN:
-            self.input_states[sender_id].right = True
-        
-        elif msg_type == MESSAGES.INPUT_RIGHT_UP:
-            self.input_states[sender_id].right = False
-
-        elif msg_type == MESSAGES.INPUT_THRUST_DOWN:
-            self.input_states[sender_id].thrust = True
-
-        elif msg_type == MESSAGES.INPUT_THRUST_UP:
-            self.input_states[sender_id].thrust = False
-
-        elif msg_type == MESSAGES.INPUT_DOWN_DOWN:
-            self.input_states[sender_id].down = True
-
-        elif msg_type == MESSAGES.INPUT_DOWN_UP:
-            self.input_states[sender_id].down = False
-
-        elif msg_type == MESSAGES.INPUT_SHOOT_DOWN:
-            self.input_states[sender_id].shoot = True
-
-        elif msg_type == MESSAGES.INPUT_SHOOT_UP:
-            self.input_states[sender_id].shoot = False
+        # Input messages (ignored from clients that aren't playing, e.g. since they disconnected)
+        elif msg_type in INPUT_MESSAGES:
+            input_state = self.input_states.get(sender_id)
+            if input_state is not None:
+                key, pressed = INPUT_MESSAGES[msg_type]
+                setattr(input_state, key, pressed)
     
     def spawn_player(self, client_id):
         """Spawn a player ship for the specified client."""
@@ -177,8 +231,8 @@ class GameServer(GameModule, Thread):
             pship = self.create_entity(GAME.ENTITY_PLAYERSHIP, pos, 0, [0, 0], 0, 0, client_id)
             # Temporarily boost radius by 3x to make extra room around newly-spawned player
             pship.radius *= 3
-            while (self.collide_group_and_entity(self.asteroids, pship, False) or
-                    self.collide_group_and_entity(self.all_bullets(), pship, False)):
+            obstacles = SpatialHash().build(self.asteroids + self.all_bullets())
+            while self.collide_group_and_entity(obstacles, pship, False):
                     # Choose a different random spot
                     pship.position = self.random_position_on_screen(100)
             pship.radius /= 3
@@ -187,145 +241,228 @@ class GameServer(GameModule, Thread):
     def update(self):
         """Update internal game state"""
 
-        # Timing logic; ensure that update is no frequent than value specified by GAME.FPS
-        #   (ticks are in ms)
-        current_ticks = pygame.time.get_ticks()
-        diff = current_ticks - self.last_ticks
-        self.ticks_since_last_update += diff
-        self.test_auto_spawn_ticks += diff
-
-        # Run update logic if enough time has elapsed
-        if self.ticks_since_last_update >= self.ms_per_frame:
-            self.ticks_since_last_update = 0
-
-            # Process input
-            # In the middle of a game session
-            if self.game_state == GAME.STATE_IN_GAME: 
-                for input_state in list(self.input_states.values()):
-                    client_state = self.client_states[input_state.client_id]
-                    if client_state == GAME.STATE_IN_GAME:
-                        if input_state.left and not input_state.right:
-                            pship = self.player_entities.get(input_state.client_id)
-                            if pship is not None:
-                                pship.turn_direction = 1
-                        elif input_state.right and not input_state.left:
-                            pship = self.player_entities.get(input_state.client_id)
-                            if pship is not None:
-                                pship.turn_direction = -1
-                        else:
-                            pship = self.player_entities.get(input_state.client_id)
-                            if pship is not None:
-                                pship.turn_direction = 0
+        self.tick()
 
-                        if input_state.thrust:
-                            pship = self.player_entities.get(input_state.client_id)
-                            if pship is not None:
-                                pship.thrust = True
-                        else:
+        # sleep the thread until it's time for the next update
+        # not doing this can cause the main thread to become too busy with processing messages,
+        #   preventing pygame from updating/drawing to the screen
+        self.clock.sleep_until_next()
+
+        super().update()
+
+    def tick(self):
+        """Run whatever simulation steps are due and send out state, without waiting.
+        Rooms run by a shared scheduler are ticked this way instead of running their own thread.
+        """
+
+        # Timing logic; the simulation always advances in fixed steps of 1/tick_rate seconds.
+        #   If we fell behind, run several steps back-to-back to catch up.
+        steps = self.clock.due_steps()
+        for x in range(steps):
+            self.step(self.clock.step)
+
+        if self.clock.tick - self.last_send_tick >= self.send_interval:
+            self.last_send_tick = self.clock.tick
+            self.replicate()
+
+        # Everything for this tick has been sent; network connections can write it out now
+        if self.unflushed:
+            self.unflushed = False
+            GameModule.send(self, messages.Flush(), GAME.DISPATCHER_ID)
+
+    def entity_msg(self, msg_class, e):
+        """Message describing an entity, for CREATE_ENTITY/ENTITY_ENTER"""
+
+        player_id = e.player_id if e.entity_type == GAME.ENTITY_PLAYERSHIP else None
+        return msg_class(e.entity_id, e.entity_type, e.position[0], e.position[1], e.rotation, player_id)
+
+    def get_client_focus(self, client_id):
+        """Where a client is looking: at their ship if they have one, otherwise where it last was"""
+
+        pship = self.player_entities.get(client_id)
+        if pship is not None:
+            self.client_focus[client_id] = (float(pship.position[0]), float(pship.position[1]))
+        return self.client_focus.get(client_id, (GAME.WORLD_WIDTH / 2, GAME.WORLD_HEIGHT / 2))
+
+    def update_interest(self, client_id, grid):
+        """Introduce entities that came into a client's view, and retire those that left it"""
+
+        focus = self.get_client_focus(client_id)
+        known = self.replication.baselines.get(client_id, {})
+        visible = []
+        for index, e in grid.query(focus, self.view_radius + self.view_margin):
+            dist = wrapped_distance(focus, e.position, GAME.WORLD_WIDTH, GAME.WORLD_HEIGHT)
+            # Entities already known stay known until they're a margin beyond the view radius,
+            #   so that things on the boundary don't flicker in and out
+            if dist <= self.view_radius or (e.entity_id in known and dist <= self.view_radius + self.view_margin):
+                visible.append(e)
+
+        entered, left = self.replication.update_interest(client_id, visible)
+        for e in entered:
+            # Entities that were just created get the usual fanfare (e.g. sounds); others just appear
+            if e.entity_id in self.replication.spawned:
+                self.send(self.entity_msg(messages.CreateEntity, e), client_id)
+            else:
+                self.send(self.entity_msg(messages.EntityEnter, e), client_id)
+        for entity_id in left:
+            self.send(messages.EntityLeave(entity_id), client_id)
+
+    def replicate(self):
+        """Send each client one snapshot of the entities whose state changed noticeably
+        since it last heard about them
+        """
+
+        self.replication.begin_pass(self.entities.values())
+        if self.view_radius is not None:
+            grid = SpatialHash(256).build(list(self.entities.values()))
+        for client_id in list(self.clients):
+            if self.view_radius is not None:
+                self.update_interest(client_id, grid)
+            changed = self.replication.changes(client_id, self.entities.values(), self.clock.tick)
+            if changed:
+                # Columnar layout: one list per field, one entry per entity
+                ids = [e.entity_id for e, state in changed]
+                xs = [state[0] for e, state in changed]
+                ys = [state[1] for e, state in changed]
+                rots = [state[2] for e, state in changed]
+                self.send(messages.Snapshot.acquire(int(self.clock.time_ms), ids, xs, ys, rots), client_id)
+        self.replication.end_pass()
+
+    def step(self, delta_time):
+        """Advance the game simulation by one fixed step of delta_time seconds"""
+
+        self.clock.advance()
+        # Timers below (shooting, respawning) run on simulated time, in ms
+        current_ticks = self.clock.time_ms
+
+        # Process input
+        # In the middle of a game session
+        if self.game_state == GAME.STATE_IN_GAME: 
+            for input_state in list(self.input_states.values()):
+                client_state = self.client_states[input_state.client_id]
+                if client_state == GAME.STATE_IN_GAME:
+                    if input_state.left and not input_state.right:
+                        pship = self.player_entities.get(input_state.client_id)
+                        if pship is not None:
+                            pship.turn_direction = 1
+                    elif input_state.right and not input_state.left:
+                        pship = self.player_entities.get(input_state.client_id)
+                        if pship is not None:
+                            pship.turn_direction = -1
+                    else:
+                        pship = self.player_entities.get(input_state.client_id)
+                        if pship is not None:
+                            pship.turn_direction = 0
+
+                    if input_state.thrust:
+                        pship = self.player_entities.get(input_state.client_id)
+                        if pship is not None:
+                            pship.thrust = True
+                    else:
+                        pship = self.player_entities.get(input_state.client_id)
+                        if pship is not None:
+                            pship.thrust = False
+
+                    if input_state.shoot:
+                        if current_ticks - self.player_shoot_ticks[input_state.client_id] >= self.player_shoot_delay:
+                            self.player_shoot_ticks[input_state.client_id] = current_ticks
                             pship = self.player_entities.get(input_state.client_id)
                             if pship is not None:
-                                pship.thrust = False
-
-                        if input_state.shoot:
-                            if current_ticks - self.player_shoot_ticks[input_state.client_id] >= self.player_shoot_delay:
-                                self.player_shoot_ticks[input_state.client_id] = current_ticks
-                                pship = self.player_entities.get(input_state.client_id)
-                                if pship is not None:
-                                    pos = [pship.position[0] + 30*pship.forward[0], pship.position[1] + 30*pship.forward[1]]
-                                    vel = [400*pship.forward[0], 400*pship.forward[1]]
-                                    self.create_entity(GAME.ENTITY_BULLET, pos, 0, vel, 0, 0, pship.player_id)
-
-                    # "Press fire" screen
-                    elif client_state == GAME.STATE_GAME_START:
-                        if input_state.shoot:
-                            input_state.shoot = False
-                            # start game
-                            self.set_client_state(input_state.client_id, GAME.STATE_IN_GAME)
-                            self.spawn_player(input_state.client_id)
-
-                    # Game over screen
-                    elif client_state == GAME.STATE_GAME_OVER:
-                        if input_state.shoot:
-                            input_state.shoot = False
-                            self.set_client_state(input_state.client_id, GAME.STATE_IN_GAME)
-                            self.set_client_lives(input_state.client_id, 3)
-                            self.set_client_score(input_state.client_id, 0)
-                            self.spawn_player(input_state.client_id)
-                            self.populate_asteroids(5, True)
-
-            # If all of the asteroids are destroyed, spawn some more
-            # In Python, an empty sequence type (such as a list) evaluates as False
-            if not self.asteroids:
-                # TODO: Increase number of big asteroids each round
-                self.populate_asteroids(4)
-
-            # Asteroid-bullet collisions
-            for client_id, bullets in self.bullets.items():
-                client_addr = None
-                collisions = self.collide_groups(self.asteroids, bullets)
+                                pos = [pship.position[0] + 30*pship.forward[0], pship.position[1] + 30*pship.forward[1]]
+                                vel = [400*pship.forward[0], 400*pship.forward[1]]
+                                self.create_entity(GAME.ENTITY_BULLET, pos, 0, vel, 0, 0, pship.player_id)
+
+                # "Press fire" screen
+                elif client_state == GAME.STATE_GAME_START:
+                    if input_state.shoot:
+                        input_state.shoot = False
+                        # start game
+                        self.set_client_state(input_state.client_id, GAME.STATE_IN_GAME)
+                        self.spawn_player(input_state.client_id)
+
+                # Game over screen
+                elif client_state == GAME.STATE_GAME_OVER:
+                    if input_state.shoot:
+                        input_state.shoot = False
+                        self.set_client_state(input_state.client_id, GAME.STATE_IN_GAME)
+                        self.set_client_lives(input_state.client_id, 3)
+                        self.set_client_score(input_state.client_id, 0)
+                        self.spawn_player(input_state.client_id)
+                        self.populate_asteroids(5 * self.world_scale(), True)
+
+        # If all of the asteroids are destroyed, spawn some more
+        # In Python, an empty sequence type (such as a list) evaluates as False
+        if not self.asteroids:
+            # TODO: Increase number of big asteroids each round
+            self.populate_asteroids(4 * self.world_scale())
+
+        # Asteroid-bullet collisions
+        for client_id, bullets in self.bullets.items():
+            client_addr = None
+            collisions = self.collide_groups(self.asteroids, bullets)
+            if collisions > 0:
                 self.set_client_score(client_id, self.client_scores[client_id] + collisions * 10)
 
-            # Player-asteroid and Player-bullet collisions
-            self.collide_groups(self.asteroids, list(self.player_entities.values()))
-            self.collide_groups(list(self.player_entities.values()), self.all_bullets())
+        # Player-asteroid and Player-bullet collisions
+        self.collide_groups(self.asteroids, list(self.player_entities.values()))
+        self.collide_groups(list(self.player_entities.values()), self.all_bullets())
 
-            # Update entities
+        # Update entities
+        if self.entity_store is not None:
+            # Integrate every entity at once, then queue up the ones marked for destruction
+            self.entity_store.integrate(delta_time)
+            to_destroy = self.entity_store.flagged()
+        else:
             to_destroy = []
             for e in list(self.entities.values()):
-                e.update(diff/1000)
+                e.update(delta_time)
 
                 # Queue up any entities that are marked for destruction
                 if e.should_destroy:
                     to_destroy.append(e)
-            
-            # Destroy queued entities
-            for e in to_destroy:
-                # If we're destroying the player ship, decrease their life count by 1
-                #   and then change state for a brief delay
-                if e.entity_type == GAME.ENTITY_PLAYERSHIP:
-                    self.set_client_lives(e.player_id, self.client_lives[e.player_id]-1)
-                    self.set_client_state(e.player_id, GAME.STATE_PLAYER_DIED)
-                    self.player_death_ticks[e.player_id] = current_ticks
-                self.destroy_entity(e.entity_id)
-            
-            to_destroy.clear()
-
-            # Update clients
-            # Change client state after delay
-            for client_id, client_state in self.client_states.items():
-                # Make the client wait for a short period of time if they die
-                #   this is to prevent them from accidentally respawning themselves
-                #   if they happened to be hitting the keyboard repeatedly as they died
-                if client_state == GAME.STATE_PLAYER_DIED:
-                    death_ticks = self.player_death_ticks[client_id]
-                    if current_ticks - death_ticks >= self.player_death_delay:
-                        self.player_death_ticks[client_id] = 0
-                        # Switch to game start or game over state, depending on lives
-                        if self.client_lives[client_id] <= 0:
-                            self.set_client_state(client_id, GAME.STATE_GAME_OVER)
-                        else:
-                            self.set_client_state(client_id, GAME.STATE_GAME_START)
-
-            # Send entity state to clients
-            for e in self.entities.values():
-                self.send_global_msg(MESSAGES.UPDATEPOS, (MSGCONTENT.ENTITY_ID, e.entity_id), (MSGCONTENT.X_POS, e.position[0]), (MSGCONTENT.Y_POS, e.position[1]))
-                self.send_global_msg(MESSAGES.UPDATEROT, (MSGCONTENT.ENTITY_ID, e.entity_id), (MSGCONTENT.ROTATION, e.rotation))
-
-            # Reset ticks counter
-            self.last_ticks = current_ticks
         
-        else:
-            # sleep the thread until it's time for the next update
-            # not doing this can cause the main thread to become too busy with processing messages,
-            #   preventing pygame from updating/drawing to the screen
-            time.sleep(diff/1000.0)
-
-        super().update()
+        # Destroy queued entities
+        for e in to_destroy:
+            # If we're destroying the player ship, decrease their life count by 1
+            #   and then change state for a brief delay
+            if e.entity_type == GAME.ENTITY_PLAYERSHIP:
+                self.set_client_lives(e.player_id, self.client_lives[e.player_id]-1)
+                self.set_client_state(e.player_id, GAME.STATE_PLAYER_DIED)
+                self.player_death_ticks[e.player_id] = current_ticks
+            self.destroy_entity(e.entity_id)
+        
+        to_destroy.clear()
+
+        # Update clients
+        # Change client state after delay
+        for client_id, client_state in self.client_states.items():
+            # Make the client wait for a short period of time if they die
+            #   this is to prevent them from accidentally respawning themselves
+            #   if they happened to be hitting the keyboard repeatedly as they died
+            if client_state == GAME.STATE_PLAYER_DIED:
+                death_ticks = self.player_death_ticks[client_id]
+                if current_ticks - death_ticks >= self.player_death_delay:
+                    self.player_death_ticks[client_id] = 0
+                    # Switch to game start or game over state, depending on lives
+                    if self.client_lives[client_id] <= 0:
+                        self.set_client_state(client_id, GAME.STATE_GAME_OVER)
+                    else:
+                        self.set_client_state(client_id, GAME.STATE_GAME_START)
+
+        # Give back the IDs of everything destroyed this step
+        if self.released_ids:
+            self.ids.release_ids(self.released_ids)
+            self.released_ids.clear()
     
     def random_position_on_screen(self, margin=0):
-        """Finds a random position within the screen bounds"""
+        """Finds a random position within the world bounds"""
+
+        return [random.randrange(margin, GAME.WORLD_WIDTH-margin), random.randrange(margin, GAME.WORLD_HEIGHT-margin)]
+
+    def world_scale(self):
+        """How many screens' worth of space the world has; used to keep big worlds populated"""
 
-        return [random.randrange(margin, GAME.WIDTH-margin), random.randrange(margin, GAME.HEIGHT-margin)]
+        return max(1, round(GAME.WORLD_WIDTH * GAME.WORLD_HEIGHT / (GAME.WIDTH * GAME.HEIGHT)))
 
     def populate_asteroids(self, num, clear_existing=False):
         """Randomly spawn asteroids"""
@@ -336,15 +473,16 @@ class GameServer(GameModule, Thread):
             for a in to_remove:
                 self.entities.pop(a.entity_id)
                 self.asteroids.remove(a)
-                self.send_global_msg(MESSAGES.DESTROY_ENTITY, (MSGCONTENT.ENTITY_ID, a.entity_id))
+                self.announce_destroy(a.entity_id)
+                self.recycle_entity(a)
+        obstacles = SpatialHash().build(list(self.player_entities.values()) + self.all_bullets())
         for x in range(num):
             # Spawn an asteroid in a random spot
             pos = self.random_position_on_screen()
             asteroid = self.spawn_asteroid(pos, GAME.ENTITY_ASTEROID_BIG)
             # Temporarily boost radius of asteroid by 2x to avoid bad spawning locations
             asteroid.radius *= 2
-            while (self.collide_group_and_entity(list(self.player_entities.values()), asteroid, False) or
-                    self.collide_group_and_entity(self.all_bullets(), asteroid, False)):
+            while self.collide_group_and_entity(obstacles, asteroid, False):
                 # Choose a different random spot
                 asteroid.position = self.random_position_on_screen()
             asteroid.radius /= 2
@@ -358,50 +496,70 @@ class GameServer(GameModule, Thread):
 
     def collide_group_and_entity(self, group, other, destroy=True):
         """Check for collisions between a list of entites and a single entity
-            This is used as part of the algorithm for checking for collisions
-            amongst all entities in two lists
+            group can also be a SpatialHash that was already built from the list,
+            which is much cheaper when checking the same group repeatedly
+            (e.g. when looking for a free spot to spawn something)
         """
-        original_len = len(group)
-        group = group.copy()
-
-        for entity in group:
-            if entity is not None and entity.collide(other):
-                group.remove(entity)
-                if destroy:
-                    entity.should_destroy = True
-                break
-        return original_len - len(group)
+        if not isinstance(group, SpatialHash):
+            group = SpatialHash().build(group)
+
+        # Only the first entity in the group that collides counts
+        hit = group.first_collision(other)
+        if hit is None:
+            return 0
+        if destroy:
+            hit[1].should_destroy = True
+        return 1
     
     def collide_groups(self, group1, group2, destroy=True):
-        """Check for collisions between all entities in two lists"""
-        # Copy the list so that we don't remove anyone prematurely while we perform the checks
-        group1 = group1.copy()
+        """Check for collisions between all entities in two lists
+            Each entity in group1 collides with at most one entity in group2 (the first one
+            in list order), so the result is the same as checking every pair in order.
+        """
+        # Bucket group2 into a grid once so each entity in group1 only checks its neighbors
+        grid = SpatialHash().build(group2)
         count = 0
 
-        for entity in group1:
-            if self.collide_group_and_entity(group2, entity, destroy) > 0:
-                count += 1
-                group1.remove(entity)
-                if destroy:
-                    entity.should_destroy = True
+        for entity, (index, hit) in grid.pairs(group1):
+            count += 1
+            if destroy:
+                hit.should_destroy = True
+                entity.should_destroy = True
         
         return count
 
 
 
+    def new_entity(self, *args):
+        """Construct a fresh entity object, backed by the entity store if it's enabled"""
+
+        if self.entity_store is not None:
+            return StoredEntity(self.entity_store, *args)
+        return Entity(*args)
+
+    def next_entity_id(self):
+        """Get an ID for a new entity"""
+
+        if not self.id_reserve:
+            self.id_reserve = self.ids.get_ids(self.id_batch_size)
+            # Hand them out lowest first
+            self.id_reserve.reverse()
+        return self.id_reserve.pop()
+
+    def cleanup(self):
+        """Give back the IDs reserved for entities that were never made (and any released since
+        the last step)
+        """
+
+        self.ids.release_ids(self.id_reserve + self.released_ids)
+        self.id_reserve = []
+        self.released_ids.clear()
+
     def create_entity(self, entity_type, pos=[0, 0], rot=0, vel=[0, 0], avel=0, radius=0, player_id=-1):
         """Create an entity of a specific type and with specific settings"""
 
-        try:
-            e = self.unused_entities.pop()
-            self.log('Reusing entity')
-            e.initialize(pos, rot, vel, avel, radius, self.dispatch.get_id(), entity_type)
-        except IndexError:
-            self.log('No unused entities free, creating a new one')
-            e = Entity(pos, rot, vel, avel, radius, self.dispatch.get_id(), entity_type)
-
-        # Construct some of the data we'll send to clients about this new entity
-        msg_content = [(MSGCONTENT.ENTITY_ID, e.entity_id), (MSGCONTENT.ENTITY_TYPE, e.entity_type), (MSGCONTENT.X_POS, e.position[0]), (MSGCONTENT.Y_POS, e.position[1]), (MSGCONTENT.ROTATION, e.rotation)]
+        e = self.entity_pool.acquire()
+        e.initialize(pos, rot, vel, avel, radius, self.next_entity_id(), entity_type)
 
         # Asteroids
         if (entity_type == GAME.ENTITY_ASTEROID_BIG or
@@ -417,12 +575,12 @@ class GameServer(GameModule, Thread):
                 
             elif entity_type == GAME.ENTITY_ASTEROID_SMALL:
                 e.radius = 14
-            e.add_component(components.AsteroidComponent())
+            e.add_component(components.ASTEROID)
             self.asteroids.append(e)
 
         # Bullets fired from a ship
         elif entity_type == GAME.ENTITY_BULLET:
-            e.add_component(components.BulletComponent())
+            e.add_component(components.BULLET)
             e.radius = 5
             e.lifetime = 1
             # player_id_and_addr = self.dispatch.concat_id_and_addr(player_id, player_addr)
@@ -431,19 +589,36 @@ class GameServer(GameModule, Thread):
         # Explosion that spawns after an asteroid or the player blows up
         elif entity_type == GAME.ENTITY_EXPLOSION:
             e.add_component(components.ExplosionComponent(0.5))
+            if self.entity_store is not None:
+                # Components don't run in the entity store, so expire the explosion through its lifetime
+                e.lifetime = 0.5
             
         # Player ship
         elif entity_type == GAME.ENTITY_PLAYERSHIP:
-            e.add_component(components.PlayerComponent())
+            e.add_component(components.PLAYER)
             e.radius = 30
-            msg_content.append((MSGCONTENT.PLAYER_ID, player_id))
 
         e.player_id = player_id
         e.visible = True
         e.active = True
         self.entities[e.entity_id] = e
-        self.send_global_msg(MESSAGES.CREATE_ENTITY, *msg_content)
+        if self.entity_store is not None:
+            self.entity_store.activate(e.slot)
+        self.replication.track(e)
+        # With interest management, clients are told about the entity once it's in view
+        if self.view_radius is None:
+            self.send_global(self.entity_msg(messages.CreateEntity, e))
         return e
+
+    def announce_destroy(self, entity_id):
+        """Tell clients that know about an entity that it's gone"""
+
+        knew = self.replication.forget(entity_id)
+        if self.view_radius is None:
+            self.send_global(messages.DestroyEntity(entity_id))
+        else:
+            for client_id in knew:
+                self.send(messages.DestroyEntity(entity_id), client_id)
     
     def destroy_entity(self, entity_id):
         """Destroy the entity that has this id"""
@@ -472,7 +647,9 @@ class GameServer(GameModule, Thread):
 
             # Destroy the player ship
             elif e.entity_type == GAME.ENTITY_PLAYERSHIP:
-                self.player_entities[e.player_id] = None
+                # (Leaving an empty slot for the player to respawn into, unless they've disconnected)
+                if e.player_id in self.player_entities:
+                    self.player_entities[e.player_id] = None
                 self.create_entity(GAME.ENTITY_EXPLOSION, e.position.copy())
             
             # Destroy a bullet
@@ -480,8 +657,15 @@ class GameServer(GameModule, Thread):
                 self.bullets[e.player_id].remove(e)
 
             # Send the message to clients to tell them to destroy the sprite corresponding to the entity
-            self.send_global_msg(MESSAGES.DESTROY_ENTITY, (MSGCONTENT.ENTITY_ID, e.entity_id))
+            self.announce_destroy(e.entity_id)
 
             # Get the entity object itself ready for reuse
-            self.dispatch.release_id(e.entity_id)
-            self.unused_entities.append(e)
+            self.recycle_entity(e)
+
+    def recycle_entity(self, e):
+        """Free up a removed entity's ID and return it to the pool"""
+
+        self.released_ids.append(e.entity_id)
+        if self.entity_store is not None:
+            self.entity_store.deactivate(e.slot)
+        self.entity_pool.release(e)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Session encryption.  During the handshake the server makes up a random session key and sends
+#   it to the client encrypted with the client's RSA public key; from then on everything is
+#   encrypted with AES-GCM under that key, a whole batch of messages at a time.
+# The server also signs the handshake (both public keys, a random nonce from the client, and
+#   the encrypted session key) with its private key, so that the client knows the session key
+#   really came from whoever holds the server's key, and from this handshake.
+
+import struct
+
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.Hash import SHA256
+from Crypto.Random import get_random_bytes
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pss
+
+from wire import encode_frame, FrameReader, ProtocolError
+
+KEY_SIZE = 32
+TAG_SIZE = 16
+NONCE_SIZE = 16
+COUNTER = struct.Struct('!Q')
+
+# Nonces are a direction prefix followed by a counter, so the two sides never use the same one
+SERVER_TO_CLIENT = b'\x00\x00\x00\x00'
+CLIENT_TO_SERVER = b'\x00\x00\x00\x01'
+
+# How far back (in counter values) out-of-order packets are still accepted, for datagrams
+REPLAY_WINDOW = 64
+
+def new_session_key():
+    return get_random_bytes(KEY_SIZE)
+
+def wrap_session_key(key, remote_pub_key):
+    """Encrypt a session key for the holder of remote_pub_key"""
+
+    return PKCS1_OAEP.new(remote_pub_key).encrypt(key)
+
+def unwrap_session_key(wrapped_key, RSA_key):
+    """Decrypt a session key sent to us.  Raises ValueError if it's not one."""
+
+    key = PKCS1_OAEP.new(RSA_key).decrypt(wrapped_key)
+    if len(key) != KEY_SIZE:
+        raise ValueError('Bad session key')
+    return key
+
+def new_nonce():
+    return get_random_bytes(NONCE_SIZE)
+
+def handshake_hash(server_pub_key, client_pub_key, nonce, wrapped_key):
+    """Hash of everything the server's signature covers (public keys as sent, i.e. exported)"""
+
+    digest = SHA256.new(b'AstroBlast handshake')
+    for part in (server_pub_key, client_pub_key, nonce, wrapped_key):
+        digest.update(encode_frame(part))
+    return digest
+
+def sign_handshake(RSA_key, client_pub_key, nonce, wrapped_key):
+    """The server's proof that it holds its private key, and made wrapped_key for this handshake"""
+
+    server_pub_key = RSA_key.publickey().exportKey()
+    return pss.new(RSA_key).sign(handshake_hash(server_pub_key, client_pub_key, nonce, wrapped_key))
+
+def verify_handshake(signature, server_pub_key, client_pub_key, nonce, wrapped_key):
+    """Check the server's signature (see sign_handshake).  Raises ValueError if it isn't right."""
+
+    try:
+        remote_pub_key = RSA.importKey(server_pub_key)
+    except (IndexError, TypeError):
+        raise ValueError('Bad public key')
+    pss.new(remote_pub_key).verify(handshake_hash(server_pub_key, client_pub_key, nonce, wrapped_key), signature)
+
+class SessionCipher():
+    """Encrypts and authenticates everything going one way on a connection, and decrypts and
+    checks everything coming the other way.
+    Every sealed message carries its counter; anything tampered with, or replayed, is rejected.
+    """
+
+    def __init__(self, key, is_server, ordered=True):
+        self.key = key
+        if is_server:
+            self.send_prefix, self.recv_prefix = SERVER_TO_CLIENT, CLIENT_TO_SERVER
+        else:
+            self.send_prefix, self.recv_prefix = CLIENT_TO_SERVER, SERVER_TO_CLIENT
+        # Over a stream, messages have to arrive in exactly the order they were sealed;
+        #   datagrams only have to be new (see REPLAY_WINDOW)
+        self.ordered = ordered
+        self.send_counter = 0
+        self.recv_counter = 0
+        # Bit n set: recv_counter - n has been seen
+        self.recv_window = 0
+
+    def seal(self, data, header=b''):
+        """Encrypt data.  header is sent in the clear, but can't be altered without detection."""
+
+        self.send_counter += 1
+        counter = COUNTER.pack(self.send_counter)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=self.send_prefix + counter, mac_len=TAG_SIZE)
+        if header:
+            cipher.update(header)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return b''.join((counter, ciphertext, tag))
+
+    def open(self, sealed, header=b''):
+        """Decrypt something sealed by the other side.  Raises ProtocolError if it's been tampered
+        with, or replayed.
+        """
+
+        if len(sealed) < COUNTER.size + TAG_SIZE:
+            raise ProtocolError('Sealed message too short')
+        (counter,) = COUNTER.unpack_from(sealed)
+        if not self.is_new(counter):
+            raise ProtocolError('Replayed message')
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=self.recv_prefix + sealed[:COUNTER.size], mac_len=TAG_SIZE)
+        if header:
+            cipher.update(header)
+        try:
+            data = cipher.decrypt_and_verify(sealed[COUNTER.size:-TAG_SIZE], sealed[-TAG_SIZE:])
+        except ValueError:
+            raise ProtocolError('Message failed authentication')
+        self.accept(counter)
+        return data
+
+    def is_new(self, counter):
+        if self.ordered:
+            return counter == self.recv_counter + 1
+        if counter > self.recv_counter:
+            return True
+        age = self.recv_counter - counter
+        return age < REPLAY_WINDOW and not self.recv_window & (1 << age)
+
+    def accept(self, counter):
+        if counter > self.recv_counter:
+            self.recv_window = ((self.recv_window << (counter - self.recv_counter)) | 1) & ((1 << REPLAY_WINDOW) - 1)
+            self.recv_counter = counter
+        else:
+            self.recv_window |= 1 << (self.recv_counter - counter)
+
+class SessionReader():
+    """Reassembles sealed frames from a stream, and then the message frames inside them.
+    Messages end up in self.frames, as with a FrameReader.
+    """
+
+    def __init__(self, cipher, reader):
+        self.cipher = cipher
+        # Sealed frames (picking up wherever the handshake left off)
+        self.sealed = reader
+        self.inner = FrameReader()
+        self.frames = self.inner.frames
+        self.open_sealed()
+
+    def feed(self, data):
+        self.sealed.feed(data)
+        self.open_sealed()
+
+    def open_sealed(self):
+        sealed = self.sealed.frames
+        while sealed:
+            self.inner.feed(self.cipher.open(sealed.popleft()))
+
+def seal_frame(cipher, data):
+    """Encrypt a batch of framed messages, as a frame of its own"""
+
+    return encode_frame(cipher.seal(bytes(data)))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+import time
+
+from constants import GAME
+
+class FixedTimestep():
+    """Fixed-rate simulation clock.
+    Wall-clock time is collected in an accumulator and handed out in whole steps of exactly
+    1/rate seconds, so the simulation always advances by the same amount per tick no matter
+    how jittery the thread scheduling is.
+    """
+
+    def __init__(self, rate=GAME.FPS, max_substeps=5):
+        # Length of one simulation step, in seconds
+        self.step = 1.0 / rate
+        # Most steps to run in one go when catching up; anything beyond that is dropped
+        self.max_substeps = max_substeps
+
+        # Number of steps simulated so far
+        self.tick = 0
+        # Number of steps skipped because the simulation fell too far behind
+        self.dropped = 0
+
+        self.accumulator = 0.0
+        self.last_time = None
+
+    @property
+    def time_ms(self):
+        """Simulated time elapsed, in milliseconds"""
+
+        return self.tick * self.step * 1000.0
+
+    def due_steps(self):
+        """Add the time elapsed since the last call to the accumulator, and
+        get the number of steps that should be simulated now.
+        """
+
+        now = time.monotonic()
+        if self.last_time is None:
+            self.last_time = now
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_substeps:
+            # Too far behind to catch up; drop the backlog instead of spiraling
+            self.dropped += steps - self.max_substeps
+            steps = self.max_substeps
+            self.accumulator = self.accumulator % self.step
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+    def advance(self):
+        """Count one simulated step"""
+
+        self.tick += 1
+
+    def time_until_next(self):
+        """Seconds until the next step is due"""
+
+        if self.last_time is None:
+            return 0.0
+        return self.step - self.accumulator - (time.monotonic() - self.last_time)
+
+    def sleep_until_next(self):
+        """Block until the next step is due"""
+
+        remaining = self.time_until_next()
+        if remaining > 0:
+            time.sleep(remaining)
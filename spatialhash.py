@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+import math
+
+from constants import GAME
+
+class SpatialHash():
+    """Uniform grid over the (toroidal) game world, used as a collision broadphase.
+    Entities are bucketed by the cell their center falls in; cell coordinates wrap around
+    the edges of the world, so queries near one edge also find entities near the opposite one.
+    """
+
+    def __init__(self, cell_size=64, width=None, height=None):
+        # Default to the size of the game world (read at construction, since it can change)
+        if width is None:
+            width = GAME.WORLD_WIDTH
+        if height is None:
+            height = GAME.WORLD_HEIGHT
+        self.columns = max(1, int(math.ceil(width / cell_size)))
+        self.rows = max(1, int(math.ceil(height / cell_size)))
+        # Stretch the cells slightly if needed, so that they tile the world exactly
+        #   and wrapped cell coordinates line up with wrapped world coordinates
+        self.cell_width = width / self.columns
+        self.cell_height = height / self.rows
+        self.cells = {}
+        # Largest radius of anything in the grid; queries have to reach at least this far
+        self.max_radius = 0
+        self.count = 0
+
+    def clear(self):
+        """Remove everything from the grid"""
+
+        self.cells.clear()
+        self.max_radius = 0
+        self.count = 0
+
+    def cell_of(self, position):
+        """Get the (wrapped) cell coordinates that contain a position"""
+
+        return (int(position[0] // self.cell_width) % self.columns,
+                int(position[1] // self.cell_height) % self.rows)
+
+    def insert(self, index, entity):
+        """Add an entity to the grid.  index is what queries report back for it."""
+
+        self.cells.setdefault(self.cell_of(entity.position), []).append((index, entity))
+        if entity.radius > self.max_radius:
+            self.max_radius = entity.radius
+        self.count += 1
+
+    def remove(self, index, entity):
+        """Remove an entity that was inserted at its current position"""
+
+        bucket = self.cells.get(self.cell_of(entity.position))
+        if bucket is not None:
+            try:
+                bucket.remove((index, entity))
+                self.count -= 1
+            except ValueError:
+                pass
+
+    def build(self, group):
+        """Rebuild the grid from a list of entities, indexing each by its place in the list.
+        None entries (e.g. dead player ships) are skipped.
+        """
+
+        self.clear()
+        for index, entity in enumerate(group):
+            if entity is not None:
+                self.insert(index, entity)
+        return self
+
+    def _span(self, low, high, size, count):
+        """Wrapped cell indices covering the interval [low, high]"""
+
+        first = int(low // size)
+        last = int(high // size)
+        if last - first + 1 >= count:
+            return range(count)
+        return [c % count for c in range(first, last + 1)]
+
+    def query(self, position, radius=0):
+        """Find everything that might be within radius of a position.
+        Returns (index, entity) pairs sorted by index, so callers can keep list order.
+        """
+
+        if self.count == 0:
+            return []
+
+        reach = radius + self.max_radius
+        found = []
+        for cx in self._span(position[0] - reach, position[0] + reach, self.cell_width, self.columns):
+            for cy in self._span(position[1] - reach, position[1] + reach, self.cell_height, self.rows):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def first_collision(self, other):
+        """Find the lowest-indexed entity in the grid that collides with other.
+        Uses Entity.collide for the narrow phase, so results match a linear scan.
+        """
+
+        if other is None:
+            return None
+        for index, entity in self.query(other.position, other.radius):
+            if entity.collide(other):
+                return index, entity
+        return None
+
+    def pairs(self, group):
+        """Enumerate collisions between each entity in group and the grid contents.
+        Yields (entity, (index, hit)) with the first (lowest-indexed) hit for each entity.
+        The entity after each one that hits something isn't checked, as with the original
+        list-based collision check (which removed hits from the list it was iterating over),
+        so that both report exactly the same collisions.
+        """
+
+        entities = iter(group)
+        for entity in entities:
+            hit = self.first_collision(entity)
+            if hit is not None:
+                yield entity, hit
+                next(entities, None)
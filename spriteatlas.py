@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# On-disk cache of pre-rotated sprites.  Rotating every image through 360 degrees takes a while,
+#   so the first time it's done the frames are packed into one big image (an atlas) and written
+#   out as raw pixels, in the display's own pixel format.  Later runs map the file into memory
+#   and use it as is.
+#
+# Atlas files: a header, a rectangle for each frame, then the atlas's pixels (starting at a
+#   multiple of 16 bytes).  They're named after the source image and a hash of it, so editing
+#   an image makes a new atlas (and the old one is deleted).
+
+import hashlib
+import mmap
+import os
+from os import path
+import struct
+
+import pygame
+
+ATLAS_CACHE_DIR = path.join(path.expanduser('~'), '.astroblast', 'atlases')
+
+# Bump this whenever the file layout (or the way frames are made) changes
+ATLAS_VERSION = 2
+
+MAGIC = b'ABSA'
+HEADER = struct.Struct('!4sH4sHHHII')   # Magic, version, pixel format, frame count (rotation steps),
+                                        #   source width & height, atlas width & height
+RECT = struct.Struct('!HHHH')
+
+# Frames are packed into rows this many pixels wide
+ATLAS_WIDTH = 2048
+
+def rotate_frames(image, steps=360):
+    """image rotated to each of steps evenly spaced angles, starting from 0"""
+
+    return [pygame.transform.rotozoom(image, index * 360 / steps, 1) for index in range(steps)]
+
+def pixel_format():
+    """The raw pixel layout (as pygame.image.tostring/frombuffer name it) that matches the display's,
+    so that atlases can be used without converting them; None if there isn't one.
+    """
+
+    masks = pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha().get_masks()
+    for fmt in ('BGRA', 'RGBA', 'ARGB'):
+        try:
+            if pygame.image.frombuffer(bytearray(4), (1, 1), fmt).get_masks() == masks:
+                return fmt
+        except ValueError:
+            # (Not supported by this version of pygame)
+            pass
+    return None
+
+def pack(frames, width=ATLAS_WIDTH):
+    """Lay frames out in rows, left to right.  Returns the atlas and each frame's rectangle in it."""
+
+    rects = []
+    x = y = row_height = 0
+    for frame in frames:
+        w, h = frame.get_size()
+        if x + w > width:
+            x = 0
+            y += row_height
+            row_height = 0
+        rects.append(pygame.Rect(x, y, w, h))
+        x += w
+        row_height = max(row_height, h)
+
+    atlas = pygame.Surface((width, y + row_height), pygame.SRCALPHA)
+    for frame, rect in zip(frames, rects):
+        # (Onto transparent black, this copies pixels exactly, instead of blending them)
+        atlas.blit(frame, rect, special_flags=pygame.BLEND_RGBA_MAX)
+    return atlas, rects
+
+def cache_filename(cache_dir, filename, source, steps, fmt):
+    digest = hashlib.sha1(source)
+    digest.update(pygame.version.ver.encode())
+    name = path.splitext(path.basename(filename))[0]
+    return path.join(cache_dir, '%s-%s-%d-%s.atlas' % (name, digest.hexdigest()[:16], steps, fmt))
+
+def load_rotations(filename, load_image, steps=360, cache_dir=ATLAS_CACHE_DIR):
+    """An image file's frames for each of steps evenly spaced angles, and the unrotated image's rectangle.
+    They come from the cache if possible; otherwise load_image() is called for the image, and the
+    frames are made and cached.  (Needs the display to be set up.)
+    """
+
+    with open(filename, 'rb') as f:
+        source = f.read()
+    native_format = pixel_format()
+    fmt = native_format or 'RGBA'
+    atlas_filename = cache_filename(cache_dir, filename, source, steps, fmt)
+
+    try:
+        frames, rect = read_atlas(atlas_filename, steps, fmt)
+    except (OSError, ValueError, struct.error):
+        # Not cached yet (or the cache is unreadable)
+        image = load_image()
+        rect = image.get_rect()
+        atlas, rects = pack(rotate_frames(image, steps))
+        write_atlas(atlas_filename, atlas, rects, rect, fmt)
+        frames = [atlas.subsurface(frame_rect) for frame_rect in rects]
+        return frames, rect
+
+    if native_format is None:
+        # Pixels have to be converted for fast blitting; do them all at once
+        atlas = frames[0].get_parent().convert_alpha()
+        frames = [atlas.subsurface(frame.get_offset(), frame.get_size()) for frame in frames]
+    return frames, rect
+
+def read_atlas(atlas_filename, steps, fmt):
+    """Map an atlas file into memory.  Raises ValueError if it isn't what's expected."""
+
+    with open(atlas_filename, 'rb') as f:
+        # (Copy-on-write, since pygame wants a writable buffer; nothing is ever written to it)
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    magic, version, file_fmt, count, src_w, src_h, width, height = HEADER.unpack_from(data)
+    if magic != MAGIC or version != ATLAS_VERSION or file_fmt != fmt.encode() or count != steps:
+        raise ValueError('Not a matching sprite atlas')
+    rects = [pygame.Rect(RECT.unpack_from(data, HEADER.size + x * RECT.size)) for x in range(count)]
+    offset = pixel_offset(count)
+    size = width * height * 4
+    if len(data) < offset + size:
+        raise ValueError('Truncated sprite atlas')
+    atlas = pygame.image.frombuffer(memoryview(data)[offset:offset + size], (width, height), fmt)
+    return [atlas.subsurface(rect) for rect in rects], pygame.Rect(0, 0, src_w, src_h)
+
+def write_atlas(atlas_filename, atlas, rects, rect, fmt):
+    """Write an atlas to the cache, and delete any older ones for the same image.
+    Failing to is harmless (it'll just have to be made again next time).
+    """
+
+    cache_dir, name = path.split(atlas_filename)
+    width, height = atlas.get_size()
+    header = bytearray(HEADER.pack(MAGIC, ATLAS_VERSION, fmt.encode(), len(rects), rect.width, rect.height, width, height))
+    for frame_rect in rects:
+        header += RECT.pack(*frame_rect)
+    header += bytes(pixel_offset(len(rects)) - len(header))
+
+    temp_filename = atlas_filename + '.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temp_filename, 'wb') as f:
+            f.write(header)
+            f.write(pygame.image.tostring(atlas, fmt))
+        # (So that nobody reads a half-written atlas)
+        os.replace(temp_filename, atlas_filename)
+
+        prefix = name.rsplit('-', 3)[0] + '-'
+        for other in os.listdir(cache_dir):
+            if other.startswith(prefix) and other.endswith('.atlas') and other != name:
+                os.remove(path.join(cache_dir, other))
+    except OSError:
+        pass
+
+def pixel_offset(count):
+    return -(-(HEADER.size + count * RECT.size) // 16) * 16
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Tests for the generational ID allocator, and for how a game room takes entity IDs from it
+#   in batches.
+# Run with: python3 -m unittest test_idallocator
+
+import unittest
+from queue import Queue
+
+from constants import GAME
+from dispatcher import Dispatcher
+from idallocator import IdAllocator, id_index, id_generation, INDEX_BITS, INDEX_MASK, GENERATION_MASK
+from server import GameServer
+
+class TestIdAllocator(unittest.TestCase):
+
+    def setUp(self):
+        self.ids = IdAllocator(10)
+
+    def test_first_id(self):
+        # Slots below first_id are never handed out
+        self.assertEqual(self.ids.get_ids(3), [10, 11, 12])
+        self.assertFalse(self.ids.release_id(5))
+
+    def test_generation_bumps_on_reuse(self):
+        old = self.ids.get_id()
+        self.assertTrue(self.ids.release_id(old))
+        new = self.ids.get_id()
+        self.assertEqual(id_index(new), id_index(old))
+        self.assertEqual(id_generation(new), id_generation(old) + 1)
+        self.assertNotEqual(new, old)
+
+    def test_stale_ids(self):
+        old = self.ids.get_id()
+        self.ids.release_id(old)
+        new = self.ids.get_id()
+        # The old ID refers to something that's gone, even though its slot is in use again
+        self.assertFalse(self.ids.is_live(old))
+        self.assertTrue(self.ids.is_live(new))
+        self.assertFalse(self.ids.release_id(old))
+        self.assertTrue(self.ids.is_live(new))
+
+    def test_double_release(self):
+        an_id = self.ids.get_id()
+        self.assertTrue(self.ids.release_id(an_id))
+        self.assertFalse(self.ids.release_id(an_id))
+        # Only released once, so it's only handed out once
+        self.assertNotEqual(self.ids.get_id(), self.ids.get_id())
+
+    def test_reused_as_late_as_possible(self):
+        first, second, third = self.ids.get_ids(3)
+        self.ids.release_id(second)
+        self.ids.release_id(first)
+        self.assertEqual([id_index(an_id) for an_id in self.ids.get_ids(3)],
+                         [id_index(second), id_index(first), id_index(third) + 1])
+
+    def test_generation_wraps(self):
+        an_id = self.ids.get_id()
+        for x in range(GENERATION_MASK):
+            self.ids.release_id(an_id)
+            an_id = self.ids.get_id()
+        self.assertEqual(id_generation(an_id), GENERATION_MASK)
+        self.ids.release_id(an_id)
+        an_id = self.ids.get_id()
+        self.assertEqual(id_generation(an_id), 0)
+        # Even the last generation of the last slot fits in a signed 32-bit integer
+        self.assertLess((GENERATION_MASK << INDEX_BITS) | INDEX_MASK, 1 << 31)
+
+    def test_batches(self):
+        batch = self.ids.get_ids(32)
+        self.assertEqual(len(set(batch)), 32)
+        self.assertTrue(all(self.ids.is_live(an_id) for an_id in batch))
+        self.assertEqual(self.ids.release_ids(batch + batch[:4] + [5]), 32)
+        self.assertFalse(any(self.ids.is_live(an_id) for an_id in batch))
+
+class TestRoomIds(unittest.TestCase):
+
+    def setUp(self):
+        self.room = GameServer(Dispatcher(Queue(), Queue(), Queue(), Queue()), Queue())
+
+    def test_batch_reserved(self):
+        first = self.room.next_entity_id()
+        # One ID was used, the rest of the batch is held in reserve
+        self.assertEqual(len(self.room.id_reserve), self.room.id_batch_size - 1)
+        self.assertTrue(all(self.room.ids.is_live(an_id) for an_id in self.room.id_reserve))
+        # Handed out lowest first
+        rest = [self.room.next_entity_id() for x in range(self.room.id_batch_size - 1)]
+        self.assertEqual([first] + rest, sorted([first] + rest))
+        self.assertEqual(self.room.id_reserve, [])
+        # And then another batch is taken
+        self.room.next_entity_id()
+        self.assertEqual(len(self.room.id_reserve), self.room.id_batch_size - 1)
+
+    def test_ids_unique(self):
+        ids = [self.room.next_entity_id() for x in range(self.room.id_batch_size * 3 + 5)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(id_index(an_id) > GAME.LOCAL_SERVER_ID for an_id in ids))
+
+    def test_destroyed_ids_come_back(self):
+        e = self.room.create_entity(GAME.ENTITY_ASTEROID_SMALL, [100, 100])
+        entity_id = e.entity_id
+        self.room.destroy_entity(entity_id)
+        # Given back at the end of the step
+        self.assertTrue(self.room.ids.is_live(entity_id))
+        self.room.step(self.room.clock.step)
+        self.assertFalse(self.room.ids.is_live(entity_id))
+
+    def test_cleanup_releases_reserve(self):
+        used = self.room.next_entity_id()
+        reserved = list(self.room.id_reserve)
+        self.room.cleanup()
+        self.assertFalse(any(self.room.ids.is_live(an_id) for an_id in reserved))
+        self.assertTrue(self.room.ids.is_live(used))
+        # (Safe to call again)
+        self.room.cleanup()
+        self.assertEqual(self.room.id_reserve, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Tests for session encryption: direction prefixes, replay rejection (in order over streams,
+#   with a sliding window for datagrams), tamper detection, reassembly from a stream, and the
+#   server's handshake signature.
+# Run with: python3 -m unittest test_session
+
+import unittest
+
+from Crypto.PublicKey import RSA
+
+from session import (SessionCipher, SessionReader, seal_frame, new_session_key, wrap_session_key,
+                     unwrap_session_key, new_nonce, sign_handshake, verify_handshake, COUNTER, TAG_SIZE,
+                     REPLAY_WINDOW)
+from wire import encode_frame, FrameReader, ProtocolError
+
+def flip(data, index):
+    """data with one bit of the byte at index flipped"""
+
+    data = bytearray(data)
+    data[index] ^= 1
+    return bytes(data)
+
+class TestDirections(unittest.TestCase):
+
+    def setUp(self):
+        key = new_session_key()
+        self.server = SessionCipher(key, True)
+        self.client = SessionCipher(key, False)
+
+    def test_round_trip(self):
+        self.assertEqual(self.server.open(self.client.seal(b'up')), b'up')
+        self.assertEqual(self.client.open(self.server.seal(b'down')), b'down')
+
+    def test_own_messages_rejected(self):
+        # Same key and counter, but the other direction's nonce
+        with self.assertRaises(ProtocolError):
+            self.server.open(self.server.seal(b'echo'))
+        with self.assertRaises(ProtocolError):
+            self.client.open(self.client.seal(b'echo'))
+
+    def test_counters_independent(self):
+        for x in range(3):
+            self.server.open(self.client.seal(b'up'))
+        self.assertEqual(self.client.open(self.server.seal(b'down')), b'down')
+        self.assertEqual(self.server.recv_counter, 3)
+        self.assertEqual(self.client.recv_counter, 1)
+
+    def test_wrong_key_rejected(self):
+        other = SessionCipher(new_session_key(), False)
+        with self.assertRaises(ProtocolError):
+            self.server.open(other.seal(b'up'))
+
+class TestOrdered(unittest.TestCase):
+
+    def setUp(self):
+        key = new_session_key()
+        self.server = SessionCipher(key, True)
+        self.client = SessionCipher(key, False)
+
+    def test_in_order(self):
+        for x in range(10):
+            self.assertEqual(self.server.open(self.client.seal(bytes([x]))), bytes([x]))
+
+    def test_replay_rejected(self):
+        sealed = self.client.seal(b'once')
+        self.server.open(sealed)
+        with self.assertRaises(ProtocolError):
+            self.server.open(sealed)
+
+    def test_gap_rejected(self):
+        self.client.seal(b'lost')
+        with self.assertRaises(ProtocolError):
+            self.server.open(self.client.seal(b'next'))
+
+    def test_reorder_rejected(self):
+        first = self.client.seal(b'first')
+        second = self.client.seal(b'second')
+        with self.assertRaises(ProtocolError):
+            self.server.open(second)
+        # Rejecting it didn't move anything along
+        self.assertEqual(self.server.open(first), b'first')
+        self.assertEqual(self.server.open(second), b'second')
+
+class TestWindow(unittest.TestCase):
+
+    def setUp(self):
+        key = new_session_key()
+        self.server = SessionCipher(key, True, ordered=False)
+        self.client = SessionCipher(key, False, ordered=False)
+        # Counter n is at sealed[n - 1]
+        self.sealed = [self.client.seal(bytes([x % 256])) for x in range(300)]
+
+    def open(self, counter):
+        return self.server.open(self.sealed[counter - 1])
+
+    def test_out_of_order(self):
+        for counter in (3, 1, 2, 5, 4):
+            self.open(counter)
+        self.assertEqual(self.server.recv_counter, 5)
+
+    def test_duplicates_rejected(self):
+        for counter in (5, 3):
+            self.open(counter)
+            with self.assertRaises(ProtocolError):
+                self.open(counter)
+
+    def test_window_edges(self):
+        self.open(100)
+        # Age 63 is the oldest still accepted
+        self.open(100 - (REPLAY_WINDOW - 1))
+        with self.assertRaises(ProtocolError):
+            self.open(100 - REPLAY_WINDOW)
+        with self.assertRaises(ProtocolError):
+            self.open(100 - (REPLAY_WINDOW - 1))
+
+    def test_window_slides(self):
+        self.open(10)
+        self.open(10 + REPLAY_WINDOW - 1)
+        # 10 is now at age 63, and still remembered
+        with self.assertRaises(ProtocolError):
+            self.open(10)
+        self.open(11)
+        self.open(10 + REPLAY_WINDOW)
+        # ...and now it's fallen out of the window altogether
+        with self.assertRaises(ProtocolError):
+            self.open(10)
+
+    def test_big_jump(self):
+        self.open(1)
+        self.open(2)
+        self.open(1 + REPLAY_WINDOW * 3)
+        # Everything from before the jump is too old, but the window behind it is empty
+        for counter in (1, 2, 3):
+            with self.assertRaises(ProtocolError):
+                self.open(counter)
+        self.open(1 + REPLAY_WINDOW * 2 + 1)
+        self.open(REPLAY_WINDOW * 3)
+        with self.assertRaises(ProtocolError):
+            self.open(REPLAY_WINDOW * 3)
+
+    def test_tampered_not_accepted(self):
+        # A forged packet mustn't use up its counter
+        with self.assertRaises(ProtocolError):
+            self.server.open(flip(self.sealed[4], -1))
+        self.assertEqual(self.open(5), bytes([4]))
+
+class TestTampering(unittest.TestCase):
+
+    def setUp(self):
+        key = new_session_key()
+        self.server = SessionCipher(key, True)
+        self.client = SessionCipher(key, False)
+        self.sealed = self.client.seal(b'some message', b'header')
+
+    def assertRejected(self, sealed, header=b'header'):
+        with self.assertRaises(ProtocolError):
+            self.server.open(sealed, header)
+        # The genuine one still gets through afterwards
+        self.assertEqual(self.server.open(self.sealed, b'header'), b'some message')
+
+    def test_header(self):
+        self.assertRejected(self.sealed, b'headex')
+
+    def test_missing_header(self):
+        self.assertRejected(self.sealed, b'')
+
+    def test_counter(self):
+        # (Unordered, so that the altered counter gets as far as being authenticated)
+        self.server.ordered = False
+        self.assertRejected(flip(self.sealed, COUNTER.size - 2))
+
+    def test_ciphertext(self):
+        self.assertRejected(flip(self.sealed, COUNTER.size))
+
+    def test_tag(self):
+        self.assertRejected(flip(self.sealed, len(self.sealed) - TAG_SIZE))
+
+    def test_tag_end(self):
+        self.assertRejected(flip(self.sealed, -1))
+
+    def test_truncated(self):
+        self.assertRejected(self.sealed[:-1])
+
+    def test_too_short(self):
+        self.assertRejected(self.sealed[:COUNTER.size + TAG_SIZE - 1])
+
+    def test_empty(self):
+        self.assertRejected(b'')
+
+class TestSessionReader(unittest.TestCase):
+
+    def setUp(self):
+        key = new_session_key()
+        self.server = SessionCipher(key, True)
+        self.client = SessionCipher(key, False)
+
+    def test_split_reads(self):
+        data = b''.join(seal_frame(self.client, encode_frame(payload) + encode_frame(payload * 2))
+                        for payload in (b'a', b'bc', b'def'))
+        reader = SessionReader(self.server, FrameReader())
+        for x in range(len(data)):
+            reader.feed(data[x:x + 1])
+        self.assertEqual(list(reader.frames), [b'a', b'aa', b'bc', b'bcbc', b'def', b'defdef'])
+
+    def test_picks_up_after_handshake(self):
+        # Sealed frames that arrived along with the end of the handshake
+        sealed = FrameReader()
+        sealed.feed(seal_frame(self.client, encode_frame(b'early')))
+        reader = SessionReader(self.server, sealed)
+        self.assertEqual(list(reader.frames), [b'early'])
+
+    def test_replayed_frame(self):
+        frame = seal_frame(self.client, encode_frame(b'once'))
+        reader = SessionReader(self.server, FrameReader())
+        reader.feed(frame)
+        with self.assertRaises(ProtocolError):
+            reader.feed(frame)
+
+class TestSessionKey(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.RSA_key = RSA.generate(1024)
+
+    def test_wrap_unwrap(self):
+        key = new_session_key()
+        wrapped = wrap_session_key(key, self.RSA_key.publickey())
+        self.assertEqual(unwrap_session_key(wrapped, self.RSA_key), key)
+
+    def test_wrong_size(self):
+        wrapped = wrap_session_key(b'short', self.RSA_key.publickey())
+        with self.assertRaises(ValueError):
+            unwrap_session_key(wrapped, self.RSA_key)
+
+    def test_tampered(self):
+        wrapped = wrap_session_key(new_session_key(), self.RSA_key.publickey())
+        with self.assertRaises(ValueError):
+            unwrap_session_key(flip(wrapped, 10), self.RSA_key)
+
+class TestHandshakeSignature(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server_key = RSA.generate(1024)
+        cls.client_key = RSA.generate(1024)
+        cls.impostor_key = RSA.generate(1024)
+
+    def setUp(self):
+        self.server_pub_key = self.server_key.publickey().exportKey()
+        self.client_pub_key = self.client_key.publickey().exportKey()
+        self.nonce = new_nonce()
+        self.wrapped = wrap_session_key(new_session_key(), self.client_key.publickey())
+        self.signature = sign_handshake(self.server_key, self.client_pub_key, self.nonce, self.wrapped)
+
+    def assertVerifies(self, signature, server_pub_key, client_pub_key, nonce, wrapped):
+        verify_handshake(signature, server_pub_key, client_pub_key, nonce, wrapped)
+
+    def assertRejected(self, signature, server_pub_key, client_pub_key, nonce, wrapped):
+        with self.assertRaises(ValueError):
+            verify_handshake(signature, server_pub_key, client_pub_key, nonce, wrapped)
+
+    def test_genuine(self):
+        self.assertVerifies(self.signature, self.server_pub_key, self.client_pub_key, self.nonce, self.wrapped)
+
+    def test_impostor(self):
+        # Presents the real server's public key, but doesn't have its private key
+        signature = sign_handshake(self.impostor_key, self.client_pub_key, self.nonce, self.wrapped)
+        self.assertRejected(signature, self.server_pub_key, self.client_pub_key, self.nonce, self.wrapped)
+
+    def test_replayed(self):
+        # An old answer, for a different nonce
+        self.assertRejected(self.signature, self.server_pub_key, self.client_pub_key, new_nonce(), self.wrapped)
+
+    def test_substituted_key(self):
+        wrapped = wrap_session_key(new_session_key(), self.client_key.publickey())
+        self.assertRejected(self.signature, self.server_pub_key, self.client_pub_key, self.nonce, wrapped)
+
+    def test_other_client(self):
+        other_pub_key = self.impostor_key.publickey().exportKey()
+        self.assertRejected(self.signature, self.server_pub_key, other_pub_key, self.nonce, self.wrapped)
+
+    def test_tampered_signature(self):
+        self.assertRejected(flip(self.signature, 0), self.server_pub_key, self.client_pub_key, self.nonce, self.wrapped)
+
+    def test_garbled_public_key(self):
+        self.assertRejected(self.signature, b'not a key', self.client_pub_key, self.nonce, self.wrapped)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Tests that the spatial hash finds exactly the same collisions as the list-based checks it
+#   replaced (kept here as list_collide_group_and_entity/list_collide_groups), on random worlds.
+# Run with: python3 -m unittest test_spatialhash
+
+import random
+import unittest
+
+from constants import GAME
+from entity import Entity
+from spatialhash import SpatialHash
+
+def list_collide_group_and_entity(group, other, destroy=True):
+    """The original check: the first entity in group (in list order) that other collides with"""
+
+    original_len = len(group)
+    group = group.copy()
+    for entity in group:
+        if entity is not None and entity.collide(other):
+            group.remove(entity)
+            if destroy:
+                entity.should_destroy = True
+            break
+    return original_len - len(group)
+
+def list_collide_groups(group1, group2, destroy=True):
+    """The original check: removing hits from the list being iterated over skips the entity after each one"""
+
+    group1 = group1.copy()
+    count = 0
+    for entity in group1:
+        if list_collide_group_and_entity(group2, entity, destroy) > 0:
+            count += 1
+            group1.remove(entity)
+            if destroy:
+                entity.should_destroy = True
+    return count
+
+class TestSpatialHash(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(3)
+
+    def make_group(self, count):
+        """Entities scattered over (and just past the edges of) the world, of all the sizes the
+        game uses (and some bigger than a cell), with the odd gap
+        """
+
+        group = []
+        for x in range(count):
+            if self.random.random() < 0.05:
+                group.append(None)
+                continue
+            pos = [self.random.uniform(-30, GAME.WORLD_WIDTH + 30), self.random.uniform(-30, GAME.WORLD_HEIGHT + 30)]
+            e = Entity(pos, 0, (0, 0), 0, self.random.choice([5, 14, 21, 30, 58, 150]), x)
+            # Entities never collide with others of the same player
+            e.player_id = self.random.choice([-1, -1, 1, 2])
+            group.append(e)
+        return group
+
+    def flags(self, *groups):
+        flags = [e.should_destroy if e is not None else None for group in groups for e in group]
+        for group in groups:
+            for e in group:
+                if e is not None:
+                    e.should_destroy = False
+        return flags
+
+    def test_first_collision(self):
+        for trial in range(300):
+            group = self.make_group(self.random.randrange(0, 60))
+            other = self.make_group(1)[0]
+            if other is None:
+                continue
+            grid = SpatialHash().build(group)
+            expected = None
+            for index, e in enumerate(group):
+                if e is not None and e.collide(other):
+                    expected = (index, e)
+                    break
+            self.assertEqual(grid.first_collision(other), expected)
+
+    def test_pairs_match_list_scan(self):
+        hits = 0
+        for trial in range(300):
+            # (Gaps in group1 are dead player ships)
+            group1 = self.make_group(self.random.randrange(0, 40))
+            group2 = self.make_group(self.random.randrange(0, 60))
+            list_collide_groups(group1, group2)
+            expected = self.flags(group1, group2)
+
+            grid = SpatialHash().build(group2)
+            found = list(grid.pairs(group1))
+            for entity, (index, hit) in found:
+                self.assertIs(group2[index], hit)
+                self.assertIsNotNone(entity)
+                entity.should_destroy = True
+                hit.should_destroy = True
+            self.assertEqual(self.flags(group1, group2), expected)
+            self.assertEqual(len(found), list_collide_groups(group1, group2, False))
+            hits += len(found)
+        # (Make sure the worlds are crowded enough to test anything)
+        self.assertGreater(hits, 300)
+
+    def test_skip_after_hit(self):
+        # Both of the first two collide with the target, but the second is skipped since the first hit
+        target = Entity([100, 100], 0, (0, 0), 0, 10, 0)
+        group = [Entity([100, 100], 0, (0, 0), 0, 10, x + 1) for x in range(3)]
+        for e in group:
+            e.player_id = 1
+        found = [entity for entity, hit in SpatialHash().build([target]).pairs(group)]
+        self.assertEqual(found, [group[0], group[2]])
+        self.assertEqual(list_collide_groups(group, [target], False), 2)
+
+    def test_wraps_around(self):
+        # Near opposite edges of the world: the grid looks in the wrapped cells, though
+        #   Entity.collide itself doesn't wrap
+        near_edge = Entity([GAME.WORLD_WIDTH - 1, 100], 0, (0, 0), 0, 10, 1)
+        near_edge.player_id = 1
+        other = Entity([1, 100], 0, (0, 0), 0, 10, 2)
+        other.player_id = 2
+        grid = SpatialHash().build([near_edge])
+        self.assertTrue(grid.query(other.position, other.radius))
+        self.assertEqual(grid.first_collision(other), None)
+
+    def test_empty(self):
+        grid = SpatialHash().build([])
+        self.assertEqual(grid.query([0, 0], 100), [])
+        self.assertEqual(list(grid.pairs([Entity([0, 0], 0, (0, 0), 0, 10, 1)])), [])
+
+if __name__ == '__main__':
+    unittest.main()
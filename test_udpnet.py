@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Tests for the UDP transport's reliable and unreliable channels, over a simulated network
+#   that loses, reorders, and duplicates packets.
+# Run with: python3 -m unittest test_udpnet
+
+import asyncio
+import random
+import time
+import unittest
+
+import messages
+from constants import MESSAGES
+from session import SessionCipher, new_session_key
+from udpnet import UdpPeer, RESEND_INTERVAL
+import wire
+
+class FakeTransport():
+    """Holds on to sent packets instead of sending them"""
+
+    def __init__(self):
+        self.packets = []
+
+    def sendto(self, data, addr=None):
+        self.packets.append(data)
+
+class TestUdpPeer(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(1)
+        self.loop = asyncio.new_event_loop()
+        key = new_session_key()
+        self.server_transport = FakeTransport()
+        self.client_transport = FakeTransport()
+        self.server = UdpPeer(self.loop, self.server_transport, None, SessionCipher(key, True, ordered=False))
+        self.client = UdpPeer(self.loop, self.client_transport, None, SessionCipher(key, False, ordered=False))
+        self.reliable = []
+        self.unreliable = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def deliver(self, transport, peer, loss):
+        """Deliver what's been sent, shuffled, with some duplicated and some lost"""
+
+        packets = transport.packets
+        transport.packets = []
+        self.random.shuffle(packets)
+        packets += self.random.sample(packets, len(packets) // 5)
+        for data in packets:
+            if self.random.random() >= loss:
+                peer.receive(data)
+        while peer.frames:
+            msg = wire.decode_msg(peer.frames.popleft())
+            if msg.msg_type == MESSAGES.SNAPSHOT:
+                self.unreliable.append(msg)
+            else:
+                self.reliable.append(msg)
+
+    def run_session(self, count, loss):
+        now = time.monotonic()
+        sent = 0
+        while len(self.reliable) < count:
+            for x in range(self.random.randint(0, 30)):
+                if sent < count:
+                    self.server.pending.append(messages.UpdateScore(sent))
+                    sent += 1
+                self.server.pending.append(messages.Snapshot(sent, [1], [1.0], [1.0], [0.0]))
+            self.server.send_pending()
+            self.deliver(self.server_transport, self.client, loss)
+            now += RESEND_INTERVAL / 2
+            self.server.maintain(now)
+            self.client.maintain(now)
+            self.deliver(self.client_transport, self.server, loss)
+            self.deliver(self.server_transport, self.client, loss)
+
+    def test_reliable_in_order(self):
+        self.run_session(2000, 0.3)
+        self.assertEqual([msg.player_score for msg in self.reliable], list(range(2000)))
+        self.assertGreater(self.server.resends, 0)
+
+    def test_unreliable_never_goes_back(self):
+        self.run_session(2000, 0.3)
+        times = [msg.server_time for msg in self.unreliable]
+        self.assertTrue(times)
+        self.assertEqual(times, sorted(times))
+        self.assertGreater(self.client.stale_dropped, 0)
+
+    def test_everything_acknowledged(self):
+        self.run_session(500, 0)
+        # Once the acks get back, nothing's left waiting to be resent
+        now = time.monotonic() + 60
+        self.client.maintain(now)
+        self.deliver(self.client_transport, self.server, 0)
+        self.assertFalse(self.server.unacked)
+
+    def test_forged_packet_ignored(self):
+        self.server.pending.append(messages.UpdateScore(1))
+        self.server.send_pending()
+        data = bytearray(self.server_transport.packets.pop())
+        data[-1] ^= 1
+        self.client.receive(bytes(data))
+        self.assertFalse(self.client.frames)
+        self.assertEqual(self.client.next_expected, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Tests for the binary wire format: every message type round-trips (field mask, list fields,
+#   floats), frames are reassembled however reads split them up, and bad input is rejected.
+# Run with: python3 -m unittest test_wire
+
+import struct
+import unittest
+
+import messages
+from constants import MESSAGES, MSGCONTENT
+from wire import (encode_msg, decode_msg, encode_frame, FrameReader, ProtocolError, FIELD_FORMATS, LIST_FORMATS,
+                  LENGTH, HEADER, PROTOCOL_VERSION, MAX_FRAME)
+
+# A value for each kind of field (floats that single precision holds exactly)
+SAMPLE_VALUES = {'i': -123456, 'H': 65535, 'h': -3, 'f': -1234.5, 'q': 1 << 40}
+SAMPLE_LISTS = {'i': [1, -2, 1 << 30], 'f': [0.5, -1.25, 4096.0]}
+
+# Message types that only ever travel between modules in one process
+LOCAL_ONLY = (MESSAGES.TERMINATE, MESSAGES.FLUSH)
+
+def sample(key):
+    if key in LIST_FORMATS:
+        return list(SAMPLE_LISTS[LIST_FORMATS[key]])
+    return SAMPLE_VALUES[FIELD_FORMATS[key]]
+
+def fields(msg):
+    return {name: getattr(msg, name) for name in msg.attrs.values()}
+
+def payload(frame):
+    """A single frame's payload"""
+
+    (length,) = LENGTH.unpack_from(frame)
+    return frame[LENGTH.size:LENGTH.size + length]
+
+class TestRoundTrip(unittest.TestCase):
+
+    def round_trip(self, msg):
+        decoded = decode_msg(payload(encode_msg(msg)))
+        self.assertIs(type(decoded), type(msg))
+        self.assertEqual(fields(decoded), fields(msg))
+        return decoded
+
+    def test_every_type(self):
+        for msg_type, cls in messages.CLASSES.items():
+            if msg_type in LOCAL_ONLY:
+                continue
+            with self.subTest(cls.__name__):
+                # Every field set, header included
+                msg = cls(*[sample(key) for key in cls.fields])
+                msg.sender_id, msg.recipient_id, msg.room_id = 1000, 2, 7
+                self.round_trip(msg)
+
+    def test_required_only(self):
+        for msg_type, cls in messages.CLASSES.items():
+            if msg_type in LOCAL_ONLY:
+                continue
+            with self.subTest(cls.__name__):
+                # Optional fields and the header are left out of the mask, and come back as None
+                decoded = self.round_trip(cls(*[sample(key) for key in cls.fields[:cls.required]]))
+                self.assertIsNone(decoded.sender_id)
+
+    def test_positions(self):
+        msg = self.round_trip(messages.UpdatePos(5, 123.25, -0.125))
+        self.assertEqual((msg.x_pos, msg.y_pos), (123.25, -0.125))
+        # Positions are sent in single precision
+        msg = decode_msg(payload(encode_msg(messages.UpdatePos(5, 0.1, 1e6 + 0.3))))
+        self.assertAlmostEqual(msg.x_pos, 0.1, places=6)
+        self.assertAlmostEqual(msg.y_pos, 1e6 + 0.3, delta=0.1)
+
+    def test_lists(self):
+        self.round_trip(messages.Snapshot(1, [], [], [], []))
+        count = 500
+        msg = self.round_trip(messages.Snapshot(2, list(range(count)), [x * 0.5 for x in range(count)],
+                                                [-x * 0.25 for x in range(count)], [x % 360 for x in range(count)]))
+        self.assertEqual(len(msg.entity_ids), count)
+
+    def test_mask(self):
+        # Only the fields that are set take up space
+        without = encode_msg(messages.CreateEntity(1, 2, 3.0, 4.0, 5.0))
+        with_player = encode_msg(messages.CreateEntity(1, 2, 3.0, 4.0, 5.0, 1001))
+        self.assertEqual(len(with_player) - len(without), struct.calcsize('!' + FIELD_FORMATS[MSGCONTENT.PLAYER_ID]))
+
+class TestDecode(unittest.TestCase):
+
+    def test_wrong_version(self):
+        data = bytearray(payload(encode_msg(messages.UpdateScore(10))))
+        data[0] = PROTOCOL_VERSION + 1
+        with self.assertRaises(ProtocolError):
+            decode_msg(bytes(data))
+
+    def test_truncated(self):
+        data = payload(encode_msg(messages.Snapshot(1, [1, 2], [1.0, 2.0], [1.0, 2.0], [0.0, 0.0])))
+        for end in range(len(data)):
+            with self.subTest(end=end):
+                with self.assertRaises(ProtocolError):
+                    decode_msg(data[:end])
+
+    def test_unknown_type(self):
+        self.assertIsNone(decode_msg(HEADER.pack(PROTOCOL_VERSION, 9999, 0)))
+
+    def test_missing_required(self):
+        self.assertIsNone(decode_msg(HEADER.pack(PROTOCOL_VERSION, MESSAGES.UPDATESCORE, 0)))
+
+class TestFrameReader(unittest.TestCase):
+
+    def setUp(self):
+        self.msgs = [messages.ConnectAccept(1000, 4000, 3000), messages.Ping(),
+                     messages.Snapshot(1, [1, 2, 3], [1.5, 2.5, 3.5], [0.5, 0.5, 0.5], [90.0, 180.0, 270.0]),
+                     messages.UpdateScore(250)]
+        self.data = b''.join(encode_msg(msg) for msg in self.msgs)
+
+    def decoded(self, reader):
+        return [fields(decode_msg(frame)) for frame in reader.frames]
+
+    def test_split_everywhere(self):
+        for split in range(len(self.data) + 1):
+            with self.subTest(split=split):
+                reader = FrameReader()
+                reader.feed(self.data[:split])
+                reader.feed(self.data[split:])
+                self.assertEqual(self.decoded(reader), [fields(msg) for msg in self.msgs])
+                self.assertFalse(reader.buffer)
+
+    def test_byte_at_a_time(self):
+        reader = FrameReader()
+        for x in range(len(self.data)):
+            reader.feed(self.data[x:x + 1])
+        self.assertEqual(self.decoded(reader), [fields(msg) for msg in self.msgs])
+
+    def test_coalesced(self):
+        reader = FrameReader()
+        reader.feed(self.data * 3)
+        self.assertEqual(len(reader.frames), len(self.msgs) * 3)
+
+    def test_incomplete(self):
+        reader = FrameReader()
+        reader.feed(self.data[:-1])
+        self.assertEqual(len(reader.frames), len(self.msgs) - 1)
+        # The rest of the last frame is kept until it's finished
+        self.assertTrue(reader.buffer)
+        reader.feed(self.data[-1:])
+        self.assertEqual(len(reader.frames), len(self.msgs))
+
+    def test_empty_frame(self):
+        reader = FrameReader()
+        reader.feed(encode_frame(b''))
+        self.assertEqual(list(reader.frames), [b''])
+
+    def test_oversized(self):
+        reader = FrameReader()
+        with self.assertRaises(ProtocolError):
+            reader.feed(LENGTH.pack(MAX_FRAME + 1))
+
+    def test_limit(self):
+        reader = FrameReader(max_frame=16)
+        reader.feed(encode_frame(bytes(16)))
+        self.assertEqual(len(reader.frames), 1)
+        with self.assertRaises(ProtocolError):
+            reader.feed(encode_frame(bytes(17)))
+
+if __name__ == '__main__':
+    unittest.main()
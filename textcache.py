@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+from collections import OrderedDict
+
+import pygame
+
+class TextCache():
+    """Loads each font once, and keeps rendered text around, so that a label that hasn't changed
+    since the last frame isn't rendered again.
+    Fonts are given as (names, size, bold), as for pygame.font.SysFont.
+    """
+
+    def __init__(self, max_labels=256):
+        self.max_labels = max_labels
+        self.fonts = {}
+        # (text, font, color, antialias) -> rendered text, least recently used first
+        self.labels = OrderedDict()
+        self.sizes = {}
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, font):
+        loaded = self.fonts.get(font)
+        if loaded is None:
+            names, size, bold = font
+            loaded = pygame.font.SysFont(names, size, bold)
+            self.fonts[font] = loaded
+        return loaded
+
+    def render(self, text, font, color, antialias=True):
+        key = (text, font, color, antialias)
+        label = self.labels.get(key)
+        if label is not None:
+            self.labels.move_to_end(key)
+            self.hits += 1
+            return label
+
+        label = self.font(font).render(text, antialias, color)
+        self.misses += 1
+        self.labels[key] = label
+        if len(self.labels) > self.max_labels:
+            self.labels.popitem(last=False)
+        return label
+
+    def size(self, text, font):
+        """Size text would be rendered at, like pygame.font.Font.size"""
+
+        key = (text, font)
+        size = self.sizes.get(key)
+        if size is None:
+            size = self.font(font).size(text)
+            self.sizes[key] = size
+        return size
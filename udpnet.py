@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# UDP network transport.  Messages travel on one of two channels:
+#   - Unreliable: entity state (snapshots, position/rotation updates).  Sent once; if a packet
+#     is lost the next one supersedes it anyway, and a packet that arrives after a newer one
+#     is dropped.
+#   - Reliable: everything else (entities being created/destroyed, score, state changes, ...).
+#     Each message has a sequence number, is resent until the other side acknowledges it, and
+#     is delivered in order.
+#   So a lost packet only delays reliable messages, never the entity state behind them.
+#
+# Packets: a header (version, kind), then for DATA packets the packet's sequence number and
+#   the next reliable sequence number the sender is waiting for (which acknowledges everything
+#   before it), followed by entries: a channel byte, a sequence number for reliable entries,
+#   and a framed message (see wire.py).  Everything after the header is encrypted with the
+#   session key (see session.py), which the server sends back in answer to the client's HELLO.
+#   HELLO carries a nonce and the client's public key; WELCOME carries the server's public key,
+#   the encrypted session key, and the server's signature over all of it (each framed).
+
+import asyncio
+import struct
+import time
+from threading import Thread
+from collections import deque, OrderedDict
+
+from Crypto.PublicKey import RSA
+
+from constants import MESSAGES, NETWORK, GAME
+import messages
+from wire import LENGTH, ProtocolError, encode_frame, FrameReader
+from session import (SessionCipher, new_session_key, wrap_session_key, unwrap_session_key, new_nonce, sign_handshake,
+                     verify_handshake, NONCE_SIZE)
+from networking import HANDSHAKE_TIMEOUT, deliver_frames, pack_msg
+from asyncnet import AsyncNetworkManager, ConnectionOutbox, forward_queue
+
+PROTOCOL_VERSION = 1
+
+# Packet kinds
+KIND_HELLO = 1      # Client asks to connect; carries a nonce and its public key
+KIND_WELCOME = 2    # Server accepts; carries the session key, encrypted with the client's public key (and signed)
+KIND_DATA = 3
+KIND_BYE = 4
+
+HEADER = struct.Struct('!BB')
+DATA_HEADER = struct.Struct('!II')
+CHANNEL_UNRELIABLE = 0
+CHANNEL_RELIABLE = 1
+UNRELIABLE_ENTRY = struct.Struct('!B')
+RELIABLE_ENTRY = struct.Struct('!BI')
+
+# Message types that go on the unreliable channel
+UNRELIABLE = frozenset((MESSAGES.SNAPSHOT, MESSAGES.UPDATEPOS, MESSAGES.UPDATEROT))
+
+# Entries are packed into packets of up to this many bytes (so they aren't fragmented on
+#   typical links); a single larger message gets a packet of its own
+MAX_PACKET = 1200
+
+# Timings (seconds)
+MAINTAIN_INTERVAL = 0.02    # How often to check for resends, acks owed, and timeouts
+RESEND_INTERVAL = 0.1       # Resend reliable messages that haven't been acknowledged after this long
+KEEPALIVE_INTERVAL = 1      # Send something at least this often, so the other side knows we're here
+PEER_TIMEOUT = 10           # Give up on a peer that we haven't heard from for this long
+HELLO_INTERVAL = 0.5        # Repeat the HELLO this often until the server answers
+
+# Most reliable messages to hold on to while waiting for an earlier one that was lost
+MAX_OUT_OF_ORDER = 1024
+
+class UdpPeer(ConnectionOutbox):
+    """The far end of a UDP "connection": sends the messages dispatch puts in it, keeps track of
+    the reliable channel in both directions, and unpacks what arrives from it
+    """
+
+    def __init__(self, loop, transport, addr, cipher, connection_id=None):
+        ConnectionOutbox.__init__(self, loop)
+        self.transport = transport
+        self.addr = addr
+        self.cipher = cipher
+        self.connection_id = connection_id
+        # The server's answer to this peer's HELLO (sent again if the peer says hello again)
+        self.welcome = None
+
+        # Sending
+        self.next_packet_seq = 1
+        self.next_reliable_seq = 1
+        # Reliable entries not acknowledged yet: seq -> [entry, when it was last sent]
+        self.unacked = OrderedDict()
+        self.ack_due = False
+        self.last_sent = time.monotonic()
+
+        # Receiving
+        self.last_packet_seq = 0
+        self.next_expected = 1
+        self.out_of_order = {}
+        self.last_heard = time.monotonic()
+        # Complete message payloads, in the order they should be delivered (see deliver_frames)
+        self.frames = deque()
+
+        # Statistics
+        self.resends = 0
+        self.stale_dropped = 0
+
+    def wake(self):
+        self.wakeup_scheduled = False
+        self.send_pending()
+
+    def send_pending(self):
+        """Send everything dispatch has put in, as few packets as possible"""
+
+        now = time.monotonic()
+        entries = []
+        pending = self.pending
+        while pending:
+            msg = pending.popleft()
+            data = pack_msg(msg)
+            self.msgs += 1
+            if msg.msg_type in UNRELIABLE:
+                entries.append(UNRELIABLE_ENTRY.pack(CHANNEL_UNRELIABLE) + data)
+            else:
+                seq = self.next_reliable_seq
+                self.next_reliable_seq += 1
+                entry = RELIABLE_ENTRY.pack(CHANNEL_RELIABLE, seq) + data
+                self.unacked[seq] = [entry, now]
+                entries.append(entry)
+        if entries:
+            self.send_entries(entries)
+
+    def send_entries(self, entries):
+        packet = []
+        size = 0
+        for entry in entries:
+            if packet and size + len(entry) > MAX_PACKET:
+                self.send_packet(packet)
+                packet = []
+                size = 0
+            packet.append(entry)
+            size += len(entry)
+        self.send_packet(packet)
+
+    def send_packet(self, entries):
+        header = HEADER.pack(PROTOCOL_VERSION, KIND_DATA)
+        body = DATA_HEADER.pack(self.next_packet_seq, self.next_expected) + b''.join(entries)
+        data = header + self.cipher.seal(body, header)
+        self.next_packet_seq += 1
+        self.transport.sendto(data, self.addr)
+        self.batches += 1
+        self.bytes_sent += len(data)
+        self.ack_due = False
+        self.last_sent = time.monotonic()
+
+    def maintain(self, now):
+        """Resend what's overdue, and acknowledge what's arrived (if nothing else has)"""
+
+        resend = []
+        for seq, sent in self.unacked.items():
+            if now - sent[1] >= RESEND_INTERVAL:
+                sent[1] = now
+                resend.append(sent[0])
+        self.resends += len(resend)
+        if resend or self.ack_due or now - self.last_sent >= KEEPALIVE_INTERVAL:
+            self.send_entries(resend)
+
+    def seal_bye(self):
+        header = HEADER.pack(PROTOCOL_VERSION, KIND_BYE)
+        return header + self.cipher.seal(b'', header)
+
+    def is_bye(self, data):
+        """Whether a BYE packet really came from this peer"""
+
+        try:
+            self.cipher.open(data[HEADER.size:], data[:HEADER.size])
+            return True
+        except ProtocolError:
+            return False
+
+    def receive(self, data):
+        """Handle a DATA packet from this peer, queueing up the messages it completes in self.frames"""
+
+        try:
+            # Anything forged, tampered with, or replayed goes no further
+            data = self.cipher.open(data[HEADER.size:], data[:HEADER.size])
+            packet_seq, ack = DATA_HEADER.unpack_from(data)
+            self.last_heard = time.monotonic()
+
+            # Everything before ack has arrived
+            while self.unacked:
+                seq = next(iter(self.unacked))
+                if seq >= ack:
+                    break
+                del self.unacked[seq]
+
+            # Packets can arrive out of order; entity state from one older than we've seen is stale
+            fresh = packet_seq > self.last_packet_seq
+            if fresh:
+                self.last_packet_seq = packet_seq
+
+            offset = DATA_HEADER.size
+            while offset < len(data):
+                channel = data[offset]
+                if channel == CHANNEL_RELIABLE:
+                    seq = RELIABLE_ENTRY.unpack_from(data, offset)[1]
+                    offset += RELIABLE_ENTRY.size
+                else:
+                    offset += UNRELIABLE_ENTRY.size
+                (length,) = LENGTH.unpack_from(data, offset)
+                offset += LENGTH.size
+                payload = data[offset:offset + length]
+                if len(payload) < length:
+                    raise ProtocolError('Truncated entry')
+                offset += length
+
+                if channel == CHANNEL_RELIABLE:
+                    self.ack_due = True
+                    if seq == self.next_expected:
+                        self.frames.append(payload)
+                        self.next_expected += 1
+                        # Anything that was waiting on this one can go too
+                        while self.next_expected in self.out_of_order:
+                            self.frames.append(self.out_of_order.pop(self.next_expected))
+                            self.next_expected += 1
+                    elif seq > self.next_expected and len(self.out_of_order) < MAX_OUT_OF_ORDER:
+                        self.out_of_order[seq] = payload
+                    # (Otherwise it's a resend of something we already have)
+                elif fresh:
+                    self.frames.append(payload)
+                else:
+                    self.stale_dropped += 1
+        except (struct.error, ProtocolError):
+            # Garbled packet; whatever it had that matters will be resent
+            pass
+
+    def stats(self):
+        stats = ConnectionOutbox.stats(self)
+        stats['resends'] = self.resends
+        stats['stale_dropped'] = self.stale_dropped
+        return stats
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    """Hands every datagram to a callback"""
+
+    def __init__(self, on_packet):
+        self.on_packet = on_packet
+
+    def datagram_received(self, data, addr):
+        self.on_packet(data, addr)
+
+class UdpNetworkManager(AsyncNetworkManager):
+    """Handles and routes all internet traffic to and from remote clients/servers over UDP.
+    Takes the same arguments as NetworkManager, and can be used in its place (but both ends
+    have to use UDP).
+    """
+
+    def __init__(self, *args, **kwargs):
+        AsyncNetworkManager.__init__(self, *args, **kwargs)
+        self.transport = None
+        # Peers by address (as a server)
+        self.peers = {}
+        self.welcomed = None
+        self.hello_nonce = None
+
+    def hello_packet(self, nonce):
+        return HEADER.pack(PROTOCOL_VERSION, KIND_HELLO) + nonce + self.local_pub_key
+
+    def welcome_packet(self, session_key, nonce, remote_pub_key):
+        """The answer to a HELLO: the session key, for the client only, signed to show it's from us"""
+
+        wrapped_key = wrap_session_key(session_key, RSA.importKey(remote_pub_key))
+        signature = sign_handshake(self.RSA_key, remote_pub_key, nonce, wrapped_key)
+        return (HEADER.pack(PROTOCOL_VERSION, KIND_WELCOME) + encode_frame(self.local_pub_key) + encode_frame(wrapped_key)
+                + encode_frame(signature))
+
+    def read_welcome(self, data):
+        """The session key from the server's answer to our HELLO.  Raises ValueError unless it's
+        genuine, and meant for this HELLO.
+        """
+
+        frames = FrameReader()
+        frames.feed(data[HEADER.size:])
+        if len(frames.frames) != 3 or frames.buffer:
+            raise ValueError('Malformed WELCOME')
+        remote_pub_key, wrapped_key, signature = frames.frames
+        verify_handshake(signature, remote_pub_key, self.local_pub_key, self.hello_nonce, wrapped_key)
+        return unwrap_session_key(wrapped_key, self.RSA_key)
+
+    async def run_maintenance(self, peers):
+        """Look after the reliable channel, and time peers out, until told to stop"""
+
+        while True:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), MAINTAIN_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            for peer in list(peers):
+                if now - peer.last_heard > PEER_TIMEOUT:
+                    self.drop_peer(peer)
+                else:
+                    peer.maintain(now)
+            if self.mode != NETWORK.MODE_SERVER and not self.outboxes:
+                # The server went away
+                return
+
+    def deliver(self, peer):
+        try:
+            deliver_frames(peer, self.dispatch_queue, peer.connection_id)
+        except ProtocolError:
+            peer.frames.clear()
+
+    def drop_peer(self, peer, say_bye=False):
+        """Forget about a peer (and let the game know it's gone)"""
+
+        if say_bye:
+            peer.send_pending()
+            self.transport.sendto(peer.seal_bye(), peer.addr)
+        if self.mode == NETWORK.MODE_SERVER:
+            if self.peers.pop(peer.addr, None) is None:
+                return
+            self.dispatch.unregister_connection(peer.connection_id)
+            self.outboxes.pop(peer.connection_id, None)
+            # Let the server know this client is gone, in case it couldn't say so itself
+            msg = messages.SignalDisconnect()
+            msg.sender_id = peer.connection_id
+            msg.recipient_id = GAME.LOCAL_SERVER_ID
+            self.dispatch_queue.put(msg)
+        else:
+            self.outboxes.pop(GAME.LOCAL_SERVER_ID, None)
+
+    def server_packet(self, data, addr):
+        """Handle a packet arriving at the server"""
+
+        if len(data) < HEADER.size:
+            return
+        version, kind = HEADER.unpack_from(data)
+        if version != PROTOCOL_VERSION:
+            return
+        peer = self.peers.get(addr)
+        if kind == KIND_DATA and peer is not None:
+            peer.receive(data)
+            self.deliver(peer)
+        elif kind == KIND_HELLO:
+            if peer is None:
+                nonce = data[HEADER.size:HEADER.size + NONCE_SIZE]
+                remote_pub_key = data[HEADER.size + NONCE_SIZE:]
+                # Make up a key for this session, to send back encrypted with the client's public key
+                session_key = new_session_key()
+                try:
+                    welcome = self.welcome_packet(session_key, nonce, remote_pub_key)
+                except (ValueError, IndexError, TypeError):
+                    return
+                peer = UdpPeer(self.loop, self.transport, addr, SessionCipher(session_key, True, ordered=False))
+                peer.welcome = welcome
+                # Give this client its own ID and outbox, so that the dispatcher can address it
+                peer.connection_id = self.dispatch.register_connection(peer)
+                self.peers[addr] = peer
+                self.outboxes[peer.connection_id] = peer
+            # (Answered every time, in case the last answer got lost)
+            self.transport.sendto(peer.welcome, addr)
+        elif kind == KIND_BYE and peer is not None and peer.is_bye(data):
+            self.drop_peer(peer)
+
+    def client_packet(self, data, addr):
+        """Handle a packet arriving at the client"""
+
+        if len(data) < HEADER.size:
+            return
+        version, kind = HEADER.unpack_from(data)
+        if version != PROTOCOL_VERSION:
+            return
+        peer = self.outboxes.get(GAME.LOCAL_SERVER_ID)
+        if kind == KIND_DATA and peer is not None:
+            peer.receive(data)
+            self.deliver(peer)
+        elif kind == KIND_WELCOME and not self.welcomed.done():
+            try:
+                self.welcomed.set_result(self.read_welcome(data))
+            except (ValueError, TypeError):
+                # Garbled, or not from the server we said hello to
+                pass
+        elif kind == KIND_BYE and peer is not None and peer.is_bye(data):
+            self.drop_peer(peer)
+
+    async def serve(self):
+        """Serve clients until told to stop"""
+
+        self.transport, protocol = await self.loop.create_datagram_endpoint(
+            lambda: UdpProtocol(self.server_packet), local_addr=(self.addr, self.port))
+        try:
+            await self.run_maintenance(self.peers.values())
+        finally:
+            for peer in list(self.peers.values()):
+                self.drop_peer(peer, True)
+            self.transport.close()
+
+    async def connect(self):
+        """Talk to a remote server until either side hangs up"""
+
+        self.transport, protocol = await self.loop.create_datagram_endpoint(
+            lambda: UdpProtocol(self.client_packet), remote_addr=(self.remote_server_addr, self.port))
+        self.welcomed = self.loop.create_future()
+        bridge = None
+        try:
+            # Keep saying hello until the server answers
+            self.hello_nonce = new_nonce()
+            hello = self.hello_packet(self.hello_nonce)
+            deadline = time.monotonic() + HANDSHAKE_TIMEOUT
+            while not self.welcomed.done():
+                if time.monotonic() > deadline or self.stopping.is_set():
+                    return
+                self.transport.sendto(hello)
+                try:
+                    await asyncio.wait_for(asyncio.shield(self.welcomed), HELLO_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            session_key = self.welcomed.result()
+
+            peer = UdpPeer(self.loop, self.transport, None, SessionCipher(session_key, False, ordered=False))
+            self.outboxes[GAME.LOCAL_SERVER_ID] = peer
+            # Dispatch sends messages for the server through an ordinary queue; carry them over to the peer
+            bridge = Thread(target=forward_queue, args=(self.in_queue, peer), name='Network bridge', daemon=True)
+            bridge.start()
+            await self.run_maintenance([peer])
+            if GAME.LOCAL_SERVER_ID in self.outboxes:
+                self.drop_peer(peer, True)
+        finally:
+            if bridge is not None and bridge.is_alive():
+                self.in_queue.put(None)
+            self.transport.close()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Binary wire format.  Everything sent over a connection is a frame: a 4-byte length, then
+#   that many bytes of payload.  A message's payload is a small header (protocol version,
+#   message type, and a bitmask of which of the message's fields are present), followed by
+#   the present fields in schema order, each packed with struct according to FIELD_FORMATS.
+
+import struct
+from collections import deque
+
+from constants import MSGCONTENT
+import messages
+
+# Bump this whenever the layout of any message changes
+PROTOCOL_VERSION = 1
+
+# Frames bigger than this are assumed to be garbage, and end the connection
+MAX_FRAME = 1 << 20
+
+LENGTH = struct.Struct('!I')
+HEADER = struct.Struct('!BHH')      # Version, message type, field mask
+COUNT = struct.Struct('!H')         # Length of a list field
+
+# How each field goes on the wire (struct codes); list fields are a count followed by the values
+FIELD_FORMATS = {
+    MSGCONTENT.ID: 'i',
+    MSGCONTENT.RECIPIENT_ID: 'i',
+    MSGCONTENT.ROOM_ID: 'i',
+    MSGCONTENT.SET_ID: 'i',
+    MSGCONTENT.ENTITY_ID: 'i',
+    MSGCONTENT.ENTITY_TYPE: 'H',
+    MSGCONTENT.PLAYER_ID: 'i',
+    MSGCONTENT.PLAYER_LIVES: 'h',
+    MSGCONTENT.PLAYER_SCORE: 'i',
+    MSGCONTENT.WORLD_WIDTH: 'i',
+    MSGCONTENT.WORLD_HEIGHT: 'i',
+    MSGCONTENT.GAME_STATE: 'H',
+    MSGCONTENT.X_POS: 'f',
+    MSGCONTENT.Y_POS: 'f',
+    MSGCONTENT.ROTATION: 'f',
+    MSGCONTENT.SERVER_TIME: 'q',
+}
+LIST_FORMATS = {
+    MSGCONTENT.ENTITY_IDS: 'i',
+    MSGCONTENT.X_POSITIONS: 'f',
+    MSGCONTENT.Y_POSITIONS: 'f',
+    MSGCONTENT.ROTATIONS: 'f',
+}
+
+class ProtocolError(ValueError):
+    """Raised for data that can't have come from a well-behaved peer"""
+    pass
+
+class Layout():
+    """How one message type is laid out on the wire"""
+
+    def __init__(self, cls):
+        self.cls = cls
+        # (attribute name, struct code, whether it's a list), in the order they're sent;
+        #   the header fields come first, then the message's own fields
+        self.fields = []
+        for key, name in cls.attrs.items():
+            if key in LIST_FORMATS:
+                self.fields.append((name, LIST_FORMATS[key], True))
+            else:
+                self.fields.append((name, FIELD_FORMATS[key], False))
+        self.scalars = [None if is_list else struct.Struct('!' + code) for name, code, is_list in self.fields]
+        # Bit for each of the required fields
+        self.required_mask = sum(1 << (len(messages.HEADER) + x) for x in range(cls.required))
+
+LAYOUTS = {msg_type: Layout(cls) for msg_type, cls in messages.CLASSES.items()}
+
+def encode_msg(msg):
+    """Pack a message into a frame, ready to send"""
+
+    mask = 0
+    fmt = ['!BHH']
+    values = [PROTOCOL_VERSION, msg.msg_type, 0]
+    for bit, (name, code, is_list) in enumerate(LAYOUTS[msg.msg_type].fields):
+        value = getattr(msg, name)
+        if value is None:
+            continue
+        mask |= 1 << bit
+        if is_list:
+            fmt.append('H%d%s' % (len(value), code))
+            values.append(len(value))
+            values.extend(value)
+        else:
+            fmt.append(code)
+            values.append(value)
+    values[2] = mask
+    payload = struct.pack(''.join(fmt), *values)
+    return LENGTH.pack(len(payload)) + payload
+
+def decode_msg(payload):
+    """Unpack a message from a frame's payload.
+    Returns None for messages of unknown type, or that are missing required fields.
+    Raises ProtocolError if the payload is malformed, or from another protocol version.
+    """
+
+    try:
+        version, msg_type, mask = HEADER.unpack_from(payload)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError('Protocol version %d, expected %d' % (version, PROTOCOL_VERSION))
+        layout = LAYOUTS.get(msg_type)
+        if layout is None or mask & layout.required_mask != layout.required_mask:
+            return None
+
+        offset = HEADER.size
+        values = []
+        for bit, (name, code, is_list) in enumerate(layout.fields):
+            if not mask & (1 << bit):
+                values.append(None)
+            elif is_list:
+                (count,) = COUNT.unpack_from(payload, offset)
+                offset += COUNT.size
+                values.append(list(struct.unpack_from('!%d%s' % (count, code), payload, offset)))
+                offset += struct.calcsize('!%d%s' % (count, code))
+            else:
+                scalar = layout.scalars[bit]
+                values.append(scalar.unpack_from(payload, offset)[0])
+                offset += scalar.size
+    except struct.error as e:
+        raise ProtocolError(str(e))
+
+    header = len(messages.HEADER)
+    msg = layout.cls.acquire(*values[header:])
+    msg.sender_id, msg.recipient_id, msg.room_id = values[:header]
+    return msg
+
+def encode_frame(payload):
+    """Frame some raw bytes (e.g. a key during the handshake)"""
+
+    return LENGTH.pack(len(payload)) + payload
+
+class FrameReader():
+    """Reassembles frames from a stream of bytes, however it happened to be split up into
+    (or merged across) reads
+    """
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self.buffer = bytearray()
+        # Payloads of complete frames, oldest first
+        self.frames = deque()
+
+    def feed(self, data):
+        """Add data read from the stream, queueing up the payloads of any frames it completed"""
+
+        buffer = self.buffer
+        buffer += data
+        frames = self.frames
+        offset = 0
+        end = len(buffer)
+        while end - offset >= LENGTH.size:
+            (length,) = LENGTH.unpack_from(buffer, offset)
+            if length > self.max_frame:
+                raise ProtocolError('Frame of %d bytes is too big' % length)
+            frame_end = offset + LENGTH.size + length
+            if frame_end > end:
+                break
+            frames.append(bytes(buffer[offset + LENGTH.size:frame_end]))
+            offset = frame_end
+        # Keep only the incomplete frame (if any) at the end
+        del buffer[:offset]
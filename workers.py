@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+# AstroBlast!
+# Copyright Andrew Coleman and Zachary Conlyn
+# CMSC 495-7380, Group 4
+#
+# Art assets Copyright 2018 Blindman67
+#   Licensed under the Creative Commons CC-BY 3.0 license: https://creativecommons.org/licenses/by/3.0/
+#   The assets have been modified.
+#   https://opengameart.org/content/rocks-ships-stars-gold-and-more
+
+# Runs game rooms in worker processes, so that busy rooms can use more than one CPU core.
+#   The dispatcher and network manager stay in the main process; everything a worker's rooms
+#   send or receive goes over one pipe per worker.
+
+from threading import Thread, Lock
+import multiprocessing
+from multiprocessing.connection import wait
+import signal
+import time
+
+from rooms import RoomScheduler
+from constants import GAME
+
+# Things a worker sends to the main process
+WORKER_MSG = 0          # Message for the dispatcher
+WORKER_GLOBAL_MSG = 1   # Message for all clients in a room
+WORKER_JOIN = 2         # A client joined a room
+WORKER_LEAVE = 3        # A client left a room
+WORKER_CLOSED = 4       # A room shut down
+
+# Things the main process sends to a worker
+POOL_MSG = 0            # Message for one of the worker's rooms
+POOL_CREATE_ROOM = 1
+POOL_REMOVE_ROOM = 2
+POOL_STOP = 3
+
+class WorkerOutbox():
+    """Stands in for a queue inside a worker; anything put in it is sent to the main process
+    tagged with kind, in batches (see WorkerDispatch.flush)
+    """
+
+    def __init__(self, pending, kind):
+        self.pending = pending
+        self.kind = kind
+
+    def put(self, msg, block=True, timeout=None):
+        self.pending.append((self.kind, msg))
+
+class WorkerDispatch():
+    """Stands in for the Dispatcher inside a worker process, for the rooms running there"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = []
+        self.in_queue = WorkerOutbox(self.pending, WORKER_MSG)
+        self.global_msg_queue = WorkerOutbox(self.pending, WORKER_GLOBAL_MSG)
+        self.clients = set()
+        self.rooms = {}
+
+    def register_room(self, room_id, room_queue):
+        self.rooms[room_id] = room_queue
+
+    def unregister_room(self, room_id):
+        if self.rooms.pop(room_id, None) is not None:
+            self.pending.append((WORKER_CLOSED, room_id))
+
+    def join_room(self, client_id, room_id):
+        self.clients.add(client_id)
+        self.pending.append((WORKER_JOIN, (client_id, room_id)))
+
+    def leave_room(self, client_id, room_id):
+        self.clients.discard(client_id)
+        self.pending.append((WORKER_LEAVE, (client_id, room_id)))
+
+    def flush(self):
+        """Send everything queued up since the last flush to the main process, in one go"""
+
+        if self.pending:
+            self.conn.send(list(self.pending))
+            # Sending pickled them, so pooled messages can be reused straight away
+            for kind, item in self.pending:
+                if kind == WORKER_MSG and item.pool is not None:
+                    item.release()
+            self.pending.clear()
+
+def run_worker(conn, world_size):
+    """Worker process entry point: runs rooms on command from the main process until told to stop"""
+
+    # Ctrl+C goes to the whole process group; leave it to the main process to shut us down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Settings changed at runtime in the main process don't carry over to a new process
+    GAME.WORLD_WIDTH, GAME.WORLD_HEIGHT = world_size
+
+    dispatch = WorkerDispatch(conn)
+    scheduler = RoomScheduler(dispatch)
+    running = True
+    wait_time = 0
+    while running:
+        # Wait for commands/messages, but no longer than until the next room is due
+        if conn.poll(max(wait_time, 0)):
+            while running and conn.poll():
+                command, args = conn.recv()
+                if command == POOL_MSG:
+                    room_id, msg = args
+                    room_queue = dispatch.rooms.get(room_id)
+                    if room_queue is not None:
+                        room_queue.put(msg)
+                elif command == POOL_CREATE_ROOM:
+                    room_id, kwargs = args
+                    scheduler.create_room(room_id, **kwargs)
+                elif command == POOL_REMOVE_ROOM:
+                    scheduler.remove_room(args)
+                elif command == POOL_STOP:
+                    running = False
+        wait_time = scheduler.tick()
+        dispatch.flush()
+
+    for room_id in list(scheduler.rooms):
+        scheduler.remove_room(room_id)
+    dispatch.flush()
+    conn.close()
+
+class RoomInbox():
+    """Stands in for a room's queue in the main process; messages put in it go to the
+    worker that's running the room
+    """
+
+    def __init__(self, worker, room_id):
+        self.worker = worker
+        self.room_id = room_id
+
+    def put(self, msg, block=True, timeout=None):
+        self.worker.send(POOL_MSG, (self.room_id, msg))
+
+class Worker():
+    """Main-process handle for one worker process"""
+
+    def __init__(self, context, worker_id):
+        self.context = context
+        self.worker_id = worker_id
+        # Settings for each room the worker runs, so they can be recreated after a crash
+        self.rooms = {}
+        self.restarts = 0
+        self.lock = Lock()
+        self.process = None
+        self.conn = None
+
+    def start(self):
+        """Launch (or relaunch) the worker process"""
+
+        conn, worker_conn = self.context.Pipe()
+        process = self.context.Process(target=run_worker, args=(worker_conn, (GAME.WORLD_WIDTH, GAME.WORLD_HEIGHT)),
+                                       name='Room worker %d' % self.worker_id, daemon=True)
+        process.start()
+        worker_conn.close()
+        with self.lock:
+            self.conn = conn
+            self.process = process
+        for room_id, kwargs in self.rooms.items():
+            self.send(POOL_CREATE_ROOM, (room_id, kwargs))
+
+    def send(self, command, args):
+        """Send a command to the worker.  Called from several threads (e.g. dispatch)."""
+
+        with self.lock:
+            try:
+                self.conn.send((command, args))
+            except (OSError, EOFError):
+                # The worker died; it'll be restarted
+                pass
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+class RoomWorkerPool(Thread):
+    """Runs game rooms in a pool of worker processes.
+    New rooms go to the least-loaded worker, and workers that crash are restarted (their
+    rooms start over, and the players in them have to rejoin).
+    """
+
+    def __init__(self, dispatch, num_workers=None, check_interval=1.0):
+        Thread.__init__(self)
+        self.name = 'Room workers'
+        self.dispatch = dispatch
+        self.check_interval = check_interval
+        self.running = True
+
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        # Start workers from a clean interpreter, not a copy of this (threaded) one
+        context = multiprocessing.get_context('spawn')
+        self.workers = [Worker(context, x) for x in range(max(1, num_workers))]
+        for worker in self.workers:
+            worker.start()
+
+    def load(self, worker):
+        """How busy a worker is: the players in its rooms, then the number of rooms"""
+
+        players = sum(len(self.dispatch.room_clients.get(room_id, ())) for room_id in worker.rooms)
+        return (players, len(worker.rooms))
+
+    def create_room(self, room_id, **kwargs):
+        """Create a room on the least-loaded worker.  kwargs are passed on to GameServer."""
+
+        worker = min(self.workers, key=self.load)
+        worker.rooms[room_id] = kwargs
+        worker.send(POOL_CREATE_ROOM, (room_id, kwargs))
+        self.dispatch.register_room(room_id, RoomInbox(worker, room_id))
+        return worker
+
+    def remove_room(self, room_id):
+        """Shut a room down, wherever it's running"""
+
+        for worker in self.workers:
+            if worker.rooms.pop(room_id, None) is not None:
+                worker.send(POOL_REMOVE_ROOM, room_id)
+        self.dispatch.unregister_room(room_id)
+
+    def restart(self, worker):
+        """Relaunch a worker that died, along with its rooms"""
+
+        worker.restarts += 1
+        # Whoever was playing in (or joining) the worker's rooms lost their game; they're told
+        #   they've been disconnected, so they can join the new rooms from scratch
+        for room_id in worker.rooms:
+            self.dispatch.drop_room_clients(room_id)
+        worker.conn.close()
+        worker.start()
+
+    def handle(self, worker, batch):
+        """Pass along everything a worker sent"""
+
+        for kind, item in batch:
+            if kind == WORKER_MSG:
+                self.dispatch.in_queue.put(item)
+            elif kind == WORKER_GLOBAL_MSG:
+                self.dispatch.global_msg_queue.put(item)
+            elif kind == WORKER_JOIN:
+                self.dispatch.join_room(*item)
+            elif kind == WORKER_LEAVE:
+                self.dispatch.leave_room(*item)
+            elif kind == WORKER_CLOSED:
+                worker.rooms.pop(item, None)
+                self.dispatch.unregister_room(item)
+
+    def run(self):
+        """Gets called at thread start"""
+
+        last_check = time.monotonic()
+        while self.running:
+            conns = {worker.conn: worker for worker in self.workers}
+            for conn in wait(list(conns), timeout=0.1):
+                worker = conns[conn]
+                try:
+                    self.handle(worker, conn.recv())
+                except (OSError, EOFError):
+                    # Worker went away (crashed, or was killed)
+                    worker.process.join(self.check_interval)
+                    if worker.is_alive():
+                        worker.process.terminate()
+                    self.restart(worker)
+
+            now = time.monotonic()
+            if now - last_check >= self.check_interval:
+                last_check = now
+                for worker in self.workers:
+                    if not worker.is_alive():
+                        self.restart(worker)
+
+        for worker in self.workers:
+            worker.send(POOL_STOP, None)
+        for worker in self.workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()